@@ -0,0 +1,188 @@
+"""
+Заранее подготовленные ассеты уведомлений: стикеры скачиваются сразу при
+обнаружении подарка, загруженные через Bot API file_id переиспользуются
+"""
+
+from collections import OrderedDict
+from functools import partial
+from io import BytesIO
+from pathlib import Path
+
+import asyncio
+import itertools
+import logging
+import typing
+
+from star_gifts_data import StarGiftData
+from mtproto_scheduler import mtproto_scheduler, LANE_MEDIA
+
+logger = logging.getLogger(__name__)
+
+STICKER_T = bytes | Path  # Path - стикер скачан в файл (см. config.ALERT_ASSETS_ON_DISK)
+
+class AlertAssetCache:
+    """LRU-кэш задач скачивания стикеров и file_id загруженных стикеров
+
+    Стикеры подарков, которые ещё рассылаются (pin), не вытесняются: кэш
+    временно растёт сверх max_entries и сжимается после unpin
+    """
+
+    def __init__(self, max_entries: int, dirpath: Path | None = None) -> None:
+        self.max_entries = max_entries
+        self.dirpath = dirpath  # None - стикеры держатся в памяти
+
+        self._sticker_tasks: OrderedDict[int, asyncio.Task[STICKER_T]] = OrderedDict()
+        self._uploaded_file_ids: OrderedDict[int, str] = OrderedDict()
+        self._pins: dict[int, int] = {}  # star_gift_id -> число оповещений, которым нужен стикер
+        self._downloads = itertools.count()  # повторное скачивание не пишет в файл вытесненного
+
+        if dirpath is not None:
+            dirpath.mkdir(exist_ok=True)
+
+            # Файлы прошлого запуска кэшу уже не принадлежат
+            for filepath in dirpath.iterdir():
+                filepath.unlink(missing_ok=True)
+
+    def _evict(self, entries: OrderedDict[int, typing.Any]) -> None:
+        if len(entries) <= self.max_entries:
+            return
+
+        # Последнюю запись только что добавили для нового подарка - её оповещение ещё не успело вызвать pin
+        for star_gift_id in list(entries)[:-1]:
+            if len(entries) <= self.max_entries:
+                break
+
+            if star_gift_id in self._pins:
+                continue
+
+            entry = entries.pop(star_gift_id)
+
+            if isinstance(entry, asyncio.Task):
+                _discard_sticker(entry)
+
+    def pin(self, star_gift_id: int) -> None:
+        """Стикер подарка нужен оповещению до unpin"""
+        self._pins[star_gift_id] = self._pins.get(star_gift_id, 0) + 1
+
+    def unpin(self, star_gift_id: int) -> None:
+        pins = self._pins.pop(star_gift_id, 0) - 1
+
+        if pins > 0:
+            self._pins[star_gift_id] = pins
+
+            return
+
+        self._evict(self._sticker_tasks)
+        self._evict(self._uploaded_file_ids)
+
+    def prefetch(self, app: typing.Any, star_gift: StarGiftData) -> asyncio.Task[STICKER_T]:
+        """Запускает скачивание стикера (если ещё не запущено) и сразу возвращает задачу"""
+        task = self._sticker_tasks.get(star_gift.id)
+
+        if task is not None and not (task.done() and (task.cancelled() or task.exception() is not None)):
+            self._sticker_tasks.move_to_end(star_gift.id)
+
+            return task
+
+        task = asyncio.create_task(self._download_sticker(app, star_gift))
+
+        # Предзагрузку могут так и не дождаться - ошибка логируется здесь
+        task.add_done_callback(partial(_log_download_error, star_gift.id))
+
+        self._sticker_tasks[star_gift.id] = task
+        self._evict(self._sticker_tasks)
+
+        return task
+
+    async def _download_sticker(self, app: typing.Any, star_gift: StarGiftData) -> STICKER_T:
+        if self.dirpath is not None:
+            # pyrogram пишет файл частями, целиком в памяти стикер не бывает
+            filepath = self.dirpath / f"{star_gift.id}-{next(self._downloads)}-{Path(star_gift.sticker_file_name).name}"
+
+            await mtproto_scheduler.run(
+                LANE_MEDIA,
+                "download_media",
+                partial(
+                    app.download_media,
+                    message = star_gift.sticker_file_id,
+                    file_name = filepath.as_posix()
+                )
+            )
+
+            logger.debug(f"Prefetched sticker for star gift {star_gift.id} to {filepath.name}")
+
+            return filepath
+
+        binary = typing.cast(BytesIO, await mtproto_scheduler.run(
+            LANE_MEDIA,
+            "download_media",
+            partial(
+                app.download_media,
+                message = star_gift.sticker_file_id,
+                in_memory = True
+            )
+        ))
+
+        logger.debug(f"Prefetched sticker for star gift {star_gift.id}")
+
+        return binary.getvalue()
+
+    async def get_sticker(self, app: typing.Any, star_gift: StarGiftData) -> STICKER_T:
+        return await self.prefetch(app, star_gift)
+
+    def get_uploaded_file_id(self, star_gift_id: int) -> str | None:
+        return self._uploaded_file_ids.get(star_gift_id)
+
+    def set_uploaded_file_id(self, star_gift_id: int, file_id: str) -> None:
+        self._uploaded_file_ids[star_gift_id] = file_id
+        self._evict(self._uploaded_file_ids)
+
+    def close(self) -> None:
+        for task in self._sticker_tasks.values():
+            _discard_sticker(task)
+
+        self._sticker_tasks.clear()
+
+    def get_status(self) -> dict[str, typing.Any]:
+        stickers_bytes = 0
+
+        for task in self._sticker_tasks.values():
+            if task.done() and not task.cancelled() and task.exception() is None:
+                sticker = task.result()
+
+                stickers_bytes += len(sticker) if isinstance(sticker, bytes) else 0
+
+        return {
+            "max_entries": self.max_entries,
+            "stickers": len(self._sticker_tasks),
+            "pinned": len(self._pins),
+            "stickers_in_memory_bytes": stickers_bytes,
+            "on_disk": self.dirpath is not None,
+            "uploaded_file_ids": len(self._uploaded_file_ids)
+        }
+
+def _log_download_error(star_gift_id: int, task: asyncio.Task[STICKER_T]) -> None:
+    if task.cancelled():
+        return
+
+    ex = task.exception()
+
+    if ex is not None:
+        logger.error(f"Failed to prefetch sticker for star gift {star_gift_id}: {type(ex).__name__} {ex}")
+
+def _remove_sticker_file(task: asyncio.Task[STICKER_T]) -> None:
+    if task.cancelled() or task.exception() is not None:
+        return
+
+    sticker = task.result()
+
+    if isinstance(sticker, Path):
+        sticker.unlink(missing_ok=True)
+
+def _discard_sticker(task: asyncio.Task[STICKER_T]) -> None:
+    """Вытесненный из кэша стикер на диске больше не нужен (недокачанный - удалится по завершении)"""
+    if task.done():
+        _remove_sticker_file(task)
+
+    else:
+        task.add_done_callback(_remove_sticker_file)
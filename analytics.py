@@ -0,0 +1,471 @@
+"""
+Аналитика продаж: история available_amount в колоночном хранилище NumPy
+Хранятся только изменения остатка (между ними значение постоянно), поэтому
+ресемплинг на любую сетку - это searchsorted с forward-fill; агрегаты
+считаются векторно по всем колонкам без циклов по отсчётам
+"""
+
+from pathlib import Path
+
+import logging
+import os
+import threading
+import time
+import typing
+
+import numpy as np
+
+from star_gifts_data import StarGiftData
+
+import config
+
+logger = logging.getLogger(__name__)
+
+NO_VALUE = -1  # остаток до первого отсчёта подарка
+
+# Ограничения сетки ресемплинга: эндпоинт публичный, размер ответа задаёт клиент
+RESAMPLE_MIN_STEP = 10
+RESAMPLE_MAX_POINTS = 10_000
+RESAMPLE_DEFAULT_STEP = 60  # без явного шага растёт кратно себе, пока сетка не уложится в RESAMPLE_MAX_POINTS
+
+class GiftInfo(typing.NamedTuple):
+    index: int
+    total_amount: int
+    is_limited: bool
+
+class GiftAnalyticsStore:
+    """Колонки (timestamp, индекс подарка, остаток) растут удвоением ёмкости"""
+
+    def __init__(self, filepath: Path | None = None, initial_capacity: int = 4_096) -> None:
+        self.filepath = filepath
+
+        self._lock = threading.Lock()
+
+        self._size = 0
+        self._timestamps = np.empty(initial_capacity, dtype=np.int64)
+        self._gift_indexes = np.empty(initial_capacity, dtype=np.int32)
+        self._amounts = np.empty(initial_capacity, dtype=np.int32)
+
+        # Метаданные подарков - по индексу, который хранится в колонке
+        self._gifts: dict[int, GiftInfo] = {}
+        self._gift_ids: list[int] = []
+        self._first_seen: list[int] = []
+        self._upgradable_at: list[int] = []
+        self._last_amounts: list[int] = []
+
+    @property
+    def samples(self) -> int:
+        return self._size
+
+    def _ensure_capacity(self, extra: int) -> None:
+        required = self._size + extra
+
+        if required <= self._timestamps.size:
+            return
+
+        capacity = max(required, self._timestamps.size * 2)
+
+        for name in ("_timestamps", "_gift_indexes", "_amounts"):
+            column: np.ndarray = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+
+            setattr(self, name, grown)
+
+    def _get_gift_index(self, star_gift: StarGiftData, timestamp: int) -> int:
+        gift_info = self._gifts.get(star_gift.id)
+
+        if gift_info is not None:
+            return gift_info.index
+
+        index = len(self._gift_ids)
+
+        self._gifts[star_gift.id] = GiftInfo(
+            index = index,
+            total_amount = star_gift.total_amount,
+            is_limited = star_gift.is_limited
+        )
+
+        self._gift_ids.append(star_gift.id)
+        self._first_seen.append(star_gift.first_appearance_timestamp or timestamp)
+        self._upgradable_at.append(NO_VALUE)
+        self._last_amounts.append(NO_VALUE)
+
+        return index
+
+    def record(self, star_gifts: typing.Iterable[StarGiftData], timestamp: float | None = None) -> int:
+        """Добавляет отсчёты подарков, у которых изменился остаток; возвращает их число"""
+        timestamp = int(timestamp if timestamp is not None else time.time())
+
+        rows: list[tuple[int, int]] = []
+
+        with self._lock:
+            for star_gift in star_gifts:
+                index = self._get_gift_index(star_gift, timestamp)
+
+                if self._last_amounts[index] != star_gift.available_amount:
+                    self._last_amounts[index] = star_gift.available_amount
+
+                    rows.append((index, star_gift.available_amount))
+
+            if not rows:
+                return 0
+
+            self._ensure_capacity(len(rows))
+
+            start, end = self._size, self._size + len(rows)
+
+            self._timestamps[start:end] = timestamp
+            self._gift_indexes[start:end], self._amounts[start:end] = zip(*rows)
+
+            self._size = end
+
+        return len(rows)
+
+    def mark_upgradable(self, star_gift: StarGiftData, timestamp: float | None = None) -> None:
+        timestamp = int(timestamp if timestamp is not None else time.time())
+
+        with self._lock:
+            index = self._get_gift_index(star_gift, timestamp)
+
+            if self._upgradable_at[index] == NO_VALUE:
+                self._upgradable_at[index] = timestamp
+
+    def _get_columns(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Срезы не копируются: дописывание идёт за их пределами, а рост создаёт новые массивы
+        with self._lock:
+            size = self._size
+
+            return self._timestamps[:size], self._gift_indexes[:size], self._amounts[:size]
+
+    def _get_gifts_meta(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        with self._lock:
+            return (
+                np.array(self._gift_ids, dtype=np.int64),
+                np.array(self._first_seen, dtype=np.int64),
+                np.array(self._upgradable_at, dtype=np.int64),
+                np.array([self._gifts[gift_id].is_limited for gift_id in self._gift_ids], dtype=np.bool_)
+            )
+
+    def get_series(self, star_gift_id: int) -> tuple[np.ndarray, np.ndarray]:
+        """Моменты изменений и остатки одного подарка"""
+        gift_info = self._gifts.get(star_gift_id)
+
+        if gift_info is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+
+        timestamps, gift_indexes, amounts = self._get_columns()
+
+        mask = gift_indexes == gift_info.index
+
+        return timestamps[mask], amounts[mask]
+
+    def resample(
+        self,
+        star_gift_id: int,
+        step: int | None = None,
+        since: int | None = None,
+        until: int | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Остаток на равномерной сетке (forward-fill)
+
+        Сетка начинается не раньше первого отсчёта; без step шаг подбирается
+        под RESAMPLE_MAX_POINTS. ValueError - явный шаг меньше
+        RESAMPLE_MIN_STEP или точек больше RESAMPLE_MAX_POINTS
+        """
+        if step is not None and step < RESAMPLE_MIN_STEP:
+            raise ValueError(f"step must be at least {RESAMPLE_MIN_STEP} seconds")
+
+        timestamps, amounts = self.get_series(star_gift_id)
+
+        if not timestamps.size:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+
+        since = max(since if since is not None else 0, int(timestamps[0]))
+        until = until if until is not None else int(time.time())
+
+        if step is None:
+            # Наименьшее кратное RESAMPLE_DEFAULT_STEP, при котором точек не больше RESAMPLE_MAX_POINTS
+            min_step = -(-max(until - since, 0) // (RESAMPLE_MAX_POINTS - 1))
+            step = max(-(-min_step // RESAMPLE_DEFAULT_STEP), 1) * RESAMPLE_DEFAULT_STEP
+
+        points = (until - since) // step + 1
+
+        if points > RESAMPLE_MAX_POINTS:
+            raise ValueError(f"{points} points requested, at most {RESAMPLE_MAX_POINTS} allowed: increase step or narrow since/until")
+
+        grid = np.arange(since, until + 1, step, dtype=np.int64)
+        positions = np.searchsorted(timestamps, grid, side="right") - 1
+
+        values = np.where(positions >= 0, amounts[np.maximum(positions, 0)], NO_VALUE)
+
+        return grid, values.astype(np.int32)
+
+    def get_sales_rate(self, star_gift_id: int, window: int = 3_600, now: int | None = None) -> float:
+        """Продаж в минуту за последние window секунд"""
+        timestamps, amounts = self.get_series(star_gift_id)
+
+        if not timestamps.size:
+            return 0.0
+
+        now = now if now is not None else int(time.time())
+
+        start_position = max(int(np.searchsorted(timestamps, now - window, side="right")) - 1, 0)
+
+        sold = int(amounts[start_position]) - int(amounts[-1])
+
+        return round(sold / (window / 60), 3)
+
+    def get_sell_outs(self, limit: int = 10) -> list[dict[str, typing.Any]]:
+        """Последние распроданные лимитированные подарки и время распродажи"""
+        timestamps, gift_indexes, amounts = self._get_columns()
+        gift_ids, first_seen, _, is_limited = self._get_gifts_meta()
+
+        if not timestamps.size:
+            return []
+
+        # Отсчёты упорядочены по времени: return_index даёт первое обнуление каждого подарка
+        zero_mask = (amounts == 0) & is_limited[gift_indexes]
+
+        sold_out_indexes, first_zero_positions = np.unique(gift_indexes[zero_mask], return_index=True)
+        sold_out_at = timestamps[zero_mask][first_zero_positions]
+
+        order = np.argsort(sold_out_at)[::-1][:limit]
+
+        sold_out_indexes = sold_out_indexes[order]
+        sold_out_at = sold_out_at[order]
+        durations = sold_out_at - first_seen[sold_out_indexes]
+
+        return [
+            {
+                "id": int(gift_id),
+                "sold_out_at": int(timestamp),
+                "sell_out_seconds": int(duration)
+            }
+            for gift_id, timestamp, duration in zip(gift_ids[sold_out_indexes], sold_out_at, durations)
+        ]
+
+    def get_time_to_upgradable(self) -> np.ndarray:
+        """Секунды от появления до возможности улучшения по всем подаркам"""
+        _, first_seen, upgradable_at, _ = self._get_gifts_meta()
+
+        mask = upgradable_at != NO_VALUE
+
+        return upgradable_at[mask] - first_seen[mask]
+
+    def get_summary(self, sell_outs_limit: int = 10) -> dict[str, typing.Any]:
+        sell_outs = self.get_sell_outs(sell_outs_limit)
+        sell_out_seconds = np.array([sell_out["sell_out_seconds"] for sell_out in sell_outs], dtype=np.int64)
+        time_to_upgradable = self.get_time_to_upgradable()
+
+        return {
+            "samples": self._size,
+            "gifts": len(self._gift_ids),
+            "memory_bytes": self._timestamps.nbytes + self._gift_indexes.nbytes + self._amounts.nbytes,
+            "sell_outs": sell_outs,
+            "sell_out_seconds": get_distribution(sell_out_seconds),
+            "time_to_upgradable_seconds": get_distribution(time_to_upgradable)
+        }
+
+    def get_status(self) -> dict[str, typing.Any]:
+        return {
+            "samples": self._size,
+            "gifts": len(self._gift_ids)
+        }
+
+    def save(self) -> None:
+        if self.filepath is None:
+            return
+
+        timestamps, gift_indexes, amounts = self._get_columns()
+        gift_ids, first_seen, upgradable_at, is_limited = self._get_gifts_meta()
+
+        with self._lock:
+            total_amounts = np.array([self._gifts[gift_id].total_amount for gift_id in self._gift_ids], dtype=np.int64)
+
+        tmp_filepath = self.filepath.with_name(self.filepath.name + ".tmp")
+
+        with tmp_filepath.open("wb") as file:
+            np.savez(
+                file,
+                timestamps = timestamps,
+                gift_indexes = gift_indexes,
+                amounts = amounts,
+                gift_ids = gift_ids,
+                first_seen = first_seen,
+                upgradable_at = upgradable_at,
+                is_limited = is_limited,
+                total_amounts = total_amounts
+            )
+
+        os.replace(tmp_filepath, self.filepath)
+
+    def load(self) -> None:
+        if self.filepath is None or not self.filepath.exists():
+            return
+
+        try:
+            with np.load(self.filepath) as data:
+                columns = {name: data[name] for name in data.files}
+
+        except Exception as ex:
+            logger.warning(f"Failed to load analytics from {self.filepath}: {ex}")
+
+            return
+
+        with self._lock:
+            self._size = int(columns["timestamps"].size)
+            self._timestamps = columns["timestamps"].astype(np.int64)
+            self._gift_indexes = columns["gift_indexes"].astype(np.int32)
+            self._amounts = columns["amounts"].astype(np.int32)
+
+            self._gift_ids = columns["gift_ids"].tolist()
+            self._first_seen = columns["first_seen"].tolist()
+            self._upgradable_at = columns["upgradable_at"].tolist()
+
+            self._gifts = {
+                gift_id: GiftInfo(
+                    index = index,
+                    total_amount = total_amount,
+                    is_limited = is_limited
+                )
+                for index, (gift_id, total_amount, is_limited) in enumerate(zip(
+                    self._gift_ids,
+                    columns["total_amounts"].tolist(),
+                    columns["is_limited"].tolist()
+                ))
+            }
+
+            # Последний остаток каждого подарка - чтобы не писать повтор после рестарта
+            self._last_amounts = [NO_VALUE] * len(self._gift_ids)
+
+            if self._size:
+                reversed_indexes = self._gift_indexes[::-1]
+                gift_indexes, last_positions = np.unique(reversed_indexes, return_index=True)
+
+                for index, amount in zip(gift_indexes.tolist(), self._amounts[::-1][last_positions].tolist()):
+                    self._last_amounts[index] = amount
+
+        logger.info(f"Loaded {self._size} analytics samples for {len(self._gift_ids)} gifts")
+
+def get_distribution(values: np.ndarray) -> dict[str, typing.Any]:
+    if not values.size:
+        return {
+            "count": 0,
+            "median": None,
+            "p90": None,
+            "min": None,
+            "max": None
+        }
+
+    median, p90 = np.percentile(values, (50, 90))
+
+    return {
+        "count": int(values.size),
+        "median": round(float(median), 1),
+        "p90": round(float(p90), 1),
+        "min": int(values.min()),
+        "max": int(values.max())
+    }
+
+def format_duration(seconds: float | None) -> str:
+    if seconds is None:
+        return "—"
+
+    seconds = int(seconds)
+
+    if seconds < 60:
+        return f"{seconds}с"
+
+    if seconds < 3_600:
+        return f"{seconds // 60}м {seconds % 60}с"
+
+    return f"{seconds // 3_600}ч {seconds % 3_600 // 60}м"
+
+def render_summary_text(summary: dict[str, typing.Any]) -> str:
+    sell_out_seconds = summary["sell_out_seconds"]
+    time_to_upgradable = summary["time_to_upgradable_seconds"]
+
+    lines = [
+        "📈 Аналитика продаж:",
+        "",
+        f"🗂 Отсчётов: {summary['samples']} по {summary['gifts']} подаркам",
+        f"⏱️ Распродажа последних {sell_out_seconds['count']}: медиана {format_duration(sell_out_seconds['median'])}, p90 {format_duration(sell_out_seconds['p90'])}",
+        f"⬆️ До улучшения ({time_to_upgradable['count']}): медиана {format_duration(time_to_upgradable['median'])}"
+    ]
+
+    for sell_out in summary["sell_outs"]:
+        lines.append(f"• {sell_out['id']}: {format_duration(sell_out['sell_out_seconds'])}")
+
+    return "\n".join(lines)
+
+gift_analytics = GiftAnalyticsStore(
+    filepath = config.ANALYTICS_FILEPATH if config.ANALYTICS_ENABLED else None
+)
+
+if __name__ == "__main__":
+    # Время запросов на ~3 месяцах истории с разрешением 1 секунда
+    GIFTS_AMOUNT = 40
+    DURATION = 90 * 24 * 3_600
+    SAMPLES_PER_GIFT = 200_000
+
+    rng = np.random.default_rng(0)
+    store = GiftAnalyticsStore(initial_capacity=GIFTS_AMOUNT * SAMPLES_PER_GIFT)
+
+    started_at = 1_700_000_000
+
+    # Колонки заполняются напрямую: record() по отсчёту слишком долог для генерации
+    all_timestamps = []
+    all_indexes = []
+    all_amounts = []
+
+    for index in range(GIFTS_AMOUNT):
+        star_gift = StarGiftData(
+            id = 5_000_000_000_000_000_000 + index,
+            number = index,
+            sticker_file_id = "",
+            sticker_file_name = "",
+            price = 50,
+            convert_price = 40,
+            available_amount = SAMPLES_PER_GIFT,
+            total_amount = SAMPLES_PER_GIFT,
+            is_limited = True,
+            first_appearance_timestamp = started_at
+        )
+
+        store._get_gift_index(star_gift, started_at)  # pyright: ignore[reportPrivateUsage]
+        store.mark_upgradable(star_gift, started_at + int(rng.integers(3_600, 7 * 86_400)))
+
+        timestamps = np.sort(rng.choice(DURATION, SAMPLES_PER_GIFT, replace=False)) + started_at
+
+        all_timestamps.append(timestamps)
+        all_indexes.append(np.full(SAMPLES_PER_GIFT, index, dtype=np.int32))
+        all_amounts.append(np.arange(SAMPLES_PER_GIFT - 1, -1, -1, dtype=np.int32))
+
+    order = np.argsort(np.concatenate(all_timestamps), kind="stable")
+
+    store._size = order.size  # pyright: ignore[reportPrivateUsage]
+    store._timestamps = np.concatenate(all_timestamps)[order]  # pyright: ignore[reportPrivateUsage]
+    store._gift_indexes = np.concatenate(all_indexes)[order]  # pyright: ignore[reportPrivateUsage]
+    store._amounts = np.concatenate(all_amounts)[order]  # pyright: ignore[reportPrivateUsage]
+
+    star_gift_id = 5_000_000_000_000_000_000
+
+    def measure(name: str, func: typing.Callable[[], typing.Any], repeat: int = 5) -> None:
+        timings = []
+
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+
+        print(f"{name:>28}: {min(timings) * 1000:8.2f}ms")
+
+    print(f"samples={store.samples:,}, memory={store.get_summary()['memory_bytes'] / 1024 / 1024:.1f}MiB")
+
+    measure("summary", store.get_summary)
+    measure("sell outs (10)", store.get_sell_outs)
+    measure("series (1 gift)", lambda: store.get_series(star_gift_id))
+    measure("resample 15m (90 days)", lambda: store.resample(star_gift_id, 900, started_at, started_at + DURATION))
+    measure("resample 1h (90 days)", lambda: store.resample(star_gift_id, 3_600, started_at, started_at + DURATION))
+    measure("sales rate (1h)", lambda: store.get_sales_rate(star_gift_id, 3_600, started_at + DURATION))
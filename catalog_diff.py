@@ -0,0 +1,160 @@
+"""
+Векторное сравнение каталога между опросами: прошлый опрос хранится как
+отсортированные массивы id/остатков, новые, пропавшие, подешевевшие по
+остатку и распроданные подарки находятся одним проходом searchsorted
+"""
+
+import typing
+
+import numpy as np
+
+from star_gifts_data import StarGiftData
+
+class CatalogSnapshot(typing.NamedTuple):
+    ids: np.ndarray  # int64, по возрастанию
+    amounts: np.ndarray  # int64
+    is_limited: np.ndarray  # bool
+
+    @classmethod
+    def from_columns(cls, ids: typing.Iterable[int], amounts: typing.Iterable[int], is_limited: typing.Iterable[bool], count: int = -1) -> "CatalogSnapshot":
+        ids_array = np.fromiter(ids, dtype=np.int64, count=count)
+        amounts_array = np.fromiter(amounts, dtype=np.int64, count=count)
+        is_limited_array = np.fromiter(is_limited, dtype=np.bool_, count=count)
+
+        # Каталог из parse_data уже отсортирован - сортировка только при необходимости
+        if ids_array.size > 1 and not bool(np.all(ids_array[1:] > ids_array[:-1])):
+            order = np.argsort(ids_array, kind="stable")
+
+            ids_array, amounts_array, is_limited_array = ids_array[order], amounts_array[order], is_limited_array[order]
+
+        return cls(ids_array, amounts_array, is_limited_array)
+
+    @classmethod
+    def from_star_gifts(cls, star_gifts: typing.Collection[StarGiftData]) -> "CatalogSnapshot":
+        return cls.from_columns(
+            (star_gift.id for star_gift in star_gifts),
+            (star_gift.available_amount for star_gift in star_gifts),
+            (star_gift.is_limited for star_gift in star_gifts),
+            count = len(star_gifts)
+        )
+
+class CatalogDiff(typing.NamedTuple):
+    new_ids: np.ndarray
+    removed_ids: np.ndarray
+    decreased_ids: np.ndarray
+    previous_amounts: np.ndarray  # остатки decreased_ids в прошлом опросе
+    sold_out_ids: np.ndarray  # подмножество decreased_ids: лимитированные, остаток 0
+
+def _find(haystack: np.ndarray, needles: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Позиции needles в отсортированном haystack и маска найденных"""
+    if not haystack.size:
+        return np.zeros(needles.size, dtype=np.intp), np.zeros(needles.size, dtype=np.bool_)
+
+    positions = np.minimum(np.searchsorted(haystack, needles), haystack.size - 1)
+
+    return positions, haystack[positions] == needles
+
+def diff_catalogs(old: CatalogSnapshot, new: CatalogSnapshot) -> CatalogDiff:
+    positions, is_known = _find(old.ids, new.ids)
+    _, is_kept = _find(new.ids, old.ids)
+
+    known_ids = new.ids[is_known]
+    known_amounts = new.amounts[is_known]
+    old_amounts = old.amounts[positions[is_known]]
+
+    is_decreased = known_amounts < old_amounts
+    is_sold_out = is_decreased & (known_amounts == 0) & new.is_limited[is_known]
+
+    return CatalogDiff(
+        new_ids = new.ids[~is_known],
+        removed_ids = old.ids[~is_kept],
+        decreased_ids = known_ids[is_decreased],
+        previous_amounts = old_amounts[is_decreased],
+        sold_out_ids = known_ids[is_sold_out]
+    )
+
+if __name__ == "__main__":
+    # Сравнение с прежним циклом по словарю на каталогах от 100 до 100k подарков
+    import time
+
+    rng = np.random.default_rng(0)
+
+    def make_star_gift(star_gift_id: int, available_amount: int) -> StarGiftData:
+        return StarGiftData.model_construct(
+            id = star_gift_id,
+            number = 1,
+            sticker_file_id = "",
+            sticker_file_name = "",
+            price = 50,
+            convert_price = 40,
+            available_amount = available_amount,
+            total_amount = 10_000,
+            is_limited = True
+        )
+
+    def python_diff(old_star_gifts: list[StarGiftData], new_star_gifts_dict: dict[int, StarGiftData]) -> tuple[list[int], list[int], list[int]]:
+        old_star_gifts_dict = {
+            star_gift.id: star_gift
+            for star_gift in old_star_gifts
+        }
+
+        new_ids = [
+            star_gift_id
+            for star_gift_id in new_star_gifts_dict
+            if star_gift_id not in old_star_gifts_dict
+        ]
+
+        removed_ids: list[int] = []
+        decreased_ids: list[int] = []
+
+        for star_gift_id, old_star_gift in old_star_gifts_dict.items():
+            new_star_gift = new_star_gifts_dict.get(star_gift_id)
+
+            if new_star_gift is None:
+                removed_ids.append(star_gift_id)
+
+                continue
+
+            if new_star_gift.available_amount < old_star_gift.available_amount:
+                decreased_ids.append(star_gift_id)
+
+        return new_ids, removed_ids, decreased_ids
+
+    def measure(func: typing.Callable[[], typing.Any], repeat: int) -> float:
+        timings = []
+
+        for _ in range(repeat):
+            started_at = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started_at)
+
+        return min(timings) * 1000
+
+    # snapshot в детекторе строится в пуле вместе с разбором каталога (см. parse_data.py), в event loop - только diff
+    print(f"{'gifts':>8} {'python loop':>12} {'snapshot':>10} {'diff':>8} {'loop speedup':>13}")
+
+    for size in (100, 1_000, 10_000, 100_000):
+        ids = np.sort(rng.choice(10 ** 12, size + 10, replace=False)) + 5 * 10 ** 18
+        amounts = rng.integers(0, 10_000, size + 10)
+
+        old_star_gifts = [make_star_gift(int(star_gift_id), int(amount)) for star_gift_id, amount in zip(ids[:size], amounts[:size])]
+
+        # 10 новых, 1% подешевели
+        new_amounts = amounts.copy()
+        new_amounts[rng.choice(size, max(size // 100, 1), replace=False)] -= 1
+
+        new_star_gifts_dict = {
+            int(star_gift_id): make_star_gift(int(star_gift_id), int(max(amount, 0)))
+            for star_gift_id, amount in zip(ids, new_amounts)
+        }
+
+        repeat = max(3, 20_000 // size)
+
+        old_snapshot = CatalogSnapshot.from_star_gifts(old_star_gifts)
+        new_snapshot = CatalogSnapshot.from_star_gifts(list(new_star_gifts_dict.values()))
+
+        python_ms = measure(lambda: python_diff(old_star_gifts, new_star_gifts_dict), repeat)
+        snapshot_ms = measure(lambda: CatalogSnapshot.from_star_gifts(new_star_gifts_dict.values()), repeat)  # pyright: ignore[reportArgumentType]
+        diff_ms = measure(lambda: diff_catalogs(old_snapshot, new_snapshot), repeat)
+
+        print(f"{size:>8} {python_ms:>10.3f}ms {snapshot_ms:>8.3f}ms {diff_ms:>6.3f}ms {python_ms / diff_ms:>12.1f}x")
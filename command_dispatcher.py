@@ -0,0 +1,159 @@
+"""
+Диспетчер команд бота: обработчики pyrogram только ставят задачу в очередь,
+ответы выполняет собственный пул воркеров. Управляющие команды (/stop) идут
+по отдельной полосе с выделенным воркером и не ждут очередь статусов/справки
+"""
+
+from collections import deque
+
+import asyncio
+import itertools
+import logging
+import time
+import typing
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_CONTROL = 0  # отдельная полоса
+PRIORITY_HIGH = 5
+PRIORITY_DEFAULT = 10
+
+COMMAND_FACTORY_T = typing.Callable[[], typing.Awaitable[typing.Any]]
+
+class CommandJob(typing.NamedTuple):
+    priority: int
+    sequence: int
+    received_at: float
+    name: str
+    factory: COMMAND_FACTORY_T
+
+class CommandDispatcher:
+    def __init__(self, workers: int = 4, control_workers: int = 1, queue_size: int = 256, latency_window: int = 500) -> None:
+        self.workers = workers
+        self.control_workers = control_workers
+
+        self.dropped = 0
+        self.failed = 0
+
+        self._queue: asyncio.PriorityQueue[CommandJob] = asyncio.PriorityQueue(maxsize=queue_size)
+        self._control_queue: asyncio.Queue[CommandJob] = asyncio.Queue()
+        self._sequence = itertools.count()
+        self._latency_window = latency_window
+        self._latencies: dict[str, deque[float]] = {}
+
+    def submit(self, name: str, factory: COMMAND_FACTORY_T, priority: int = PRIORITY_DEFAULT, received_at: float | None = None) -> bool:
+        """Не блокирует: вызывается прямо из обработчика pyrogram"""
+        job = CommandJob(
+            priority = priority,
+            sequence = next(self._sequence),
+            received_at = received_at if received_at is not None else time.perf_counter(),
+            name = name,
+            factory = factory
+        )
+
+        if priority == PRIORITY_CONTROL:
+            self._control_queue.put_nowait(job)
+
+            return True
+
+        try:
+            self._queue.put_nowait(job)
+
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+            logger.warning(f"Command queue is full, dropping {name}")
+
+            return False
+
+        return True
+
+    async def _execute(self, job: CommandJob) -> None:
+        try:
+            await job.factory()
+
+        except Exception as ex:
+            self.failed += 1
+
+            logger.exception(f"Error in command {job.name}: {ex}")
+
+        finally:
+            self._latencies.setdefault(job.name, deque(maxlen=self._latency_window)).append(time.perf_counter() - job.received_at)
+
+    async def _worker(self, queue: "asyncio.Queue[CommandJob]") -> None:
+        while True:
+            job = await queue.get()
+
+            try:
+                await self._execute(job)
+
+            finally:
+                queue.task_done()
+
+    async def run(self) -> None:
+        async with asyncio.TaskGroup() as task_group:
+            for i in range(self.control_workers):
+                task_group.create_task(self._worker(self._control_queue), name=f"command-control-{i}")
+
+            for i in range(self.workers):
+                task_group.create_task(self._worker(self._queue), name=f"command-{i}")
+
+    def get_status(self) -> dict[str, typing.Any]:
+        latencies_ms: dict[str, dict[str, float]] = {}
+
+        for name, latencies in self._latencies.items():
+            values = np.fromiter(latencies, dtype=np.float64) * 1000
+
+            p50, p95 = np.percentile(values, (50, 95))
+
+            latencies_ms[name] = {
+                "p50": round(float(p50), 3),
+                "p95": round(float(p95), 3),
+                "max": round(float(values.max()), 3)
+            }
+
+        return {
+            "queued": self._queue.qsize(),
+            "queued_control": self._control_queue.qsize(),
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "latency_ms": latencies_ms
+        }
+
+if __name__ == "__main__":
+    # Ответ на /stop, пока общий пул занят пачкой медленных ответов (волна подарков)
+    BURST_SIZE = 200
+    SLOW_REPLY_SECONDS = 0.05
+    REPLY_SECONDS = 0.02
+
+    async def main() -> None:
+        dispatcher = CommandDispatcher(workers=4)
+
+        runner = asyncio.create_task(dispatcher.run())
+
+        async def slow_reply() -> None:
+            await asyncio.sleep(SLOW_REPLY_SECONDS)
+
+        async def stop_reply() -> None:
+            await asyncio.sleep(REPLY_SECONDS)
+
+        for _ in range(BURST_SIZE):
+            dispatcher.submit("status", slow_reply)
+
+        for _ in range(20):
+            await asyncio.sleep(0.05)
+
+            dispatcher.submit("stop", stop_reply, priority=PRIORITY_CONTROL)
+
+        await asyncio.sleep(0.1)
+
+        status = dispatcher.get_status()
+
+        print(f"queued status replies left: {status['queued']}")
+        print(f"/stop latency: {status['latency_ms']['stop']} (reply itself takes {REPLY_SECONDS * 1000:.0f}ms)")
+
+        runner.cancel()
+
+    asyncio.run(main())
@@ -1,10 +1,25 @@
+import json
 import logging
 import os
+import socket
 from pathlib import Path
 
 # Константы
 WORK_DIRPATH = Path(__file__).parent
 
+def getenv_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+
+    if value is None:
+        return default
+
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+# Профиль ресурсов: lean - для маленьких инстансов (короткая история логов,
+# стикеры на диске вместо памяти, меньшие кэши); отдельные значения переопределяются ниже
+RUNTIME_PROFILE = os.getenv("RUNTIME_PROFILE", "default").strip().lower()
+IS_LEAN_PROFILE = RUNTIME_PROFILE == "lean"
+
 # Основные настройки из переменных окружения
 SESSION_NAME = os.getenv("SESSION_NAME", "gifts_monitor")
 API_ID = int(os.getenv("API_ID", "0"))
@@ -20,24 +35,132 @@ BOT_TOKENS = [
 CHECK_INTERVAL = float(os.getenv("CHECK_INTERVAL", "1.0"))
 CHECK_UPGRADES_PER_CYCLE = float(os.getenv("CHECK_UPGRADES_PER_CYCLE", "2.0"))
 
+# Push-детект (см. push_detection.py): посты канала и сервисные обновления запускают опрос сразу
+WATCH_CHANNEL = os.getenv("WATCH_CHANNEL", "gifts_detector")  # пусто - не слушать канал
+WATCH_CHANNEL_AUTO_JOIN = getenv_bool("WATCH_CHANNEL_AUTO_JOIN", False)
+PUSH_POLL_MIN_INTERVAL = float(os.getenv("PUSH_POLL_MIN_INTERVAL", "0.2"))
+
 DATA_FILEPATH = WORK_DIRPATH / "star_gifts.json"
 DATA_SAVER_DELAY = float(os.getenv("DATA_SAVER_DELAY", "2.0"))
 
+# Мониторинг задержки event loop (см. loop_monitor.py)
+LOOP_LAG_SAMPLE_INTERVAL = float(os.getenv("LOOP_LAG_SAMPLE_INTERVAL", "0.1"))
+LOOP_LAG_STALL_THRESHOLD = float(os.getenv("LOOP_LAG_STALL_THRESHOLD", "0.25"))
+
+# uvloop вместо стандартного цикла (нужен pip install uvloop)
+USE_UVLOOP = getenv_bool("USE_UVLOOP", False)
+
+# Где выполнять CPU-работу (разбор каталога): inline / thread / process (см. offload.py)
+CPU_EXECUTOR = os.getenv("CPU_EXECUTOR", "thread")
+CPU_EXECUTOR_WORKERS = int(os.getenv("CPU_EXECUTOR_WORKERS", "1"))
+
+# Бинарный снапшот каталога для быстрого тёплого старта (см. star_gifts_snapshot.py)
+DATA_SNAPSHOT_ENABLED = getenv_bool("DATA_SNAPSHOT_ENABLED", True)
+DATA_SNAPSHOT_FILEPATH = WORK_DIRPATH / "star_gifts.snapshot"
+
+# Аналитика продаж (см. analytics.py): история остатков в NumPy-колонках
+ANALYTICS_ENABLED = getenv_bool("ANALYTICS_ENABLED", True)
+ANALYTICS_FILEPATH = WORK_DIRPATH / "analytics.npz"
+ANALYTICS_SAVE_INTERVAL = float(os.getenv("ANALYTICS_SAVE_INTERVAL", "60.0"))
+
 NOTIFY_CHAT_ID = int(os.getenv("NOTIFY_CHAT_ID", "0"))
 NOTIFY_UPGRADES_CHAT_ID = int(os.getenv("NOTIFY_UPGRADES_CHAT_ID", "0")) if os.getenv("NOTIFY_UPGRADES_CHAT_ID") else None
 
+# Подписчики общего опроса (см. subscribers.py); без файла - один получатель NOTIFY_CHAT_ID
+SUBSCRIBERS_FILEPATH = Path(os.environ["SUBSCRIBERS_FILEPATH"]) if os.getenv("SUBSCRIBERS_FILEPATH") else None  # JSON {"subscribers": [{chat_id, filters, escalation}]}
+
+# Запись ответов GetStarGifts для replay.py (см. star_gifts_capture.py); пусто - не писать
+CAPTURE_FILEPATH = Path(os.environ["CAPTURE_FILEPATH"]) if os.getenv("CAPTURE_FILEPATH") else None
+
+# Пороги правок сообщений о подарках (см. edit_throttle.py); распродажа правится всегда
+EDIT_MIN_DELTA = int(os.getenv("EDIT_MIN_DELTA", "1"))
+EDIT_MIN_PERCENT = float(os.getenv("EDIT_MIN_PERCENT", "1.0"))  # % от тиража
+EDIT_MIN_INTERVAL = float(os.getenv("EDIT_MIN_INTERVAL", "3.0"))
+EDIT_THRESHOLDS_FILEPATH = Path(os.environ["EDIT_THRESHOLDS_FILEPATH"]) if os.getenv("EDIT_THRESHOLDS_FILEPATH") else None  # JSON {id: {min_delta, min_percent, min_interval}}
+
+# Планировщик MTProto-запросов (см. mtproto_scheduler.py)
+MTPROTO_MAX_IN_FLIGHT = int(os.getenv("MTPROTO_MAX_IN_FLIGHT", "4"))  # для фоновых полос, детект не ограничен
+MTPROTO_MAX_FLOOD_WAIT = float(os.getenv("MTPROTO_MAX_FLOOD_WAIT", "120.0"))  # дольше - ошибка, а не ожидание
+MTPROTO_CLIENT_SLEEP_THRESHOLD = int(os.getenv("MTPROTO_CLIENT_SLEEP_THRESHOLD", "10"))  # для вызовов вне планировщика
+
+# Соединение опроса (см. connection_manager.py): тёплый резервный клиент и собственные keepalive-пинги
+MTPROTO_STANDBY_ENABLED = getenv_bool("MTPROTO_STANDBY_ENABLED", not IS_LEAN_PROFILE)
+MTPROTO_PING_INTERVAL = float(os.getenv("MTPROTO_PING_INTERVAL", "15.0"))
+MTPROTO_PING_TIMEOUT = float(os.getenv("MTPROTO_PING_TIMEOUT", "5.0"))
+MTPROTO_MAX_PING_FAILURES = int(os.getenv("MTPROTO_MAX_PING_FAILURES", "2"))  # подряд до переключения на резерв
+MTPROTO_RECONNECT_TIMEOUT = float(os.getenv("MTPROTO_RECONNECT_TIMEOUT", "30.0"))
+MTPROTO_METHOD_BUDGETS = {  # запросов в секунду по методам, переопределяется JSON в MTPROTO_METHOD_BUDGETS
+    "GetStarGiftUpgradePreview": {"rate": 2.0, "burst": 2},
+    "download_media": {"rate": 5.0, "burst": 5},
+    "send_sticker": {"rate": 1.0, "burst": 3},
+    **json.loads(os.getenv("MTPROTO_METHOD_BUDGETS", "{}"))
+}
+
+# Воркеры ответов на команды бота; /stop обслуживается отдельным воркером (см. command_dispatcher.py)
+COMMAND_WORKERS = int(os.getenv("COMMAND_WORKERS", "4"))
+
+# Эскалация интенсивных уведомлений (см. escalation.py)
+MAX_NOTIFICATIONS = int(os.getenv("MAX_NOTIFICATIONS", "20"))  # лимит вызовов Bot API на одно оповещение
+NOTIFICATION_INTERVAL = float(os.getenv("NOTIFICATION_INTERVAL", "3.0"))  # базовый шаг лестницы по умолчанию
+ESCALATION_POLICY_FILEPATH = Path(os.environ["ESCALATION_POLICY_FILEPATH"]) if os.getenv("ESCALATION_POLICY_FILEPATH") else None  # JSON с EscalationPolicy
+
 NOTIFY_AFTER_STICKER_DELAY = float(os.getenv("NOTIFY_AFTER_STICKER_DELAY", "1.0"))
 NOTIFY_AFTER_TEXT_DELAY = float(os.getenv("NOTIFY_AFTER_TEXT_DELAY", "2.0"))
 
+# Сколько стикеров (и их file_id в Bot API) держать заранее скачанными
+ALERT_ASSETS_CACHE_SIZE = int(os.getenv("ALERT_ASSETS_CACHE_SIZE", "16" if IS_LEAN_PROFILE else "64"))
+# Стикеры скачиваются в файлы и отправляются потоком с диска, без копий в памяти
+ALERT_ASSETS_ON_DISK = getenv_bool("ALERT_ASSETS_ON_DISK", IS_LEAN_PROFILE)
+ALERT_ASSETS_DIRPATH = WORK_DIRPATH / "stickers"
+
 # Важно! Эта переменная нужна для импорта в detector.py
 TIMEZONE = os.getenv("TIMEZONE", "UTC")
 
 # Настройки логирования
-CONSOLE_LOG_LEVEL = logging.DEBUG
-FILE_LOG_LEVEL = logging.INFO
+CONSOLE_LOG_LEVEL = logging.getLevelNamesMapping()[os.getenv("CONSOLE_LOG_LEVEL", "DEBUG").upper()]
+FILE_LOG_LEVEL = logging.getLevelNamesMapping()[os.getenv("FILE_LOG_LEVEL", "INFO").upper()]
+LOG_JSON = getenv_bool("LOG_JSON", False)
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "3" if IS_LEAN_PROFILE else "1000"))  # лишние старые файлы удаляются при старте
+
+# tracemalloc для /status (заметно замедляет работу - только для диагностики)
+MEMORY_TRACEMALLOC = getenv_bool("MEMORY_TRACEMALLOC", False)
+
+# Не больше LOG_DEBUG_SAMPLE_BURST DEBUG-записей с одной строки за интервал (0 - без ограничения)
+LOG_DEBUG_SAMPLE_INTERVAL = float(os.getenv("LOG_DEBUG_SAMPLE_INTERVAL", "5.0"))
+LOG_DEBUG_SAMPLE_BURST = int(os.getenv("LOG_DEBUG_SAMPLE_BURST", "5"))
 
 HTTP_REQUEST_TIMEOUT = float(os.getenv("HTTP_REQUEST_TIMEOUT", "20.0"))
 
+# Перезапуск фоновых задач (см. supervisor.py) и корректное завершение
+SUPERVISOR_RESTART_INITIAL_DELAY = float(os.getenv("SUPERVISOR_RESTART_INITIAL_DELAY", "0.5"))
+SUPERVISOR_RESTART_MAX_DELAY = float(os.getenv("SUPERVISOR_RESTART_MAX_DELAY", "30.0"))
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "10.0"))
+
+# Автопокупка новых подарков (см. purchase_engine.py), по умолчанию выключена
+AUTO_PURCHASE_ENABLED = getenv_bool("AUTO_PURCHASE_ENABLED", False)
+AUTO_PURCHASE_PEER = os.getenv("AUTO_PURCHASE_PEER", "me")
+AUTO_PURCHASE_HIDE_NAME = getenv_bool("AUTO_PURCHASE_HIDE_NAME", False)
+AUTO_PURCHASE_MAX_PRICE = int(os.environ["AUTO_PURCHASE_MAX_PRICE"]) if os.getenv("AUTO_PURCHASE_MAX_PRICE") else None
+AUTO_PURCHASE_ONLY_LIMITED = getenv_bool("AUTO_PURCHASE_ONLY_LIMITED", True)
+AUTO_PURCHASE_MIN_TOTAL_AMOUNT = int(os.environ["AUTO_PURCHASE_MIN_TOTAL_AMOUNT"]) if os.getenv("AUTO_PURCHASE_MIN_TOTAL_AMOUNT") else None
+AUTO_PURCHASE_MAX_TOTAL_AMOUNT = int(os.environ["AUTO_PURCHASE_MAX_TOTAL_AMOUNT"]) if os.getenv("AUTO_PURCHASE_MAX_TOTAL_AMOUNT") else None
+AUTO_PURCHASE_QUANTITY = int(os.getenv("AUTO_PURCHASE_QUANTITY", "1"))
+AUTO_PURCHASE_STARS_BUDGET = int(os.environ["AUTO_PURCHASE_STARS_BUDGET"]) if os.getenv("AUTO_PURCHASE_STARS_BUDGET") else None
+
+# Несколько экземпляров с общим состоянием (см. coordination.py); без пути - один экземпляр
+COORDINATION_DB_FILEPATH = Path(os.environ["COORDINATION_DB_FILEPATH"]) if os.getenv("COORDINATION_DB_FILEPATH") else None
+INSTANCE_ID = os.getenv("INSTANCE_ID", f"{socket.gethostname()}-{os.getpid()}")
+LEADER_LEASE_TTL = float(os.getenv("LEADER_LEASE_TTL", "0.75"))
+LEADER_RENEW_INTERVAL = float(os.getenv("LEADER_RENEW_INTERVAL", "0.2"))
+CLAIM_LEASE_TTL = float(os.getenv("CLAIM_LEASE_TTL", "3.0"))
+
+# Поток событий для внешних потребителей (см. gift_events.py)
+EVENTS_BUFFER_SIZE = int(os.getenv("EVENTS_BUFFER_SIZE", "256"))
+EVENTS_SLOW_CONSUMER_POLICY = os.getenv("EVENTS_SLOW_CONSUMER_POLICY", "drop_oldest")  # drop_oldest / drop_newest / disconnect
+EVENTS_KEEPALIVE_INTERVAL = float(os.getenv("EVENTS_KEEPALIVE_INTERVAL", "15.0"))
+EVENTS_UNIX_SOCKET_PATH = Path(os.environ["EVENTS_UNIX_SOCKET_PATH"]) if os.getenv("EVENTS_UNIX_SOCKET_PATH") else None
+
 # Тексты уведомлений (оригинальные из config.example.py)
 NOTIFY_TEXT = """{title}
 
@@ -74,8 +197,8 @@ def validate_config():
     if not BOT_TOKENS:
         errors.append("BOT_TOKENS не заданы")
     
-    if not NOTIFY_CHAT_ID or NOTIFY_CHAT_ID == 0:
-        errors.append("NOTIFY_CHAT_ID не задан")
+    if (not NOTIFY_CHAT_ID or NOTIFY_CHAT_ID == 0) and not SUBSCRIBERS_FILEPATH:
+        errors.append("NOTIFY_CHAT_ID или SUBSCRIBERS_FILEPATH не задан")
     
     if errors:
         raise ValueError(f"Ошибки конфигурации: {', '.join(errors)}")
@@ -0,0 +1,245 @@
+"""
+MTProto-соединение для опроса каталога: тёплый резервный клиент на той же
+авторизации (in-memory сессия без обновлений), собственные keepalive-пинги и
+переключение на резерв, когда основной клиент не отвечает. Переподключение
+упавшего клиента идёт в фоне, его длительность - метрика в /status
+"""
+
+from collections import deque
+
+from pyrogram.raw.functions.ping import Ping
+
+import asyncio
+import logging
+import random
+import time
+import typing
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CLIENT_FACTORY_T = typing.Callable[[str], typing.Any]  # session_string -> Client
+
+class ClientState:
+    """Состояние одного клиента под наблюдением"""
+
+    def __init__(self, name: str, client: typing.Any, has_handlers: bool = False) -> None:
+        self.name = name
+        self.client = client
+        self.has_handlers = has_handlers  # на клиенте зарегистрированы обработчики обновлений
+
+        self.consecutive_failures = 0
+        self.last_rtt: float | None = None
+        self.last_ok_at: float | None = None  # time.monotonic()
+        self.reconnect_task: asyncio.Task[None] | None = None
+
+    @property
+    def is_healthy(self) -> bool:
+        return self.client.is_connected and self.consecutive_failures == 0 and not self.is_reconnecting
+
+    @property
+    def is_reconnecting(self) -> bool:
+        return self.reconnect_task is not None and not self.reconnect_task.done()
+
+class ConnectionManager:
+    def __init__(
+        self,
+        primary: typing.Any,
+        standby_factory: CLIENT_FACTORY_T | None = None,
+        ping_interval: float = 15.0,
+        ping_timeout: float = 5.0,
+        max_ping_failures: int = 2,
+        reconnect_timeout: float = 30.0,
+        latency_window: int = 100
+    ) -> None:
+        self.standby_factory = standby_factory
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.max_ping_failures = max_ping_failures
+        self.reconnect_timeout = reconnect_timeout
+
+        self.failovers = 0
+        self.reconnects = 0
+        self.reconnect_failures = 0
+
+        self._primary = ClientState("primary", primary, has_handlers=True)
+        self._standby: ClientState | None = None
+        self._active = self._primary
+
+        self._reconnect_latencies: deque[float] = deque(maxlen=latency_window)
+
+    @property
+    def client(self) -> typing.Any:
+        """Клиент для запросов критического пути"""
+        return self._active.client
+
+    async def start(self) -> None:
+        """Поднимает резервный клиент на сессии основного"""
+        if self.standby_factory is None or self._standby is not None:
+            return
+
+        session_string = await self._primary.client.export_session_string()
+
+        standby = self.standby_factory(session_string)
+
+        await standby.start()
+
+        self._standby = ClientState("standby", standby)
+
+        logger.info("Warm standby MTProto client started")
+
+    async def stop(self) -> None:
+        for state in self._get_states():
+            if state.reconnect_task is not None:
+                state.reconnect_task.cancel()
+
+        if self._standby is not None and self._standby.client.is_connected:
+            await self._standby.client.stop()
+
+    def _get_states(self) -> list[ClientState]:
+        return [self._primary] if self._standby is None else [self._primary, self._standby]
+
+    def _failover(self, reason: str) -> bool:
+        """Переключение активного клиента на здоровый; False - переключаться некуда"""
+        for state in self._get_states():
+            if state is not self._active and state.is_healthy:
+                logger.warning(f"MTProto failover {self._active.name} -> {state.name}: {reason}")
+
+                self._active = state
+                self.failovers += 1
+
+                return True
+
+        return False
+
+    def _schedule_reconnect(self, state: ClientState) -> None:
+        if not state.is_reconnecting:
+            state.reconnect_task = asyncio.create_task(self._reconnect(state), name=f"reconnect-{state.name}")
+
+    async def _reconnect(self, state: ClientState) -> None:
+        started_at = time.perf_counter()
+
+        try:
+            if state.client.is_connected and state.has_handlers:
+                # Client.restart() -> terminate() -> Dispatcher.stop() очищает все обработчики:
+                # клиент с обработчиками переподключается на уровне сессии
+                await asyncio.wait_for(state.client.session.restart(), self.reconnect_timeout)
+
+            elif state.client.is_connected:
+                await asyncio.wait_for(state.client.restart(), self.reconnect_timeout)
+
+            else:
+                await asyncio.wait_for(state.client.start(), self.reconnect_timeout)
+
+        except Exception as ex:
+            self.reconnect_failures += 1
+
+            logger.error(f"Failed to reconnect {state.name} MTProto client: {ex}")
+
+            return
+
+        latency = time.perf_counter() - started_at
+
+        self.reconnects += 1
+        self._reconnect_latencies.append(latency)
+
+        state.consecutive_failures = 0
+
+        logger.info(f"{state.name} MTProto client reconnected in {latency * 1000:.0f}ms")
+
+    def _on_failure(self, state: ClientState, reason: str) -> None:
+        state.consecutive_failures += 1
+
+        if state.consecutive_failures < self.max_ping_failures and state.client.is_connected:
+            return
+
+        if state is self._active:
+            self._failover(reason)
+
+        self._schedule_reconnect(state)
+
+    async def _ping(self, state: ClientState) -> None:
+        if state.is_reconnecting:
+            return
+
+        if not state.client.is_connected:
+            self._on_failure(state, "disconnected")
+
+            return
+
+        started_at = time.perf_counter()
+
+        try:
+            await asyncio.wait_for(
+                state.client.invoke(Ping(ping_id=random.getrandbits(63)), retries=0, timeout=self.ping_timeout),
+                self.ping_timeout
+            )
+
+        except Exception as ex:
+            logger.warning(f"Ping of {state.name} MTProto client failed: {type(ex).__name__} {ex}")
+
+            self._on_failure(state, "ping failed")
+
+            return
+
+        state.last_rtt = time.perf_counter() - started_at
+        state.last_ok_at = time.monotonic()
+        state.consecutive_failures = 0
+
+    async def get_client(self) -> typing.Any:
+        """Клиент для опроса; отключённый активный клиент заменяется без ожидания пинга"""
+        if not self._active.client.is_connected and not self._failover("disconnected"):
+            # Резерва нет - переподключение прямо в цикле опроса
+            self._schedule_reconnect(self._active)
+
+            reconnect_task = self._active.reconnect_task
+
+            if reconnect_task is not None:
+                await asyncio.shield(reconnect_task)
+
+        return self._active.client
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.gather(*(self._ping(state) for state in self._get_states()))
+
+            # Основной клиент снова в строю - опрос возвращается на него
+            if self._active is not self._primary and self._primary.is_healthy:
+                logger.info(f"MTProto client {self._active.name} -> primary: primary is healthy again")
+
+                self._active = self._primary
+
+            await asyncio.sleep(self.ping_interval)
+
+    def get_status(self) -> dict[str, typing.Any]:
+        reconnect_latencies: dict[str, float] | None = None
+
+        if self._reconnect_latencies:
+            values = np.fromiter(self._reconnect_latencies, dtype=np.float64) * 1000
+
+            reconnect_latencies = {
+                "last": round(float(values[-1]), 1),
+                "p50": round(float(np.percentile(values, 50)), 1),
+                "max": round(float(values.max()), 1)
+            }
+
+        now = time.monotonic()
+
+        return {
+            "active": self._active.name,
+            "failovers": self.failovers,
+            "reconnects": self.reconnects,
+            "reconnect_failures": self.reconnect_failures,
+            "reconnect_latency_ms": reconnect_latencies,
+            "clients": {
+                state.name: {
+                    "is_connected": state.client.is_connected,
+                    "is_reconnecting": state.is_reconnecting,
+                    "consecutive_failures": state.consecutive_failures,
+                    "ping_rtt_ms": round(state.last_rtt * 1000, 1) if state.last_rtt is not None else None,
+                    "last_ok_seconds_ago": round(now - state.last_ok_at, 1) if state.last_ok_at is not None else None
+                }
+                for state in self._get_states()
+            }
+        }
@@ -0,0 +1,447 @@
+"""
+Координация нескольких экземпляров бота (active-active)
+Все экземпляры опрашивают каталог, а разовые действия (новый подарок,
+покупка) выполняются ровно один раз через аренды; правки сообщений и
+проверку улучшений выполняет лидер. Общий каталог хранится в бэкенде.
+
+SQLiteCoordinationBackend - локальная замена общего хранилища (один хост /
+общий том, тесты); время берётся из time.time(), часы хостов должны быть
+синхронизированы.
+"""
+
+from functools import partial
+from pathlib import Path
+
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+import typing
+
+import simplejson as json
+
+from star_gifts_data import StarGiftData
+
+logger = logging.getLogger(__name__)
+
+CLAIM_ACQUIRED = "acquired"
+CLAIM_HELD = "held"  # держит другой экземпляр
+CLAIM_DONE = "done"  # уже выполнено
+
+LEADER_LEASE_NAME = "leader"
+
+# Доля TTL, на которую локальный срок лидерства короче аренды: запас на задержку ответа и расхождение часов
+LEADER_LEASE_SAFETY_FRACTION = 0.25
+
+class CoordinationBackend(typing.Protocol):
+    def try_acquire(self, name: str, owner: str, ttl: float) -> str: ...
+
+    def get_lease(self, name: str) -> tuple[str, float] | None: ...
+
+    def release(self, name: str, owner: str) -> None: ...
+
+    def complete(self, name: str, owner: str) -> None: ...
+
+    def save_star_gifts(self, star_gifts: typing.Iterable[StarGiftData]) -> None: ...
+
+    def load_star_gifts(self) -> list[StarGiftData]: ...
+
+    def load_star_gift_messages(self, star_gift_ids: typing.Collection[int]) -> dict[int, dict[int, int]]: ...
+
+class SQLiteCoordinationBackend:
+    def __init__(self, db_filepath: Path) -> None:
+        self.db_filepath = db_filepath
+
+        self._lock = threading.Lock()
+
+        self._connection = sqlite3.connect(
+            db_filepath.as_posix(),
+            timeout = 5.0,
+            isolation_level = None,
+            check_same_thread = False
+        )
+
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS leases (
+                    name TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    done INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS star_gifts (
+                    id INTEGER PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            # Сообщения о подарках отдельно от data: экземпляр без сообщения не затрёт чужое при сохранении подарка
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS star_gift_messages (
+                    star_gift_id INTEGER NOT NULL,
+                    chat_id INTEGER NOT NULL,
+                    message_id INTEGER NOT NULL,
+                    PRIMARY KEY (star_gift_id, chat_id)
+                )
+            """)
+
+    def try_acquire(self, name: str, owner: str, ttl: float) -> str:
+        now = time.time()
+
+        with self._lock:
+            cursor = self._connection.execute(
+                """
+                INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+                WHERE leases.done = 0 AND (leases.owner = excluded.owner OR leases.expires_at < ?)
+                """,
+                (name, owner, now + ttl, now)
+            )
+
+            if cursor.rowcount > 0:
+                return CLAIM_ACQUIRED
+
+            row = self._connection.execute(
+                "SELECT done FROM leases WHERE name = ?",
+                (name,)
+            ).fetchone()
+
+        return CLAIM_DONE if row and row[0] else CLAIM_HELD
+
+    def get_lease(self, name: str) -> tuple[str, float] | None:
+        """(владелец, expires_at) действующей аренды"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT owner, expires_at FROM leases WHERE name = ?",
+                (name,)
+            ).fetchone()
+
+        return (row[0], row[1]) if row else None
+
+    def release(self, name: str, owner: str) -> None:
+        with self._lock:
+            self._connection.execute(
+                "DELETE FROM leases WHERE name = ? AND owner = ? AND done = 0",
+                (name, owner)
+            )
+
+    def complete(self, name: str, owner: str) -> None:
+        with self._lock:
+            self._connection.execute(
+                "UPDATE leases SET done = 1 WHERE name = ? AND owner = ?",
+                (name, owner)
+            )
+
+    def save_star_gifts(self, star_gifts: typing.Iterable[StarGiftData]) -> None:
+        now = time.time()
+
+        star_gifts = list(star_gifts)
+
+        rows = [
+            (star_gift.id, star_gift.model_dump_json(), now)
+            for star_gift in star_gifts
+        ]
+
+        message_rows = [
+            (star_gift.id, chat_id, message_id)
+            for star_gift in star_gifts
+            for chat_id, message_id in star_gift.messages.items()
+        ]
+
+        with self._lock:
+            self._connection.execute("BEGIN")
+
+            try:
+                self._connection.executemany(
+                    """
+                    INSERT INTO star_gifts (id, data, updated_at) VALUES (?, ?, ?)
+                    ON CONFLICT (id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at
+                    """,
+                    rows
+                )
+
+                self._connection.executemany(
+                    """
+                    INSERT INTO star_gift_messages (star_gift_id, chat_id, message_id) VALUES (?, ?, ?)
+                    ON CONFLICT (star_gift_id, chat_id) DO NOTHING
+                    """,
+                    message_rows
+                )
+
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+            self._connection.execute("COMMIT")
+
+    def load_star_gifts(self) -> list[StarGiftData]:
+        with self._lock:
+            rows = self._connection.execute("SELECT data FROM star_gifts ORDER BY id").fetchall()
+            message_rows = self._connection.execute("SELECT star_gift_id, chat_id, message_id FROM star_gift_messages").fetchall()
+
+        messages = _group_messages(message_rows)
+
+        star_gifts = [
+            StarGiftData.model_validate(json.loads(data))
+            for data, in rows
+        ]
+
+        for star_gift in star_gifts:
+            star_gift.messages = messages.get(star_gift.id, {}) | star_gift.messages
+
+        return star_gifts
+
+    def load_star_gift_messages(self, star_gift_ids: typing.Collection[int]) -> dict[int, dict[int, int]]:
+        """star_gift_id -> {chat_id: message_id} сообщений, отправленных любым экземпляром"""
+        if not star_gift_ids:
+            return {}
+
+        with self._lock:
+            message_rows = self._connection.execute(
+                f"""SELECT star_gift_id, chat_id, message_id FROM star_gift_messages WHERE star_gift_id IN ({", ".join("?" * len(star_gift_ids))})""",
+                tuple(star_gift_ids)
+            ).fetchall()
+
+        return _group_messages(message_rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+def _group_messages(message_rows: list[tuple[int, int, int]]) -> dict[int, dict[int, int]]:
+    messages: dict[int, dict[int, int]] = {}
+
+    for star_gift_id, chat_id, message_id in message_rows:
+        messages.setdefault(star_gift_id, {})[chat_id] = message_id
+
+    return messages
+
+class Coordinator:
+    """Выбор лидера и разовые действия поверх CoordinationBackend"""
+
+    def __init__(
+        self,
+        backend: CoordinationBackend,
+        instance_id: str,
+        leader_ttl: float,
+        renew_interval: float,
+        claim_ttl: float
+    ) -> None:
+        self.backend = backend
+        self.instance_id = instance_id
+        self.leader_ttl = leader_ttl
+        self.renew_interval = renew_interval
+        self.claim_ttl = claim_ttl
+
+        self.leadership_changes = 0
+        self.last_failover_seconds: float | None = None  # от последнего продления прежним лидером до захвата
+
+        self.on_leadership_acquired: typing.Callable[[], typing.Awaitable[None]] | None = None
+
+        self._leader_lease: tuple[str, float] | None = None
+        self._leader_deadline = 0.0  # time.monotonic(), до которого аренда лидера точно наша
+        self._pending: dict[str, typing.Callable[[], typing.Awaitable[typing.Any]]] = {}
+        self._tasks: set[asyncio.Task[typing.Any]] = set()
+
+    @property
+    def is_leader(self) -> bool:
+        """Проверяется по сроку аренды, а не по последнему продлению: завис цикл - лидерство истекает само"""
+        return self._leader_deadline > time.monotonic()
+
+    async def _call(self, func: typing.Callable[..., typing.Any], *args: typing.Any) -> typing.Any:
+        # Дисковые операции - вне event loop
+        return await asyncio.to_thread(func, *args)
+
+    async def run_leader_election(self) -> None:
+        while True:
+            # Срок считается от запроса: ответ мог прийти с задержкой
+            requested_at = time.monotonic()
+
+            try:
+                state = await self._call(self.backend.try_acquire, LEADER_LEASE_NAME, self.instance_id, self.leader_ttl)
+
+            except Exception as ex:
+                logger.warning(f"Leader lease renewal failed: {ex}")
+
+                state = CLAIM_HELD
+
+            if state == CLAIM_ACQUIRED:
+                # Истёкший по сроку лидер (завис цикл) перехватывает аренду заново
+                is_acquired = not self.is_leader
+
+                self._leader_deadline = requested_at + self.leader_ttl * (1 - LEADER_LEASE_SAFETY_FRACTION)
+
+                if is_acquired:
+                    self.leadership_changes += 1
+
+                    if self._leader_lease is not None:
+                        _, expires_at = self._leader_lease
+
+                        self.last_failover_seconds = round(time.time() - (expires_at - self.leader_ttl), 3)
+
+                    logger.info(f"Instance {self.instance_id} became leader")
+
+                    if self.on_leadership_acquired:
+                        # Отдельной задачей: долгий обработчик не должен задерживать продление аренды
+                        self._spawn(self.on_leadership_acquired(), "Leadership acquired handler")
+
+            else:
+                if self._leader_deadline:
+                    logger.warning(f"Instance {self.instance_id} lost leadership")
+
+                self._leader_deadline = 0.0
+
+                try:
+                    self._leader_lease = await self._call(self.backend.get_lease, LEADER_LEASE_NAME)
+
+                except Exception:
+                    pass
+
+            await self._retry_pending()
+
+            await asyncio.sleep(self.renew_interval)
+
+    async def _renew_claim(self, key: str, action_task: "asyncio.Future[typing.Any]") -> None:
+        """Продлевает аренду действия; если аренда могла истечь или перехвачена, действие останавливается"""
+        renewed_at = time.monotonic()
+
+        while True:
+            await asyncio.sleep(self.claim_ttl / 3)
+
+            requested_at = time.monotonic()
+
+            try:
+                state = await self._call(self.backend.try_acquire, key, self.instance_id, self.claim_ttl)
+
+            except Exception as ex:
+                logger.warning(f"Claim {key} renewal failed: {ex}")
+
+                state = None
+
+            if state == CLAIM_ACQUIRED:
+                renewed_at = requested_at
+
+                continue
+
+            # Следующая попытка уже после истечения аренды: другой экземпляр может повторить действие
+            if state is not None or time.monotonic() + self.claim_ttl / 3 >= renewed_at + self.claim_ttl:
+                logger.error(f"Claim {key} is lost, stopping the action")
+
+                action_task.cancel()
+
+                return
+
+    async def run_once(self, key: str, factory: typing.Callable[[], typing.Awaitable[typing.Any]]) -> bool:
+        """Выполняет действие, только если ни один экземпляр его ещё не выполнил
+
+        Если действие держит другой экземпляр, оно запоминается и будет
+        перехвачено после истечения его аренды (экземпляр умер)
+        """
+        state = await self._call(self.backend.try_acquire, key, self.instance_id, self.claim_ttl)
+
+        if state == CLAIM_HELD:
+            self._pending[key] = factory
+
+            return False
+
+        self._pending.pop(key, None)
+
+        if state != CLAIM_ACQUIRED:
+            return False
+
+        action_task = asyncio.ensure_future(factory())
+        renew_task = asyncio.create_task(self._renew_claim(key, action_task))
+
+        try:
+            await action_task
+
+        except asyncio.CancelledError:
+            await self._call(self.backend.release, key, self.instance_id)
+
+            # Остановлено из-за потери аренды, а не отменой снаружи
+            if renew_task.done() and not renew_task.cancelled():
+                return False
+
+            raise
+
+        except BaseException:
+            # Другой экземпляр сможет повторить
+            await self._call(self.backend.release, key, self.instance_id)
+            raise
+
+        finally:
+            renew_task.cancel()
+
+        await self._call(self.backend.complete, key, self.instance_id)
+
+        return True
+
+    async def claim(self, key: str) -> bool:
+        """Разовое действие без повторов (например, покупка): сразу помечается выполненным"""
+        state = await self._call(self.backend.try_acquire, key, self.instance_id, self.claim_ttl)
+
+        if state != CLAIM_ACQUIRED:
+            return False
+
+        await self._call(self.backend.complete, key, self.instance_id)
+
+        return True
+
+    async def _retry_pending(self) -> None:
+        for key, factory in list(self._pending.items()):
+            if key not in self._pending:
+                continue
+
+            state = await self._call(self.backend.try_acquire, key, self.instance_id, self.claim_ttl)
+
+            if state == CLAIM_DONE:
+                self._pending.pop(key, None)
+
+            elif state == CLAIM_ACQUIRED:
+                logger.warning(f"Taking over abandoned action {key}")
+
+                # Аренда уже наша, run_once её продлит и завершит
+                self._pending.pop(key, None)
+
+                self._spawn(self.run_once(key, factory), "Taken over action")
+
+    def _spawn(self, coro: typing.Coroutine[typing.Any, typing.Any, typing.Any], description: str) -> None:
+        task = asyncio.create_task(coro)
+
+        self._tasks.add(task)
+        task.add_done_callback(partial(self._on_task_done, description))
+
+    def _on_task_done(self, description: str, task: "asyncio.Task[typing.Any]") -> None:
+        self._tasks.discard(task)
+
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"{description} failed: {task.exception()}")
+
+    async def save_star_gifts(self, star_gifts: typing.Iterable[StarGiftData]) -> None:
+        await self._call(self.backend.save_star_gifts, list(star_gifts))
+
+    async def load_star_gifts(self) -> list[StarGiftData]:
+        return await self._call(self.backend.load_star_gifts)
+
+    async def load_star_gift_messages(self, star_gift_ids: typing.Collection[int]) -> dict[int, dict[int, int]]:
+        return await self._call(self.backend.load_star_gift_messages, list(star_gift_ids))
+
+    async def resign(self) -> None:
+        """Отдать лидерство при остановке, чтобы другой экземпляр перехватил его сразу"""
+        if self.is_leader:
+            self._leader_deadline = 0.0
+
+            await self._call(self.backend.release, LEADER_LEASE_NAME, self.instance_id)
+
+    def get_status(self) -> dict[str, typing.Any]:
+        return {
+            "instance_id": self.instance_id,
+            "is_leader": self.is_leader,
+            "leadership_changes": self.leadership_changes,
+            "last_failover_seconds": self.last_failover_seconds,
+            "pending_actions": len(self._pending)
+        }
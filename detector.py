@@ -1,26 +1,52 @@
 from pyrogram import Client, types, filters
+from pyrogram.handlers import MessageHandler, EditedMessageHandler, RawUpdateHandler
+from pyrogram.errors import FloodWait
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from httpx import AsyncClient, TimeoutException
-from pytz import timezone as _timezone
 from io import BytesIO
+from pathlib import Path
 from itertools import cycle, groupby
 from bisect import bisect_left
-from functools import partial
+from functools import partial, lru_cache
 
-import math
+import time
+import signal
 import asyncio
 import typing
 import logging
 
-from parse_data import get_all_star_gifts, check_is_star_gift_upgradable
+from parse_data import get_star_gifts_catalog, check_is_star_gift_upgradable
+from catalog_diff import CatalogSnapshot, diff_catalogs
 from star_gifts_data import StarGiftData, StarGiftsData
 from intensive_notifier import IntensiveNotifier
+from alert_assets import AlertAssetCache
+from supervisor import Supervisor, RestartPolicy, RESTART_ALWAYS
+from runtime_status import register_status_provider
+from coordination import Coordinator, SQLiteCoordinationBackend
+from loop_monitor import LoopLagMonitor
+from edit_throttle import EditThrottle, EditThreshold, EditThresholds
+from subscribers import Subscriber, SubscriberIndex, load_subscribers
+from star_gifts_capture import star_gifts_capture
+from analytics import gift_analytics, render_summary_text
+from push_detection import PollTrigger, make_raw_update_handler, make_message_handler
+from mtproto_scheduler import mtproto_scheduler, LANE_MEDIA
+from connection_manager import ConnectionManager
+from command_dispatcher import CommandDispatcher, PRIORITY_CONTROL, PRIORITY_HIGH
+from escalation import get_acknowledgement, get_message_acknowledgement
+from purchase_engine import PurchaseEngine, PurchaseRules, PyrogramPurchaseBackend
+from gift_events import gift_event_bus, serve_unix_socket, EVENT_NEW_GIFT, EVENT_AVAILABILITY_CHANGED, EVENT_SOLD_OUT, EVENT_BECAME_UPGRADABLE
 
 import utils
+import offload
+import formatting
+import resources
 import constants
 import config
 
-timezone = _timezone(config.TIMEZONE)
+timezone = formatting.get_timezone(config.TIMEZONE)
+
+# Время в тексте подарка собирается раз в секунду на все правки
+notify_clock = formatting.CachedClock(timezone)
 
 NULL_STR = ""
 
@@ -35,62 +61,141 @@ BASIC_REQUEST_DATA = {
 
 BOTS_AMOUNT = len(config.BOT_TOKENS)
 
-if BOTS_AMOUNT > 0:
-    BOT_HTTP_CLIENT = AsyncClient(
-        base_url = "https://api.telegram.org/",
-        timeout = config.HTTP_REQUEST_TIMEOUT
-    )
+# Сообщения о подарках шлёт и правит один бот: чужое сообщение в личном чате бот не отредактирует
+GIFT_MESSAGES_BOT_TOKEN = config.BOT_TOKENS[0] if BOTS_AMOUNT > 0 else None
 
+# Создаётся в main(): drain закрывает клиент, перезапуск main() открывает новый
+BOT_HTTP_CLIENT: AsyncClient | None = None
+
+if BOTS_AMOUNT > 0:
     BOT_TOKENS_CYCLE = cycle(config.BOT_TOKENS)
 
-STAR_GIFTS_DATA = StarGiftsData.load(config.DATA_FILEPATH)
+STAR_GIFTS_DATA = StarGiftsData.load(
+    data_filepath = config.DATA_FILEPATH,
+    snapshot_filepath = (
+        config.DATA_SNAPSHOT_FILEPATH
+        if config.DATA_SNAPSHOT_ENABLED else
+        None
+    )
+)
 last_star_gifts_data_saved_time: int | None = None
 
 logger = utils.get_logger(
     name = config.SESSION_NAME,
     log_filepath = constants.LOG_FILEPATH,
     console_log_level = config.CONSOLE_LOG_LEVEL,
-    file_log_level = config.FILE_LOG_LEVEL
+    file_log_level = config.FILE_LOG_LEVEL,
+    json_format = config.LOG_JSON,
+    max_bytes = config.LOG_MAX_BYTES,
+    backup_count = config.LOG_BACKUP_COUNT,
+    debug_sample_interval = config.LOG_DEBUG_SAMPLE_INTERVAL,
+    debug_sample_burst = config.LOG_DEBUG_SAMPLE_BURST
+)
+
+# Координация нескольких экземпляров (см. coordination.py), задаётся в main()
+coordinator: Coordinator | None = None
+
+# Стикеры скачиваются сразу при обнаружении подарка
+alert_asset_cache = AlertAssetCache(
+    max_entries = config.ALERT_ASSETS_CACHE_SIZE,
+    dirpath = (
+        config.ALERT_ASSETS_DIRPATH
+        if config.ALERT_ASSETS_ON_DISK else
+        None
+    )
 )
 
 # Инициализация системы интенсивных уведомлений
-intensive_notifier = IntensiveNotifier(config)
+intensive_notifier = IntensiveNotifier(config, asset_cache=alert_asset_cache)
+
+# Получатели новых подарков со своими фильтрами (см. subscribers.py)
+subscriber_index = SubscriberIndex(load_subscribers(
+    filepath = config.SUBSCRIBERS_FILEPATH,
+    default_chat_id = config.NOTIFY_CHAT_ID
+))
+
+# Пороги правок сообщений о подарках (см. edit_throttle.py)
+edit_throttle = EditThrottle(
+    default = EditThreshold(
+        min_delta = config.EDIT_MIN_DELTA,
+        min_percent = config.EDIT_MIN_PERCENT,
+        min_interval = config.EDIT_MIN_INTERVAL
+    ),
+    overrides = (
+        EditThresholds.load(config.EDIT_THRESHOLDS_FILEPATH)
+        if config.EDIT_THRESHOLDS_FILEPATH else
+        None
+    )
+)
 
-@typing.overload
-async def bot_send_request(
-    method: str,
-    data: dict[str, typing.Any] | None
-) -> dict[str, typing.Any]: ...
+# Ответы на команды - собственный пул воркеров (см. command_dispatcher.py)
+command_dispatcher = CommandDispatcher(
+    workers = config.COMMAND_WORKERS
+)
+
+START_TEXT = """🎁 Telegram Gifts Monitor Bot
+        
+🔍 Бот мониторит канал @gifts_detector
+📨 Отправляет интенсивные уведомления при новых подарках
+⚡ Работает 24/7
+
+Используйте команды из меню внизу для управления"""
+
+START_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📊 Статус", callback_data="status")],
+    [InlineKeyboardButton("🛑 Остановить", callback_data="stop")],
+    [InlineKeyboardButton("❓ Помощь", callback_data="help")]
+])
+
+HELP_TEXT = """🤖 Команды управления:
+        
+/start - Запустить бота и показать информацию
+/stop - Остановить интенсивные уведомления
+/status - Показать статус системы
+/stats - Аналитика продаж
+/help - Показать это сообщение
+
+🎁 Бот автоматически мониторит канал @gifts_detector и отправляет интенсивные уведомления при новых подарках."""
 
 @typing.overload
 async def bot_send_request(
     method: typing.Literal["editMessageText"],
-    data: dict[str, typing.Any]
+    data: dict[str, typing.Any],
+    bot_token: str | None = None
 ) -> dict[str, typing.Any] | None: ...
 
+@typing.overload
 async def bot_send_request(
     method: str,
-    data: dict[str, typing.Any] | None = None
+    data: dict[str, typing.Any] | None,
+    bot_token: str | None = None
+) -> dict[str, typing.Any]: ...
+
+async def bot_send_request(
+    method: str,
+    data: dict[str, typing.Any] | None = None,
+    bot_token: str | None = None
 ) -> dict[str, typing.Any] | None:
-    logger.debug(f"Sending request {method} with data: {data}")
+    """bot_token - запрос через заданного бота без ротации (сообщение правит только его автор)"""
+    logger.debug("Sending request %s with data: %s", method, data)
 
-    retries = BOTS_AMOUNT
+    retries = BOTS_AMOUNT if bot_token is None else 1
     response = None
 
-    for bot_token in BOT_TOKENS_CYCLE:
+    for bot_token in (BOT_TOKENS_CYCLE if bot_token is None else [bot_token]):
         retries -= 1
 
         if retries < 0:
             break
 
         try:
-            response = (await BOT_HTTP_CLIENT.post(
+            response = (await typing.cast(AsyncClient, BOT_HTTP_CLIENT).post(
                 f"/bot{bot_token}/{method}",
                 json = data
             )).json()
 
         except TimeoutException:
-            logger.warning(f"Timeout exception while sending request {method} with data: {data}")
+            logger.warning("Timeout exception while sending request %s with data: %s", method, data)
 
             continue
 
@@ -102,66 +207,169 @@ async def bot_send_request(
 
     raise RuntimeError(f"Failed to send request to Telegram API: {response}")
 
+def open_bot_http_client() -> AsyncClient:
+    global BOT_HTTP_CLIENT
+
+    if BOT_HTTP_CLIENT is None or BOT_HTTP_CLIENT.is_closed:
+        BOT_HTTP_CLIENT = AsyncClient(
+            base_url = "https://api.telegram.org/",
+            timeout = config.HTTP_REQUEST_TIMEOUT
+        )
+
+    return BOT_HTTP_CLIENT
+
 async def detector(
     app: Client,
     new_gift_callback: typing.Callable[[StarGiftData], typing.Coroutine[None, None, typing.Any]] | None = None,
-    update_gifts_queue: UPDATE_GIFTS_QUEUE_T | None = None
+    update_gifts_queue: UPDATE_GIFTS_QUEUE_T | None = None,
+    purchase_engine: PurchaseEngine | None = None,
+    poll_trigger: PollTrigger | None = None,
+    connection_manager: ConnectionManager | None = None
 ) -> None:
     if new_gift_callback is None and update_gifts_queue is None:
         raise ValueError("At least one of new_gift_callback or update_gifts_queue must be provided")
 
+    previous_snapshot: CatalogSnapshot | None = None
+
     while True:
         logger.debug("Checking for new gifts / updates...")
 
-        if not app.is_connected:
-            await app.start()
+        if poll_trigger:
+            poll_trigger.mark_polled()
 
-        _, all_star_gifts_dict = await get_all_star_gifts(app)
+        if connection_manager:
+            # Упавший клиент заменяется резервом, переподключение - в фоне
+            client = await connection_manager.get_client()
 
-        old_star_gifts_dict = {
-            star_gift.id: star_gift
-            for star_gift in STAR_GIFTS_DATA.star_gifts
-        }
+        else:
+            if not app.is_connected:
+                await app.start()
+
+            client = app
+
+        _, all_star_gifts_dict, catalog_snapshot = await get_star_gifts_catalog(client)
+
+        detected_at = time.perf_counter()
+
+        all_star_gifts_dict = typing.cast(dict[int, StarGiftData], all_star_gifts_dict)
+        catalog_snapshot = typing.cast(CatalogSnapshot, catalog_snapshot)
+
+        # Первый опрос сравнивается с сохранёнными данными, дальше - с прошлым опросом
+        is_baseline_poll = False
+
+        if previous_snapshot is None:
+            previous_snapshot = CatalogSnapshot.from_star_gifts(STAR_GIFTS_DATA.star_gifts)
+
+            # Сохранённых данных нет (первый запуск): новым выглядит весь каталог
+            is_baseline_poll = len(STAR_GIFTS_DATA.star_gifts) == 0
+
+        catalog_diff = diff_catalogs(previous_snapshot, catalog_snapshot)
 
         new_star_gifts = {
-            star_gift_id: star_gift
-            for star_gift_id, star_gift in all_star_gifts_dict.items()
-            if star_gift_id not in old_star_gifts_dict
+            star_gift_id: all_star_gifts_dict[star_gift_id]
+            for star_gift_id in catalog_diff.new_ids.tolist()
         }
 
+        # Покупка стартует первой, до уведомлений
+        if purchase_engine:
+            if is_baseline_poll:
+                logger.warning(f"No saved star gifts data, skipping auto-purchase of {len(new_star_gifts)} gifts from the first poll")
+
+            else:
+                for star_gift in new_star_gifts.values():
+                    purchase_engine.on_new_gift(star_gift, detected_at)
+
+            purchase_engine.forget(catalog_diff.removed_ids.tolist())
+
+        for star_gift in new_star_gifts.values():
+            gift_event_bus.publish(EVENT_NEW_GIFT, star_gift)
+
         if new_star_gifts and new_gift_callback:
             logger.info(f"""Found {len(new_star_gifts)} new gifts: [{", ".join(map(str, new_star_gifts.keys()))}]""")
 
             for star_gift_id, star_gift in new_star_gifts.items():
-                await new_gift_callback(star_gift)
+                if coordinator:
+                    # Уведомление отправит ровно один экземпляр
+                    await coordinator.run_once(
+                        f"new_gift:{star_gift_id}",
+                        partial(prefetch_and_notify, client, new_gift_callback, star_gift)
+                    )
 
-        if update_gifts_queue:
-            for star_gift_id, old_star_gift in old_star_gifts_dict.items():
-                new_star_gift = all_star_gifts_dict.get(star_gift_id)
+                else:
+                    await prefetch_and_notify(client, new_gift_callback, star_gift)
 
-                if new_star_gift is None:
-                    logger.warning("Star gift not found in new gifts, skipping for updating", extra={"star_gift_id": str(star_gift_id)})
+        for star_gift_id in catalog_diff.removed_ids.tolist():
+            logger.warning("Star gift not found in new gifts, skipping for updating", extra={"star_gift_id": str(star_gift_id)})
 
-                    continue
+        # В Python обрабатываются только изменившиеся подарки
+        decreased_star_gifts: list[StarGiftData] = []
+        suppressed_star_gifts: list[StarGiftData] = []
 
-                new_star_gift.message_id = old_star_gift.message_id
+        sold_out_ids = set(catalog_diff.sold_out_ids.tolist())
 
-                if new_star_gift.available_amount < old_star_gift.available_amount:
+        for star_gift_id, previous_available_amount in zip(catalog_diff.decreased_ids.tolist(), catalog_diff.previous_amounts.tolist()):
+            new_star_gift = all_star_gifts_dict[star_gift_id]
+            old_star_gift = find_star_gift(star_gift_id) or new_star_gift
+
+            new_star_gift.messages = old_star_gift.messages
+
+            decreased_star_gifts.append(new_star_gift)
+
+            gift_event_bus.publish(
+                EVENT_AVAILABILITY_CHANGED,
+                new_star_gift,
+                previous_available_amount = previous_available_amount
+            )
+
+            if star_gift_id in sold_out_ids:
+                gift_event_bus.publish(EVENT_SOLD_OUT, new_star_gift)
+
+                intensive_notifier.on_sold_out(star_gift_id)
+
+            if update_gifts_queue:
+                if edit_throttle.should_edit(new_star_gift):
                     update_gifts_queue.put_nowait((old_star_gift, new_star_gift))
 
+                else:
+                    # Правка не нужна, но новый остаток сохраняется
+                    suppressed_star_gifts.append(new_star_gift)
+
+        gift_analytics.record([*new_star_gifts.values(), *decreased_star_gifts])
+
+        if update_gifts_queue:
+            for new_star_gift in edit_throttle.pop_due():
+                update_gifts_queue.put_nowait((new_star_gift, new_star_gift))
+
+        if suppressed_star_gifts:
+            await star_gifts_data_saver(suppressed_star_gifts)
+
         if new_star_gifts:
             await star_gifts_data_saver(list(new_star_gifts.values()))
 
-        await asyncio.sleep(config.CHECK_INTERVAL)
+        previous_snapshot = catalog_snapshot
+
+        if poll_trigger:
+            # Push-событие прерывает ожидание, CHECK_INTERVAL - запасной вариант
+            await poll_trigger.wait(config.CHECK_INTERVAL)
+
+        else:
+            await asyncio.sleep(config.CHECK_INTERVAL)
+
+async def prefetch_and_notify(
+    client: Client,
+    new_gift_callback: typing.Callable[[StarGiftData], typing.Coroutine[None, None, typing.Any]],
+    star_gift: StarGiftData
+) -> None:
+    """Стикер качается только экземпляром, который оповещает о подарке, и через активный клиент"""
+    alert_asset_cache.prefetch(client, star_gift)
+
+    await new_gift_callback(star_gift)
 
 def get_notify_text(star_gift: StarGiftData) -> str:
     is_limited = star_gift.is_limited
 
     available_percentage, available_percentage_is_same = (
-        utils.pretty_float(
-            math.ceil(star_gift.available_amount / star_gift.total_amount * 100 * 100) / 100,
-            get_is_same = True
-        )
+        formatting.pretty_percentage(star_gift.available_amount, star_gift.total_amount)
         if is_limited else
         (
             NULL_STR,
@@ -175,57 +383,122 @@ def get_notify_text(star_gift: StarGiftData) -> str:
         id = star_gift.id,
         total_amount = (
             config.NOTIFY_TEXT_TOTAL_AMOUNT.format(
-                total_amount = utils.pretty_int(star_gift.total_amount)
+                total_amount = formatting.pretty_int(star_gift.total_amount)
             )
             if is_limited else
             NULL_STR
         ),
         available_amount = (
             config.NOTIFY_TEXT_AVAILABLE_AMOUNT.format(
-                available_amount = utils.pretty_int(star_gift.available_amount),
+                available_amount = formatting.pretty_int(star_gift.available_amount),
                 same_str = (
                     NULL_STR
                     if available_percentage_is_same else
                     "~"
                 ),
                 available_percentage = available_percentage,
-                updated_datetime = utils.get_current_datetime(timezone)
+                updated_datetime = notify_clock.format()
             )
             if is_limited else
             NULL_STR
         ),
         sold_out = (
             config.NOTIFY_TEXT_SOLD_OUT.format(
-                sold_out = utils.format_seconds_to_human_readable(star_gift.last_sale_timestamp - star_gift.first_appearance_timestamp)
+                sold_out = formatting.format_duration(star_gift.last_sale_timestamp - star_gift.first_appearance_timestamp)
             )
             if star_gift.last_sale_timestamp and star_gift.first_appearance_timestamp else
             NULL_STR
         ),
-        price = utils.pretty_int(star_gift.price),
-        convert_price = utils.pretty_int(star_gift.convert_price)
+        price = formatting.pretty_int(star_gift.price),
+        convert_price = formatting.pretty_int(star_gift.convert_price)
     )
 
+def render_notify_texts(star_gifts: list[StarGiftData]) -> list[str]:
+    return [
+        get_notify_text(star_gift)
+        for star_gift in star_gifts
+    ]
+
+@lru_cache(maxsize=64)
+def render_status_text(is_active: bool, current_notifications: int, max_notifications: int, interval: float) -> str:
+    return f"""📊 Статус системы:
+        
+🔄 Активность: {'🟢 Активен' if is_active else '🔴 Неактивен'}
+📨 Уведомления: {current_notifications}/{max_notifications}
+⏱️ Интервал: {interval}с
+🎯 Мониторинг: @gifts_detector"""
+
+def get_status_text(chat_id: int) -> str:
+    """Текст статуса пересобирается только при изменении значений"""
+    status = intensive_notifier.get_status(chat_id)
+
+    return render_status_text(
+        status["is_active"],
+        status["current_notifications"],
+        status["max_notifications"],
+        status["interval"]
+    )
+
+async def send_gift_message(star_gift: StarGiftData, chat_id: int, text: str) -> None:
+    """Сообщение о подарке получателю; по мере продаж его правит process_update_gifts"""
+    try:
+        message = await bot_send_request(
+            "sendMessage",
+            {
+                "chat_id": chat_id,
+                "text": text
+            } | BASIC_REQUEST_DATA,
+            bot_token = GIFT_MESSAGES_BOT_TOKEN
+        )
+
+    except Exception as ex:
+        logger.error(f"Failed to send gift message to {chat_id}: {ex}", extra={"star_gift_id": str(star_gift.id)})
+
+        return
+
+    star_gift.messages[chat_id] = message["message_id"]
+
 async def process_new_gift(app: Client, star_gift: StarGiftData) -> None:
     """Обработка нового подарка с интенсивными уведомлениями"""
     logger.info(f"🎁 Обнаружен новый подарок: {star_gift.id}")
     
-    # Скачиваем стикер
-    binary = typing.cast(BytesIO, await app.download_media(
-        message = star_gift.sticker_file_id,
-        in_memory = True
-    ))
-    binary.name = star_gift.sticker_file_name
+    # Получатели по предрассчитанному индексу фильтров
+    recipients = subscriber_index.match(star_gift)
+    
+    if not recipients:
+        logger.info(f"Нет подписчиков для подарка {star_gift.id}")
+        return
+    
+    await notify_subscribers(app, star_gift, recipients)
+
+async def notify_subscribers(app: Client, star_gift: StarGiftData, recipients: list[Subscriber]) -> None:
+    """Интенсивные уведомления и сообщения о подарке получателям (новый подарок или подтверждённая улучшаемость)"""
+    # Одно скачивание стикера и один текст на всех получателей; новый подарок уже качается (prefetch_and_notify), текст не ждёт стикер
+    sticker_task = alert_asset_cache.prefetch(app, star_gift)
     
     # Получаем текст уведомления
     gift_message = get_notify_text(star_gift)
     
-    # Запускаем интенсивные уведомления
-    logger.info("🚨 ЗАПУСК ИНТЕНСИВНЫХ УВЕДОМЛЕНИЙ!")
-    await intensive_notifier.start_intensive_notifications(
-        chat_id=config.NOTIFY_CHAT_ID,
-        gift_message=gift_message,
-        sticker_data=binary.getvalue(),
-        sticker_filename=star_gift.sticker_file_name
+    # Запускаем интенсивные уведомления: ждём только первый шаг, дальше эскалация идёт в фоне
+    # Параллельно каждому получателю уходит сообщение о подарке, которое потом правится по мере продаж
+    logger.info(f"🚨 ЗАПУСК ИНТЕНСИВНЫХ УВЕДОМЛЕНИЙ! Получателей: {len(recipients)}")
+    await asyncio.gather(
+        *(
+            intensive_notifier.launch_intensive_notifications(
+                subscriber.chat_id,
+                gift_message=gift_message,
+                sticker_data=sticker_task,
+                sticker_filename=star_gift.sticker_file_name,
+                star_gift_id=star_gift.id,
+                policy=subscriber.escalation
+            )
+            for subscriber in recipients
+        ),
+        *(
+            send_gift_message(star_gift, subscriber.chat_id, gift_message)
+            for subscriber in recipients
+            if GIFT_MESSAGES_BOT_TOKEN
+        )
     )
 
 async def process_update_gifts(update_gifts_queue: UPDATE_GIFTS_QUEUE_T) -> None:
@@ -252,34 +525,80 @@ async def process_update_gifts(update_gifts_queue: UPDATE_GIFTS_QUEUE_T) -> None
             key = lambda star_gift: star_gift.id
         )
 
-        for new_star_gift in [\
-            min(\
-                gifts,\
-                key = lambda star_gift: star_gift.available_amount\
-            )\
-            for _, gifts in groupby(\
-                new_star_gifts,\
-                key = lambda star_gift: star_gift.id\
-            )\
-        ]:
-            if new_star_gift.message_id is None:
-                continue
-
-            await bot_send_request(
-                "editMessageText",
-                {
-                    "chat_id": config.NOTIFY_CHAT_ID,
-                    "message_id": new_star_gift.message_id,
-                    "text": get_notify_text(new_star_gift)
-                } | BASIC_REQUEST_DATA
-            )
+        # Сообщения правит только лидер, остальные лишь сохраняют состояние
+        if coordinator and not coordinator.is_leader:
+            await star_gifts_data_saver(new_star_gifts)
+
+            continue
+
+        # Сообщение о подарке мог отправить другой экземпляр (выигравший new_gift:...), правит его лидер
+        await merge_shared_gift_messages(new_star_gifts)
+
+        edited_star_gifts = [
+            new_star_gift
+            for new_star_gift in [\
+                min(\
+                    gifts,\
+                    key = lambda star_gift: star_gift.available_amount\
+                )\
+                for _, gifts in groupby(\
+                    new_star_gifts,\
+                    key = lambda star_gift: star_gift.id\
+                )\
+            ]
+            if new_star_gift.messages
+        ]
 
-            logger.debug(f"Star gift updated with {new_star_gift.available_amount} available amount", extra={"star_gift_id": str(new_star_gift.id)})
+        # Форматирование закэшировано (см. formatting.py): рендер в event loop дешевле очереди к io-потоку за сохранениями
+        notify_texts = render_notify_texts(edited_star_gifts)
+
+        for new_star_gift, notify_text in zip(edited_star_gifts, notify_texts):
+            # У каждого получателя своё сообщение о подарке
+            for chat_id, message_id in list(new_star_gift.messages.items()):
+                try:
+                    await bot_send_request(
+                        "editMessageText",
+                        {
+                            "chat_id": chat_id,
+                            "message_id": message_id,
+                            "text": notify_text
+                        } | BASIC_REQUEST_DATA,
+                        bot_token = GIFT_MESSAGES_BOT_TOKEN
+                    )
+
+                except RuntimeError as ex:
+                    # Сообщение удалено или чат заблокировал бота - остальные получатели всё равно обновляются
+                    logger.warning(f"Failed to edit gift message in {chat_id}: {ex}", extra={"star_gift_id": str(new_star_gift.id)})
+
+            logger.debug("Star gift updated with %d available amount", new_star_gift.available_amount, extra={"star_gift_id": str(new_star_gift.id)})
 
         await star_gifts_data_saver(new_star_gifts)
 
 star_gifts_data_saver_lock = asyncio.Lock()
 
+def make_standby_client(session_string: str) -> Client:
+    """Резервный клиент на авторизации основного: сессия в памяти, без обновлений"""
+    return Client(
+        name = f"{config.SESSION_NAME}_standby",
+        api_id = config.API_ID,
+        api_hash = config.API_HASH,
+        session_string = session_string,
+        in_memory = True,
+        no_updates = True,
+        sleep_threshold = config.MTPROTO_CLIENT_SLEEP_THRESHOLD
+    )
+
+def find_star_gift(star_gift_id: int) -> StarGiftData | None:
+    """Поиск в отсортированном по id STAR_GIFTS_DATA.star_gifts"""
+    star_gifts = STAR_GIFTS_DATA.star_gifts
+
+    pos = bisect_left(star_gifts, star_gift_id, key=lambda star_gift: star_gift.id)
+
+    if pos < len(star_gifts) and star_gifts[pos].id == star_gift_id:
+        return star_gifts[pos]
+
+    return None
+
 async def star_gifts_data_saver(star_gifts: StarGiftData | list[StarGiftData]) -> None:
     global STAR_GIFTS_DATA, last_star_gifts_data_saved_time
 
@@ -290,10 +609,7 @@ async def star_gifts_data_saver(star_gifts: StarGiftData | list[StarGiftData]) -
         updated_gifts_list = list(STAR_GIFTS_DATA.star_gifts)
 
         for star_gift in star_gifts:
-            pos = bisect_left([\
-                gift.id\
-                for gift in updated_gifts_list\
-            ], star_gift.id)
+            pos = bisect_left(updated_gifts_list, star_gift.id, key=lambda gift: gift.id)
 
             if pos < len(updated_gifts_list) and updated_gifts_list[pos].id == star_gift.id:
                 updated_gifts_list[pos] = star_gift
@@ -301,40 +617,139 @@ async def star_gifts_data_saver(star_gifts: StarGiftData | list[StarGiftData]) -
             else:
                 updated_gifts_list.insert(pos, star_gift)
 
+        STAR_GIFTS_DATA.star_gifts = updated_gifts_list
+
+        if coordinator:
+            await coordinator.save_star_gifts(star_gifts)
+
         if last_star_gifts_data_saved_time is None or last_star_gifts_data_saved_time + config.DATA_SAVER_DELAY < utils.get_current_timestamp():
-            STAR_GIFTS_DATA.save()
+            # Сериализация - в event loop, пока подарки никто не меняет; запись файлов - вне его
+            await offload.run_blocking(STAR_GIFTS_DATA.write, STAR_GIFTS_DATA.dump())
 
             last_star_gifts_data_saved_time = utils.get_current_timestamp()
 
             logger.debug("Saved star gifts data file")
 
+async def flush_star_gifts_data() -> None:
+    """Принудительное сохранение (при завершении), минуя DATA_SAVER_DELAY"""
+    async with star_gifts_data_saver_lock:
+        await offload.run_blocking(STAR_GIFTS_DATA.write, STAR_GIFTS_DATA.dump())
+
+        logger.info("Star gifts data flushed")
+
+async def merge_shared_star_gifts() -> None:
+    """Подтягивает общий каталог других экземпляров (сообщения о подарках, is_upgradable)"""
+    if not coordinator:
+        return
+
+    local_star_gifts_dict = {
+        star_gift.id: star_gift
+        for star_gift in STAR_GIFTS_DATA.star_gifts
+    }
+
+    merged_star_gifts: list[StarGiftData] = []
+
+    for shared_star_gift in await coordinator.load_star_gifts():
+        local_star_gift = local_star_gifts_dict.get(shared_star_gift.id)
+
+        if local_star_gift is None:
+            merged_star_gifts.append(shared_star_gift)
+
+            continue
+
+        is_changed = False
+
+        if shared_star_gift.messages.keys() - local_star_gift.messages.keys():
+            local_star_gift.messages = shared_star_gift.messages | local_star_gift.messages
+            is_changed = True
+
+        if shared_star_gift.is_upgradable and not local_star_gift.is_upgradable:
+            local_star_gift.is_upgradable = True
+            is_changed = True
+
+        if is_changed:
+            merged_star_gifts.append(local_star_gift)
+
+    if merged_star_gifts:
+        logger.info(f"Merged {len(merged_star_gifts)} star gifts from shared state")
+
+        await star_gifts_data_saver(merged_star_gifts)
+
+async def merge_shared_gift_messages(star_gifts: list[StarGiftData]) -> None:
+    """Дополняет messages подарков сообщениями, отправленными другими экземплярами"""
+    if not coordinator:
+        return
+
+    try:
+        shared_messages = await coordinator.load_star_gift_messages({
+            star_gift.id
+            for star_gift in star_gifts
+        })
+
+    except Exception as ex:
+        logger.warning(f"Failed to load shared gift messages: {ex}")
+
+        return
+
+    for star_gift in star_gifts:
+        messages = shared_messages.get(star_gift.id)
+
+        if messages and messages.keys() - star_gift.messages.keys():
+            star_gift.messages = messages | star_gift.messages
+
 async def star_gifts_upgrades_checker(app: Client) -> None:
     while True:
+        if coordinator and not coordinator.is_leader:
+            await asyncio.sleep(config.CHECK_UPGRADES_PER_CYCLE)
+
+            continue
+
         for star_gift_id, star_gift in {
             star_gift.id: star_gift
             for star_gift in STAR_GIFTS_DATA.star_gifts
             if not star_gift.is_upgradable
         }.items():
-            if await check_is_star_gift_upgradable(
-                app = app,
-                star_gift_id = star_gift_id
-            ):
+            try:
+                is_upgradable = await check_is_star_gift_upgradable(
+                    app = app,
+                    star_gift_id = star_gift_id
+                )
+
+            except FloodWait:
+                # Метод заблокирован планировщиком, следующий раунд дождётся окончания FLOOD_WAIT
+                break
+
+            if is_upgradable:
                 logger.info(f"Star gift {star_gift_id} is upgradable")
 
                 if config.NOTIFY_UPGRADES_CHAT_ID:
-                    logger.debug(f"Sending upgrade notification for star gift {star_gift_id}")
+                    logger.debug("Sending upgrade notification for star gift %d", star_gift_id)
+
+                    alert_asset_cache.pin(star_gift_id)
 
-                    binary = typing.cast(BytesIO, await app.download_media(
-                        message = star_gift.sticker_file_id,
-                        in_memory = True
-                    ))
+                    try:
+                        sticker = await alert_asset_cache.get_sticker(app, star_gift)
 
-                    binary.name = star_gift.sticker_file_name
+                        # Скачанный на диск стикер pyrogram отправляет прямо из файла
+                        if isinstance(sticker, Path):
+                            sticker_file: str | BytesIO = sticker.as_posix()
 
-                    sticker_message = typing.cast(types.Message, await app.send_sticker(
-                        chat_id = config.NOTIFY_UPGRADES_CHAT_ID,
-                        sticker = binary
-                    ))
+                        else:
+                            sticker_file = BytesIO(sticker)
+                            sticker_file.name = star_gift.sticker_file_name
+
+                        sticker_message = typing.cast(types.Message, await mtproto_scheduler.run(
+                            LANE_MEDIA,
+                            "send_sticker",
+                            partial(
+                                app.send_sticker,
+                                chat_id = config.NOTIFY_UPGRADES_CHAT_ID,
+                                sticker = sticker_file
+                            )
+                        ))
+
+                    finally:
+                        alert_asset_cache.unpin(star_gift_id)
 
                     await asyncio.sleep(config.NOTIFY_AFTER_STICKER_DELAY)
 
@@ -351,23 +766,39 @@ async def star_gifts_upgrades_checker(app: Client) -> None:
 
                 star_gift.is_upgradable = True
 
+                # Подписчики с фильтром is_upgradable=True узнают о подарке только сейчас; распроданный будить незачем
+                if star_gift.first_appearance_timestamp is not None and not (star_gift.is_limited and star_gift.available_amount == 0):
+                    recipients = subscriber_index.match_upgradable(star_gift)
+
+                    if recipients:
+                        logger.info(f"Star gift {star_gift_id} matches {len(recipients)} subscribers waiting for upgradable gifts")
+
+                        await notify_subscribers(app, star_gift, recipients)
+
+                gift_analytics.mark_upgradable(star_gift)
+
+                gift_event_bus.publish(EVENT_BECAME_UPGRADABLE, star_gift)
+
                 await star_gifts_data_saver(star_gift)
 
                 await asyncio.sleep(config.NOTIFY_AFTER_TEXT_DELAY)
 
             else:
-                logger.debug(f"Star gift {star_gift_id} is not upgradable")
+                logger.debug("Star gift %d is not upgradable", star_gift_id)
 
         await asyncio.sleep(config.CHECK_UPGRADES_PER_CYCLE)
 
-async def logger_wrapper(coro: typing.Awaitable[T]) -> T | None:
-    try:
-        return await coro
-    except Exception as ex:
-        logger.exception(f"""Error in {getattr(coro, "__name__", coro)}: {ex}""")
+async def analytics_saver() -> None:
+    while True:
+        await asyncio.sleep(config.ANALYTICS_SAVE_INTERVAL)
+
+        await offload.run_blocking(gift_analytics.save)
 
 async def main() -> None:
-    logger.info("🚀 Starting intensive gifts detector...")
+    logger.info(f"🚀 Starting intensive gifts detector ({config.RUNTIME_PROFILE} profile)...")
+
+    if config.MEMORY_TRACEMALLOC:
+        resources.start_tracemalloc()
     
     # Валидация конфигурации
     try:
@@ -381,12 +812,146 @@ async def main() -> None:
         name = config.SESSION_NAME,
         api_id = config.API_ID,
         api_hash = config.API_HASH,
-        sleep_threshold = 60
+        sleep_threshold = config.MTPROTO_CLIENT_SLEEP_THRESHOLD  # длинные FLOOD_WAIT обрабатывает mtproto_scheduler
     )
 
     await app.start()
     logger.info("✅ Подключен к Telegram")
 
+    supervisor = Supervisor(
+        drain_timeout = config.SHUTDOWN_DRAIN_TIMEOUT
+    )
+
+    # Выполняются в обратном порядке: данные сохраняются до закрытия клиентов
+    supervisor.add_cleanup("telegram_client", app.stop)
+
+    try:
+        await run_supervised(app, supervisor)
+
+    finally:
+        # Если упала настройка до supervisor.run(), клиенты и пулы потоков всё равно закрываются
+        await supervisor.drain()
+
+    logger.info("👋 Detector stopped")
+
+async def run_supervised(app: Client, supervisor: Supervisor) -> None:
+    """Настройка фоновых задач и работа до остановки супервизора"""
+    register_status_provider("supervisor", supervisor.get_status)
+
+    loop_lag_monitor = LoopLagMonitor(
+        interval = config.LOOP_LAG_SAMPLE_INTERVAL,
+        stall_threshold = config.LOOP_LAG_STALL_THRESHOLD
+    )
+
+    register_status_provider("event_loop", loop_lag_monitor.get_status)
+
+    restart_policy = RestartPolicy(
+        mode = RESTART_ALWAYS,
+        initial_delay = config.SUPERVISOR_RESTART_INITIAL_DELAY,
+        max_delay = config.SUPERVISOR_RESTART_MAX_DELAY
+    )
+
+    connection_manager = ConnectionManager(
+        primary = app,
+        standby_factory = (
+            make_standby_client
+            if config.MTPROTO_STANDBY_ENABLED else
+            None
+        ),
+        ping_interval = config.MTPROTO_PING_INTERVAL,
+        ping_timeout = config.MTPROTO_PING_TIMEOUT,
+        max_ping_failures = config.MTPROTO_MAX_PING_FAILURES,
+        reconnect_timeout = config.MTPROTO_RECONNECT_TIMEOUT
+    )
+
+    try:
+        await connection_manager.start()
+
+    except Exception as ex:
+        # Без резерва опрос работает как раньше, только через основной клиент
+        logger.error(f"❌ Не удалось запустить резервный клиент: {ex}")
+
+    supervisor.add_cleanup("connection_manager", connection_manager.stop)
+
+    register_status_provider("connection", connection_manager.get_status)
+
+    # Клиенты Bot API закрыты прошлым drain, если main() перезапущен
+    if BOTS_AMOUNT > 0:
+        supervisor.add_cleanup("bot_http_client", open_bot_http_client().aclose)
+
+    intensive_notifier.open()
+
+    supervisor.add_cleanup("intensive_notifier", intensive_notifier.close)
+    supervisor.add_cleanup("alert_assets", alert_asset_cache.close)
+
+    register_status_provider("notifications", intensive_notifier.get_status)
+    register_status_provider("subscribers", subscriber_index.get_status)
+    register_status_provider("commands", command_dispatcher.get_status)
+    register_status_provider("mtproto", mtproto_scheduler.get_status)
+    register_status_provider("edits", edit_throttle.get_status)
+    register_status_provider("formatting", formatting.get_cache_status)
+    register_status_provider("alert_assets", alert_asset_cache.get_status)
+    # Процесс и диск, не состояние event loop: считается в потоке /status
+    register_status_provider("memory", partial(
+        resources.get_memory_status,
+        directories = {
+            "logs": constants.LOGS_DIRPATH,
+            "stickers": config.ALERT_ASSETS_DIRPATH
+        }
+    ), is_thread_safe=True)
+
+    if star_gifts_capture is not None:
+        # Закрывается после offload_executors: очередь записи кадров уже дописана
+        supervisor.add_cleanup("star_gifts_capture", star_gifts_capture.close)
+
+        register_status_provider("capture", star_gifts_capture.get_status)
+
+    supervisor.add_cleanup("offload_executors", offload.shutdown)
+    supervisor.add_cleanup("star_gifts_data", flush_star_gifts_data)
+
+    if config.ANALYTICS_ENABLED:
+        await offload.run_blocking(gift_analytics.load)
+
+        register_status_provider("analytics", gift_analytics.get_status)
+
+        supervisor.add_task(
+            "analytics_saver",
+            analytics_saver,
+            restart_policy
+        )
+
+        supervisor.add_cleanup("analytics", partial(offload.run_blocking, gift_analytics.save))
+
+    await offload.warm_up()
+
+    global coordinator
+
+    if config.COORDINATION_DB_FILEPATH:
+        coordinator = Coordinator(
+            backend = SQLiteCoordinationBackend(config.COORDINATION_DB_FILEPATH),
+            instance_id = config.INSTANCE_ID,
+            leader_ttl = config.LEADER_LEASE_TTL,
+            renew_interval = config.LEADER_RENEW_INTERVAL,
+            claim_ttl = config.CLAIM_LEASE_TTL
+        )
+
+        coordinator.on_leadership_acquired = merge_shared_star_gifts
+
+        register_status_provider("coordination", coordinator.get_status)
+
+        await merge_shared_star_gifts()
+
+        supervisor.add_task(
+            "leader_election",
+            coordinator.run_leader_election,
+            restart_policy
+        )
+
+        supervisor.add_cleanup("coordinator", coordinator.resign)
+
+    else:
+        logger.info("Coordination backend is not set, running as a single instance")
+
     update_gifts_queue = (
         UPDATE_GIFTS_QUEUE_T()
         if BOTS_AMOUNT > 0 else
@@ -394,22 +959,120 @@ async def main() -> None:
     )
 
     if update_gifts_queue:
-        asyncio.create_task(logger_wrapper(
-            process_update_gifts(
+        supervisor.add_task(
+            "process_update_gifts",
+            partial(
+                process_update_gifts,
                 update_gifts_queue = update_gifts_queue
-            )
-        ))
+            ),
+            restart_policy
+        )
 
     else:
         logger.info("No bots available, skipping update gifts processing")
 
-    if config.NOTIFY_UPGRADES_CHAT_ID:
-        asyncio.create_task(logger_wrapper(
-            star_gifts_upgrades_checker(app)
-        ))
+    # Проверка нужна и каналу улучшений, и подписчикам с фильтром is_upgradable=True
+    if config.NOTIFY_UPGRADES_CHAT_ID or subscriber_index.has_upgradable_filters:
+        supervisor.add_task(
+            "star_gifts_upgrades_checker",
+            partial(star_gifts_upgrades_checker, app),
+            restart_policy
+        )
+
+    else:
+        logger.info("Upgrades channel is not set and no subscriber filters by upgradability, skipping star gifts upgrades checking")
+
+    if config.EVENTS_UNIX_SOCKET_PATH:
+        supervisor.add_task(
+            "gift_events_unix_socket",
+            partial(
+                serve_unix_socket,
+                bus = gift_event_bus,
+                socket_path = config.EVENTS_UNIX_SOCKET_PATH
+            ),
+            restart_policy
+        )
+
+    purchase_engine: PurchaseEngine | None = None
+
+    if config.AUTO_PURCHASE_ENABLED:
+        purchase_engine = PurchaseEngine(
+            backend = PyrogramPurchaseBackend(
+                app = app,
+                peer = config.AUTO_PURCHASE_PEER,
+                hide_name = config.AUTO_PURCHASE_HIDE_NAME
+            ),
+            rules = PurchaseRules(
+                max_price = config.AUTO_PURCHASE_MAX_PRICE,
+                only_limited = config.AUTO_PURCHASE_ONLY_LIMITED,
+                min_total_amount = config.AUTO_PURCHASE_MIN_TOTAL_AMOUNT,
+                max_total_amount = config.AUTO_PURCHASE_MAX_TOTAL_AMOUNT,
+                quantity = config.AUTO_PURCHASE_QUANTITY,
+                stars_budget = config.AUTO_PURCHASE_STARS_BUDGET
+            ),
+            claim = (
+                coordinator.claim
+                if coordinator else
+                None
+            )
+        )
+
+        await purchase_engine.prepare()
+
+        supervisor.add_cleanup("purchase_engine", purchase_engine.drain)
 
     else:
-        logger.info("Upgrades channel is not set, skipping star gifts upgrades checking")
+        logger.info("Auto-purchase is disabled")
+
+    poll_trigger = PollTrigger(
+        min_interval = config.PUSH_POLL_MIN_INTERVAL
+    )
+
+    register_status_provider("push_detection", poll_trigger.get_status)
+
+    watch_channel_id: int | None = None
+
+    if config.WATCH_CHANNEL:
+        try:
+            if config.WATCH_CHANNEL_AUTO_JOIN:
+                await app.join_chat(config.WATCH_CHANNEL)
+
+            watch_channel_id = typing.cast(int, getattr(await app.resolve_peer(config.WATCH_CHANNEL), "channel_id", None))
+
+            logger.info(f"👀 Push-детект: слушаю канал {config.WATCH_CHANNEL} ({watch_channel_id})")
+
+        except Exception as ex:
+            logger.warning(f"Не удалось подключить канал {config.WATCH_CHANNEL} для push-детекта: {ex}")
+
+    # Отдельная группа: обработчики команд в группе 0 продолжают получать сообщения
+    push_message_handler = make_message_handler(
+        poll_trigger = poll_trigger,
+        watch_channel_id = watch_channel_id
+    )
+
+    app.add_handler(MessageHandler(push_message_handler), group=-1)
+    app.add_handler(EditedMessageHandler(push_message_handler), group=-1)
+
+    app.add_handler(RawUpdateHandler(make_raw_update_handler(
+        poll_trigger = poll_trigger,
+        watch_channel_id = watch_channel_id
+    )), group=-1)
+
+    # Прочтение чата оповещений или реакция в нём останавливают эскалацию этого чата: личного чата с ботом или группы подписчика (отдельная группа - push-детект не перехватывает)
+    @app.on_raw_update(group=1)
+    async def handle_alert_acknowledgement(client, update, users, chats):
+        acknowledgement = get_acknowledgement(update, intensive_notifier.bot_ids, client.me.id, subscriber_index)
+
+        if acknowledgement:
+            intensive_notifier.acknowledge(*acknowledgement)
+
+    # Правки сообщений pyrogram разбирает сам, в raw-обработчик они не попадают
+    @app.on_edited_message(group=1)
+    async def handle_alert_reaction(client, message):
+        acknowledgement = get_message_acknowledgement(getattr(message, "raw", None), intensive_notifier.bot_ids, client.me.id, subscriber_index)
+
+        if acknowledgement:
+            intensive_notifier.acknowledge(*acknowledgement)
 
     # Устанавливаем меню команд для бота
     async def setup_bot_menu():
@@ -419,6 +1082,7 @@ async def main() -> None:
                 {"command": "start", "description": "Запустить бота"},
                 {"command": "stop", "description": "Остановить уведомления"},
                 {"command": "status", "description": "Статус системы"},
+                {"command": "stats", "description": "Аналитика продаж"},
                 {"command": "help", "description": "Помощь"}
             ]
             
@@ -430,115 +1094,137 @@ async def main() -> None:
             logger.error(f"❌ Ошибка настройки меню: {e}")
 
     # Добавляем обработчики команд для управления уведомлениями
-    @app.on_message(filters.command("start") & filters.chat(config.NOTIFY_CHAT_ID))
+    # Обработчики pyrogram только ставят ответ в очередь диспетчера, /stop срабатывает сразу
+    # Команды принимаются от любого подписчика и относятся к его оповещению
+    subscriber_chat = filters.create(lambda _, __, message: bool(message.chat) and message.chat.id in subscriber_index)
+
+    @app.on_message(filters.command("start") & subscriber_chat)
     async def handle_start_command(client, message):
         """Запуск бота"""
-        welcome_text = """🎁 Telegram Gifts Monitor Bot
-        
-🔍 Бот мониторит канал @gifts_detector
-📨 Отправляет интенсивные уведомления при новых подарках
-⚡ Работает 24/7
-
-Используйте команды из меню внизу для управления"""
-        
-        # Создаем клавиатуру с кнопками
-        keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("📊 Статус", callback_data="status")],
-            [InlineKeyboardButton("🛑 Остановить", callback_data="stop")],
-            [InlineKeyboardButton("❓ Помощь", callback_data="help")]
-        ])
-        
-        await message.reply(welcome_text, reply_markup=keyboard)
+        command_dispatcher.submit("start", partial(message.reply, START_TEXT, reply_markup=START_KEYBOARD))
     
-    @app.on_message(filters.command("stop") & filters.chat(config.NOTIFY_CHAT_ID))
+    @app.on_message(filters.command("stop") & subscriber_chat)
     async def handle_stop_command(client, message):
         """Остановка интенсивных уведомлений"""
-        if intensive_notifier.stop_notifications():
-            await message.reply("🛑 Интенсивные уведомления остановлены")
-        else:
-            await message.reply("ℹ️ Уведомления не активны")
+        reply_text = (
+            "🛑 Интенсивные уведомления остановлены"
+            if intensive_notifier.stop_notifications(chat_id=message.chat.id) else
+            "ℹ️ Уведомления не активны"
+        )
+        command_dispatcher.submit("stop", partial(message.reply, reply_text), priority=PRIORITY_CONTROL)
     
-    @app.on_message(filters.command("status") & filters.chat(config.NOTIFY_CHAT_ID))
+    @app.on_message(filters.command("status") & subscriber_chat)
     async def handle_status_command(client, message):
         """Статус системы уведомлений"""
-        status = intensive_notifier.get_status()
-        status_text = f"""📊 Статус системы:
+        command_dispatcher.submit("status", partial(message.reply, get_status_text(message.chat.id)), priority=PRIORITY_HIGH)
+    
+    @app.on_message(filters.command("stats") & subscriber_chat)
+    async def handle_stats_command(client, message):
+        """Аналитика продаж"""
+        async def reply_stats():
+            summary = await asyncio.to_thread(gift_analytics.get_summary)
+            await message.reply(render_summary_text(summary))
         
-🔄 Активность: {'🟢 Активен' if status['is_active'] else '🔴 Неактивен'}
-📨 Уведомления: {status['current_notifications']}/{status['max_notifications']}
-⏱️ Интервал: {status['interval']}с
-🎯 Мониторинг: @gifts_detector"""
-        await message.reply(status_text)
+        command_dispatcher.submit("stats", reply_stats)
     
-    @app.on_message(filters.command("help") & filters.chat(config.NOTIFY_CHAT_ID))
+    @app.on_message(filters.command("help") & subscriber_chat)
     async def handle_help_command(client, message):
         """Помощь по командам"""
-        help_text = """🤖 Команды управления:
-        
-/start - Запустить бота и показать информацию
-/stop - Остановить интенсивные уведомления
-/status - Показать статус системы
-/help - Показать это сообщение
-
-🎁 Бот автоматически мониторит канал @gifts_detector и отправляет интенсивные уведомления при новых подарках."""
-        await message.reply(help_text)
+        command_dispatcher.submit("help", partial(message.reply, HELP_TEXT))
     
     # Обработчик нажатий на кнопки
     @app.on_callback_query()
     async def handle_callback_query(client, callback_query):
         """Обработка нажатий на кнопки"""
-        # Проверяем, что это наш пользователь
-        if callback_query.from_user.id != config.NOTIFY_CHAT_ID:
-            await callback_query.answer("❌ Доступ запрещен", show_alert=True)
+        # Проверяем, что это подписчик
+        chat_id = callback_query.from_user.id
+        
+        if chat_id not in subscriber_index:
+            command_dispatcher.submit("callback_denied", partial(callback_query.answer, "❌ Доступ запрещен", show_alert=True))
             return
         
         data = callback_query.data
         
         if data == "status":
-            status = intensive_notifier.get_status()
-            status_text = f"""📊 Статус системы:
-        
-🔄 Активность: {'🟢 Активен' if status['is_active'] else '🔴 Неактивен'}
-📨 Уведомления: {status['current_notifications']}/{status['max_notifications']}
-⏱️ Интервал: {status['interval']}с
-🎯 Мониторинг: @gifts_detector"""
-            await callback_query.answer()
-            await callback_query.edit_message_text(status_text)
+            async def answer_status():
+                await callback_query.answer()
+                await callback_query.edit_message_text(get_status_text(chat_id))
+            
+            command_dispatcher.submit("callback_status", answer_status, priority=PRIORITY_HIGH)
             
         elif data == "stop":
-            if intensive_notifier.stop_notifications():
-                await callback_query.answer("🛑 Уведомления остановлены", show_alert=True)
-                await callback_query.edit_message_text("🛑 Интенсивные уведомления остановлены")
-            else:
-                await callback_query.answer("ℹ️ Уведомления не активны", show_alert=True)
+            is_stopped = intensive_notifier.stop_notifications(chat_id=chat_id)
+            
+            async def answer_stop():
+                if is_stopped:
+                    await callback_query.answer("🛑 Уведомления остановлены", show_alert=True)
+                    await callback_query.edit_message_text("🛑 Интенсивные уведомления остановлены")
+                else:
+                    await callback_query.answer("ℹ️ Уведомления не активны", show_alert=True)
+            
+            command_dispatcher.submit("callback_stop", answer_stop, priority=PRIORITY_CONTROL)
                 
         elif data == "help":
-            help_text = """🤖 Команды управления:
-        
-/start - Запустить бота и показать информацию
-/stop - Остановить интенсивные уведомления
-/status - Показать статус системы
-/help - Показать это сообщение
-
-🎁 Бот автоматически мониторит канал @gifts_detector и отправляет интенсивные уведомления при новых подарках."""
-            await callback_query.answer()
-            await callback_query.edit_message_text(help_text)
+            async def answer_help():
+                await callback_query.answer()
+                await callback_query.edit_message_text(HELP_TEXT)
+            
+            command_dispatcher.submit("callback_help", answer_help)
     
     # Добавляем тестовую команду для проверки обновления
-    @app.on_message(filters.command("test") & filters.chat(config.NOTIFY_CHAT_ID))
+    @app.on_message(filters.command("test") & subscriber_chat)
     async def handle_test_command(client, message):
         """Тестовая команда для проверки обновления"""
-        await message.reply("✅ Обновление успешно! Новые команды работают.")
+        command_dispatcher.submit("test", partial(message.reply, "✅ Обновление успешно! Новые команды работают."))
     
     # Настраиваем меню команд
     await setup_bot_menu()
 
-    logger.info("🔍 Начинаю мониторинг канала @gifts_detector...")
-    await detector(
-        app = app,
-        new_gift_callback = partial(process_new_gift, app),
-        update_gifts_queue = update_gifts_queue
+    supervisor.add_task(
+        "command_dispatcher",
+        command_dispatcher.run,
+        restart_policy
+    )
+
+    supervisor.add_task(
+        "connection_manager",
+        connection_manager.run,
+        restart_policy
+    )
+
+    supervisor.add_task(
+        "loop_lag_monitor",
+        loop_lag_monitor.run,
+        restart_policy
+    )
+
+    supervisor.add_task(
+        "detector",
+        partial(
+            detector,
+            app = app,
+            new_gift_callback = partial(process_new_gift, app),
+            update_gifts_queue = update_gifts_queue,
+            purchase_engine = purchase_engine,
+            poll_trigger = poll_trigger,
+            connection_manager = connection_manager
+        ),
+        restart_policy
     )
 
+    loop = asyncio.get_running_loop()
+
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signal_number, supervisor.stop)
+
+    logger.info("🔍 Начинаю мониторинг канала @gifts_detector...")
+
+    try:
+        await supervisor.run()
+
+    finally:
+        for signal_number in (signal.SIGTERM, signal.SIGINT):
+            loop.remove_signal_handler(signal_number)
+
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,189 @@
+"""
+Пороги правок сообщений о подарках: правка уходит в очередь, только если
+остаток изменился достаточно (абсолютно или в процентах от тиража) и с
+прошлой правки прошло достаточно времени; распродажа правится всегда
+"""
+
+from pydantic import BaseModel, Field, RootModel
+from pathlib import Path
+
+import math
+import time
+import typing
+
+import simplejson as json
+
+from star_gifts_data import StarGiftData
+
+import constants
+
+class EditThreshold(BaseModel):
+    min_delta: int = Field(default=1, ge=1)  # штук с прошлой правки
+    min_percent: float = Field(default=0.0, ge=0.0)  # % от total_amount с прошлой правки
+    min_interval: float = Field(default=0.0, ge=0.0)  # секунд между правками
+
+    def get_min_delta(self, total_amount: int) -> int:
+        return max(self.min_delta, math.ceil(total_amount * self.min_percent / 100))
+
+class EditThresholds(RootModel[dict[int, EditThreshold]]):
+    """Файл порогов по ID подарка"""
+
+    @classmethod
+    def load(cls, filepath: Path) -> dict[int, EditThreshold]:
+        with filepath.open("r", encoding=constants.ENCODING) as file:
+            return cls.model_validate(json.load(file)).root
+
+class LastEdit(typing.NamedTuple):
+    available_amount: int
+    edited_at: float  # time.monotonic()
+
+class EditThrottle:
+    def __init__(self, default: EditThreshold, overrides: dict[int, EditThreshold] | None = None) -> None:
+        self.default = default
+        self.overrides = overrides or {}
+
+        self.requested = 0
+        self.enqueued = 0
+        self.suppressed_delta = 0
+        self.suppressed_interval = 0
+        self.deferred_flushed = 0
+        self.sold_out_edits = 0
+
+        self._last_edits: dict[int, LastEdit] = {}
+        self._deferred: dict[int, StarGiftData] = {}  # отложенные интервалом, дойдут после него
+
+    def get_threshold(self, star_gift_id: int) -> EditThreshold:
+        return self.overrides.get(star_gift_id, self.default)
+
+    def _mark_edited(self, star_gift: StarGiftData, now: float) -> None:
+        self._last_edits[star_gift.id] = LastEdit(
+            available_amount = star_gift.available_amount,
+            edited_at = now
+        )
+
+        self._deferred.pop(star_gift.id, None)
+
+        self.enqueued += 1
+
+    def should_edit(self, star_gift: StarGiftData, now: float | None = None) -> bool:
+        """Решение по уменьшению остатка; True - ставить правку в очередь"""
+        now = now if now is not None else time.monotonic()
+
+        self.requested += 1
+
+        last_edit = self._last_edits.get(star_gift.id)
+
+        # Финальная правка при распродаже обязательна
+        if star_gift.is_limited and star_gift.available_amount == 0:
+            if last_edit is not None and last_edit.available_amount == 0:
+                self.suppressed_delta += 1
+
+                return False
+
+            self.sold_out_edits += 1
+            self._mark_edited(star_gift, now)
+
+            return True
+
+        # Первое изменение после запуска - точка отсчёта
+        if last_edit is None:
+            self._mark_edited(star_gift, now)
+
+            return True
+
+        threshold = self.get_threshold(star_gift.id)
+
+        if last_edit.available_amount - star_gift.available_amount < threshold.get_min_delta(star_gift.total_amount):
+            self.suppressed_delta += 1
+
+            return False
+
+        if now - last_edit.edited_at < threshold.min_interval:
+            self.suppressed_interval += 1
+            self._deferred[star_gift.id] = star_gift
+
+            return False
+
+        self._mark_edited(star_gift, now)
+
+        return True
+
+    def pop_due(self, now: float | None = None) -> list[StarGiftData]:
+        """Отложенные интервалом правки, для которых интервал истёк"""
+        now = now if now is not None else time.monotonic()
+
+        due_star_gifts = [
+            star_gift
+            for star_gift_id, star_gift in self._deferred.items()
+            if now - self._last_edits[star_gift_id].edited_at >= self.get_threshold(star_gift_id).min_interval
+        ]
+
+        for star_gift in due_star_gifts:
+            self._mark_edited(star_gift, now)
+
+        self.deferred_flushed += len(due_star_gifts)
+
+        return due_star_gifts
+
+    def get_status(self) -> dict[str, typing.Any]:
+        suppressed = self.suppressed_delta + self.suppressed_interval - self.deferred_flushed
+
+        return {
+            "requested": self.requested,
+            "enqueued": self.enqueued,
+            "suppressed_delta": self.suppressed_delta,
+            "suppressed_interval": self.suppressed_interval,
+            "deferred_flushed": self.deferred_flushed,
+            "deferred_pending": len(self._deferred),
+            "sold_out_edits": self.sold_out_edits,
+            "saved_calls_percent": round(suppressed / self.requested * 100, 1) if self.requested else 0.0
+        }
+
+if __name__ == "__main__":
+    # Популярный лимитированный подарок распродаётся за 10 минут, опрос раз в секунду
+    import random
+
+    TOTAL_AMOUNT = 50_000
+    POLL_INTERVAL = 1.0
+
+    random.seed(0)
+
+    def simulate(threshold: EditThreshold) -> dict[str, typing.Any]:
+        throttle = EditThrottle(threshold)
+
+        available_amount = TOTAL_AMOUNT
+        now = 0.0
+
+        while available_amount > 0:
+            now += POLL_INTERVAL
+
+            sold = min(available_amount, random.randint(0, 170))
+
+            if sold:
+                available_amount -= sold
+
+                throttle.should_edit(StarGiftData(
+                    id = 1,
+                    number = 1,
+                    sticker_file_id = "",
+                    sticker_file_name = "",
+                    price = 50,
+                    convert_price = 40,
+                    available_amount = available_amount,
+                    total_amount = TOTAL_AMOUNT,
+                    is_limited = True
+                ), now)
+
+            throttle.pop_due(now)
+
+        return throttle.get_status()
+
+    for name, threshold in (
+        ("every change", EditThreshold()),
+        ("1% of total", EditThreshold(min_percent=1.0)),
+        ("3s interval", EditThreshold(min_interval=3.0)),
+        ("1% + 3s", EditThreshold(min_percent=1.0, min_interval=3.0))
+    ):
+        status = simulate(threshold)
+
+        print(f"{name:>14}: edits={status['enqueued']:>4} of {status['requested']} changes, saved {status['saved_calls_percent']}%")
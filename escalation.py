@@ -0,0 +1,159 @@
+"""
+Лестница эскалации уведомлений: декларативная политика шагов (канал,
+повторы, кривая задержек), жёсткий лимит API-вызовов на одно оповещение и
+сигналы остановки - прочтение или реакция пользователя, распродажа подарка
+"""
+
+from pydantic import BaseModel, Field, model_validator
+from pathlib import Path
+
+from pyrogram.raw.types.update_read_history_inbox import UpdateReadHistoryInbox
+from pyrogram.raw.types.update_message_reactions import UpdateMessageReactions
+from pyrogram.raw.types.update_edit_message import UpdateEditMessage
+from pyrogram.raw.types.update_edit_channel_message import UpdateEditChannelMessage
+from pyrogram.raw.types.peer_user import PeerUser
+from pyrogram.raw.types.peer_chat import PeerChat
+from pyrogram.raw.types.peer_channel import PeerChannel
+from pyrogram.utils import get_peer_id
+
+import simplejson as json
+import typing
+
+import constants
+
+CHANNEL_MESSAGE = "message"
+CHANNEL_STICKER = "sticker"
+CHANNEL_PINNED = "pinned"  # сообщение + закрепление со звуком, как "звонок"
+
+# Сколько вызовов Bot API тратит шаг канала (закрепление потом снимается)
+CHANNEL_CALLS = {
+    CHANNEL_MESSAGE: 1,
+    CHANNEL_STICKER: 1,
+    CHANNEL_PINNED: 3
+}
+
+STOP_MANUAL = "manual"
+STOP_READ = "read"
+STOP_REACTION = "reaction"
+STOP_SOLD_OUT = "sold_out"
+STOP_BUDGET = "budget"
+STOP_COMPLETED = "completed"
+
+ACKNOWLEDGEMENT_T = tuple[str, int]  # (причина остановки, chat_id оповещения в Bot API)
+
+class EscalationStep(BaseModel):
+    channel: typing.Literal["message", "sticker", "pinned"] = Field(default=CHANNEL_MESSAGE)
+    repeat: int = Field(default=1, ge=1)
+    delay: float = Field(default=0.0, ge=0.0)  # перед первой отправкой шага
+    backoff: float = Field(default=1.0, ge=1.0)  # множитель задержки между повторами
+    max_delay: float = Field(default=60.0, gt=0.0)
+
+class EscalationPolicy(BaseModel):
+    steps: list[EscalationStep]
+    max_calls: int = Field(default=20, ge=1)
+    stop_on_read: bool = Field(default=True)
+    stop_on_reaction: bool = Field(default=True)
+    stop_on_sold_out: bool = Field(default=True)
+
+    @model_validator(mode="after")
+    def check_steps(self) -> "EscalationPolicy":
+        if not self.steps:
+            raise ValueError("Escalation policy must have at least one step")
+
+        return self
+
+    @classmethod
+    def load(cls, filepath: Path) -> "EscalationPolicy":
+        with filepath.open("r", encoding=constants.ENCODING) as file:
+            return cls.model_validate(json.load(file))
+
+    def iter_actions(self) -> typing.Iterator[tuple[float, str]]:
+        """(задержка перед отправкой, канал) по всем шагам лестницы"""
+        for step in self.steps:
+            delay = step.delay
+
+            for _ in range(step.repeat):
+                yield min(delay, step.max_delay), step.channel
+
+                delay *= step.backoff
+
+    def get_planned_calls(self) -> int:
+        """Вызовов Bot API при проходе всей лестницы без ограничения"""
+        return sum(
+            CHANNEL_CALLS[step.channel] * step.repeat
+            for step in self.steps
+        )
+
+def get_default_policy(interval: float, max_calls: int) -> EscalationPolicy:
+    """Текст и стикер сразу, затем редкие повторы с нарастающей задержкой и закреп"""
+    return EscalationPolicy(
+        max_calls = max_calls,
+        steps = [
+            EscalationStep(channel=CHANNEL_MESSAGE),
+            EscalationStep(channel=CHANNEL_STICKER),
+            EscalationStep(channel=CHANNEL_MESSAGE, repeat=3, delay=interval, backoff=1.5),
+            EscalationStep(channel=CHANNEL_PINNED, delay=interval * 2),
+            EscalationStep(channel=CHANNEL_STICKER, delay=interval * 2),
+            EscalationStep(channel=CHANNEL_MESSAGE, repeat=10, delay=interval * 3, backoff=1.5, max_delay=60.0)
+        ]
+    )
+
+def get_bot_ids(bot_tokens: typing.Iterable[str]) -> set[int]:
+    """ID ботов из токенов вида <id>:<secret>"""
+    return {
+        int(bot_token.split(":", 1)[0])
+        for bot_token in bot_tokens
+        if bot_token.split(":", 1)[0].isdigit()
+    }
+
+def get_alert_chat_id(peer: typing.Any, bot_ids: set[int], own_user_id: int, chat_ids: typing.Container[int]) -> int | None:
+    """chat_id оповещения, к которому относится чат обновления (None - не чат оповещений)
+
+    Обновления приходят клиенту аккаунта сессии: его личный чат с ботом - это
+    оповещения с chat_id самого аккаунта, группы и каналы подписчиков, где он
+    состоит, - оповещения с их chat_id
+    """
+    if isinstance(peer, PeerUser):
+        return own_user_id if peer.user_id in bot_ids else None
+
+    if isinstance(peer, (PeerChat, PeerChannel)):
+        chat_id = get_peer_id(peer)
+
+        return chat_id if chat_id in chat_ids else None
+
+    return None
+
+def get_acknowledgement(update: typing.Any, bot_ids: set[int], own_user_id: int, chat_ids: typing.Container[int] = ()) -> ACKNOWLEDGEMENT_T | None:
+    """Получатель прочитал чат оповещений или поставил реакцию на сообщение бота
+
+    chat_ids - чаты подписчиков (группы и каналы учитываются только из них)
+    """
+    if isinstance(update, UpdateReadHistoryInbox):
+        chat_id = get_alert_chat_id(update.peer, bot_ids, own_user_id, chat_ids)
+
+        return (STOP_READ, chat_id) if chat_id is not None else None
+
+    if isinstance(update, UpdateMessageReactions):
+        chat_id = get_alert_chat_id(update.peer, bot_ids, own_user_id, chat_ids)
+
+        return (STOP_REACTION, chat_id) if chat_id is not None else None
+
+    if isinstance(update, (UpdateEditMessage, UpdateEditChannelMessage)):
+        return get_message_acknowledgement(update.message, bot_ids, own_user_id, chat_ids)
+
+    return None
+
+def get_message_acknowledgement(message: typing.Any, bot_ids: set[int], own_user_id: int, chat_ids: typing.Container[int] = ()) -> ACKNOWLEDGEMENT_T | None:
+    """Реакция на сообщение бота приходит правкой сообщения (pyrogram отдаёт её как EditedMessage)"""
+    if not getattr(message, "reactions", None):
+        return None
+
+    from_id = getattr(message, "from_id", None)
+
+    # В группе реакция считается только на сообщение бота (пост канала автора не указывает)
+    if from_id is not None and not (isinstance(from_id, PeerUser) and from_id.user_id in bot_ids):
+        return None
+
+    chat_id = get_alert_chat_id(getattr(message, "peer_id", None), bot_ids, own_user_id, chat_ids)
+
+    return (STOP_REACTION, chat_id) if chat_id is not None else None
@@ -0,0 +1,140 @@
+"""
+Форматирование для горячих путей (правки сообщений во время распродажи):
+строка текущего времени собирается раз в секунду, числа, проценты и
+длительности мемоизируются, часовой пояс - zoneinfo вместо pytz
+"""
+
+from datetime import datetime, tzinfo
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+import math
+import time
+import typing
+
+import utils
+
+DATETIME_FORMAT = "%d-%m-%Y %H:%M:%S"
+
+@lru_cache(maxsize=None)
+def get_timezone(name: str) -> ZoneInfo:
+    return ZoneInfo(name)
+
+class CachedClock:
+    """Строка текущего времени; strftime - не чаще раза в секунду"""
+
+    def __init__(self, timezone: tzinfo, fmt: str = DATETIME_FORMAT) -> None:
+        self.timezone = timezone
+        self.fmt = fmt
+
+        # Кортеж заменяется целиком - безопасно при рендере из пула потоков
+        self._cached: tuple[int, str] = (-1, "")
+
+    def format(self, now: float | None = None) -> str:
+        now = now if now is not None else time.time()
+        second = int(now)
+
+        cached_second, cached_text = self._cached
+
+        if cached_second == second:
+            return cached_text
+
+        text = datetime.fromtimestamp(second, tz=self.timezone).strftime(self.fmt)
+
+        self._cached = (second, text)
+
+        return text
+
+# Цены и тиражи подарков почти не меняются, остатки - в пределах тиража
+@lru_cache(maxsize=4096)
+def pretty_int(number: int) -> str:
+    return utils.pretty_int(number)
+
+@lru_cache(maxsize=4096)
+def pretty_percentage(available_amount: int, total_amount: int) -> tuple[str, bool]:
+    """Процент остатка с округлением вверх до сотых и признак точного значения"""
+    return utils.pretty_float(
+        math.ceil(available_amount / total_amount * 100 * 100) / 100,
+        get_is_same = True
+    )
+
+@lru_cache(maxsize=1024)
+def format_duration(total_seconds: int) -> str:
+    return utils.format_seconds_to_human_readable(total_seconds)
+
+def get_cache_status() -> dict[str, typing.Any]:
+    return {
+        name: {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize
+        }
+        for name, info in (
+            ("pretty_int", pretty_int.cache_info()),
+            ("pretty_percentage", pretty_percentage.cache_info()),
+            ("format_duration", format_duration.cache_info())
+        )
+    }
+
+if __name__ == "__main__":
+    # Поля текста подарка при распродаже: каждый опрос правит остаток
+    import random
+
+    import config
+
+    # Прежний путь - функции utils без кэшей; pytz в зависимостях больше нет, часовой пояс тот же zoneinfo
+    current_timezone = get_timezone("Europe/Moscow")
+
+    TEXTS = 200_000
+    TOTAL_AMOUNT = 50_000
+
+    random.seed(0)
+
+    clock = CachedClock(current_timezone)
+
+    available_amounts = sorted((random.randint(0, TOTAL_AMOUNT) for _ in range(TEXTS)), reverse=True)
+
+    def render_current(available_amount: int) -> str:
+        available_percentage, is_same = utils.pretty_float(
+            math.ceil(available_amount / TOTAL_AMOUNT * 100 * 100) / 100,
+            get_is_same = True
+        )
+
+        return config.NOTIFY_TEXT_AVAILABLE_AMOUNT.format(
+            available_amount = utils.pretty_int(available_amount),
+            same_str = "" if is_same else "~",
+            available_percentage = available_percentage,
+            updated_datetime = utils.get_current_datetime(current_timezone)
+        ) + config.NOTIFY_TEXT_TOTAL_AMOUNT.format(
+            total_amount = utils.pretty_int(TOTAL_AMOUNT)
+        ) + config.NOTIFY_TEXT_SOLD_OUT.format(
+            sold_out = utils.format_seconds_to_human_readable(754)
+        ) + utils.pretty_int(50) + utils.pretty_int(40)
+
+    def render_cached(available_amount: int) -> str:
+        available_percentage, is_same = pretty_percentage(available_amount, TOTAL_AMOUNT)
+
+        return config.NOTIFY_TEXT_AVAILABLE_AMOUNT.format(
+            available_amount = pretty_int(available_amount),
+            same_str = "" if is_same else "~",
+            available_percentage = available_percentage,
+            updated_datetime = clock.format()
+        ) + config.NOTIFY_TEXT_TOTAL_AMOUNT.format(
+            total_amount = pretty_int(TOTAL_AMOUNT)
+        ) + config.NOTIFY_TEXT_SOLD_OUT.format(
+            sold_out = format_duration(754)
+        ) + pretty_int(50) + pretty_int(40)
+
+    assert render_current(12_345) == render_cached(12_345) or clock.format() != utils.get_current_datetime(current_timezone)
+
+    for name, render in (("utils", render_current), ("formatting", render_cached)):
+        started_at = time.perf_counter()
+
+        for available_amount in available_amounts:
+            render(available_amount)
+
+        elapsed = time.perf_counter() - started_at
+
+        print(f"{name:>13}: {TEXTS / elapsed:>10,.0f} texts/s ({elapsed / TEXTS * 1e6:.2f}us per text)")
+
+    print(get_cache_status())
@@ -0,0 +1,275 @@
+"""
+Локальный поток событий о подарках для внешних потребителей
+(авто-покупщики, дашборды): SSE через веб-сервер и Unix-сокет
+"""
+
+from collections import deque
+from pathlib import Path
+
+import asyncio
+import itertools
+import logging
+import threading
+import time
+import typing
+
+import simplejson as json
+
+from star_gifts_data import StarGiftData
+
+import config
+
+logger = logging.getLogger(__name__)
+
+EVENT_NEW_GIFT = "new_gift"
+EVENT_AVAILABILITY_CHANGED = "availability_changed"
+EVENT_SOLD_OUT = "sold_out"
+EVENT_BECAME_UPGRADABLE = "became_upgradable"
+
+EVENT_TYPES = (
+    EVENT_NEW_GIFT,
+    EVENT_AVAILABILITY_CHANGED,
+    EVENT_SOLD_OUT,
+    EVENT_BECAME_UPGRADABLE
+)
+
+# Политики для медленных потребителей
+POLICY_DROP_OLDEST = "drop_oldest"
+POLICY_DROP_NEWEST = "drop_newest"
+POLICY_DISCONNECT = "disconnect"
+
+POLICIES = (
+    POLICY_DROP_OLDEST,
+    POLICY_DROP_NEWEST,
+    POLICY_DISCONNECT
+)
+
+class GiftEvent(typing.NamedTuple):
+    id: int
+    type: str
+    data: str  # JSON, сериализуется один раз для всех подписчиков
+
+class GiftEventSubscriber:
+    """Подписчик с ограниченным буфером; push никогда не блокирует издателя"""
+
+    def __init__(
+        self,
+        bus: "GiftEventBus",
+        buffer_size: int,
+        policy: str,
+        event_types: typing.Collection[str] | None = None,
+        loop: asyncio.AbstractEventLoop | None = None
+    ) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown slow consumer policy: {policy}")
+
+        self.bus = bus
+        self.buffer_size = buffer_size
+        self.policy = policy
+        self.event_types = frozenset(event_types) if event_types else None
+
+        self.dropped = 0
+        self.delivered = 0
+        self.closed = False
+
+        self._buffer: deque[GiftEvent] = deque()
+        self._condition = threading.Condition()
+
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident() if loop else None
+        self._async_event = asyncio.Event() if loop else None
+
+    def push(self, event: GiftEvent) -> None:
+        if self.closed or (self.event_types is not None and event.type not in self.event_types):
+            return
+
+        with self._condition:
+            if len(self._buffer) >= self.buffer_size:
+                self.dropped += 1
+
+                if self.policy == POLICY_DROP_NEWEST:
+                    return
+
+                elif self.policy == POLICY_DISCONNECT:
+                    logger.warning("Gift events subscriber is too slow, disconnecting")
+
+                    self._close_locked()
+
+                    return
+
+                self._buffer.popleft()
+
+            self._buffer.append(event)
+            self._condition.notify()
+
+        self._wake_async()
+
+    def _wake_async(self) -> None:
+        if self._loop is None or self._async_event is None:
+            return
+
+        if threading.get_ident() == self._loop_thread_id:
+            self._async_event.set()
+
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._async_event.set)
+
+    def _pop_locked(self) -> GiftEvent | None:
+        if not self._buffer:
+            return None
+
+        self.delivered += 1
+
+        return self._buffer.popleft()
+
+    def get(self, timeout: float | None = None) -> GiftEvent | None:
+        """Блокирующее получение (для потоков веб-сервера)"""
+        with self._condition:
+            if not self._buffer and not self.closed:
+                self._condition.wait(timeout)
+
+            return self._pop_locked()
+
+    async def aget(self) -> GiftEvent | None:
+        """Асинхронное получение (для подписчиков в event loop)"""
+        if self._async_event is None:
+            raise RuntimeError("Subscriber was created without an event loop")
+
+        while True:
+            with self._condition:
+                event = self._pop_locked()
+
+                if event is not None or self.closed:
+                    return event
+
+                self._async_event.clear()
+
+            await self._async_event.wait()
+
+    def _close_locked(self) -> None:
+        self.closed = True
+        self._buffer.clear()
+        self._condition.notify_all()
+
+    def close(self) -> None:
+        with self._condition:
+            self._close_locked()
+
+        self._wake_async()
+        self.bus.unsubscribe(self)
+
+class GiftEventBus:
+    """Шина событий: публикация O(подписчиков) без ожидания потребителей"""
+
+    def __init__(self, buffer_size: int, policy: str) -> None:
+        self.buffer_size = buffer_size
+        self.policy = policy
+
+        self.published = 0
+
+        self._subscribers: set[GiftEventSubscriber] = set()
+        self._subscribers_lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def subscribe(
+        self,
+        event_types: typing.Collection[str] | None = None,
+        buffer_size: int | None = None,
+        policy: str | None = None,
+        loop: asyncio.AbstractEventLoop | None = None
+    ) -> GiftEventSubscriber:
+        subscriber = GiftEventSubscriber(
+            bus = self,
+            buffer_size = buffer_size or self.buffer_size,
+            policy = policy or self.policy,
+            event_types = event_types,
+            loop = loop
+        )
+
+        with self._subscribers_lock:
+            self._subscribers.add(subscriber)
+
+        return subscriber
+
+    def unsubscribe(self, subscriber: GiftEventSubscriber) -> None:
+        with self._subscribers_lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event_type: str, star_gift: StarGiftData, **extra: typing.Any) -> None:
+        with self._subscribers_lock:
+            subscribers = tuple(self._subscribers)
+
+        if not subscribers:
+            return
+
+        event_id = next(self._ids)
+
+        event = GiftEvent(
+            id = event_id,
+            type = event_type,
+            data = json.dumps({
+                "id": event_id,
+                "type": event_type,
+                "timestamp": time.time(),
+                "gift": star_gift.model_dump(),
+                **extra
+            })
+        )
+
+        self.published += 1
+
+        for subscriber in subscribers:
+            subscriber.push(event)
+
+    def get_status(self) -> dict[str, typing.Any]:
+        with self._subscribers_lock:
+            subscribers = tuple(self._subscribers)
+
+        return {
+            "subscribers": len(subscribers),
+            "published": self.published,
+            "dropped": sum(subscriber.dropped for subscriber in subscribers)
+        }
+
+def format_sse(event: GiftEvent) -> str:
+    return f"id: {event.id}\nevent: {event.type}\ndata: {event.data}\n\n"
+
+async def serve_unix_socket(bus: GiftEventBus, socket_path: Path) -> None:
+    """Отдаёт события построчно (JSON Lines) через Unix-сокет"""
+    async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        subscriber = bus.subscribe(
+            loop = asyncio.get_running_loop()
+        )
+
+        try:
+            while True:
+                event = await subscriber.aget()
+
+                if event is None:
+                    break
+
+                writer.write(event.data.encode("utf-8") + b"\n")
+
+                # Медленный клиент тормозит только свой обработчик, буфер ограничен подписчиком
+                await writer.drain()
+
+        except (ConnectionError, BrokenPipeError):
+            pass
+
+        finally:
+            subscriber.close()
+            writer.close()
+
+    socket_path.unlink(missing_ok=True)
+
+    server = await asyncio.start_unix_server(handle_connection, path=socket_path)
+
+    logger.info(f"Gift events unix socket is listening on {socket_path}")
+
+    async with server:
+        await server.serve_forever()
+
+gift_event_bus = GiftEventBus(
+    buffer_size = config.EVENTS_BUFFER_SIZE,
+    policy = config.EVENTS_SLOW_CONSUMER_POLICY
+)
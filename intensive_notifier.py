@@ -1,33 +1,71 @@
 """
 Система интенсивных уведомлений для пробуждения пользователя
-Отправляет множественные уведомления до остановки процесса
+Уведомления идут по лестнице эскалации (см. escalation.py) до прочтения,
+реакции, распродажи подарка, ручной остановки или исчерпания лимита вызовов
 """
 
 import asyncio
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Awaitable, Union, Tuple
 import os
 from httpx import AsyncClient, TimeoutException
 from itertools import cycle
+from contextlib import nullcontext
+from pathlib import Path
 import time
 
+from escalation import (
+    EscalationPolicy, get_default_policy, get_bot_ids,
+    CHANNEL_CALLS, CHANNEL_STICKER, CHANNEL_PINNED,
+    STOP_MANUAL, STOP_READ, STOP_REACTION, STOP_SOLD_OUT, STOP_BUDGET, STOP_COMPLETED
+)
+
 logger = logging.getLogger(__name__)
 
+class NotificationCampaign:
+    """Оповещение одного получателя о подарке"""
+    
+    def __init__(self, chat_id: int, policy: EscalationPolicy, star_gift_id: Optional[int] = None):
+        self.chat_id = chat_id
+        self.policy = policy
+        self.star_gift_id = star_gift_id
+        self.calls = 0  # потрачено вызовов Bot API
+        self.stop_event = asyncio.Event()
+        self.stop_reason: Optional[str] = None
+        self.sticker_file_id: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
 class IntensiveNotifier:
     """Класс для отправки интенсивных уведомлений"""
     
-    def __init__(self, config):
+    def __init__(self, config, asset_cache=None, policy: Optional[EscalationPolicy] = None):
         self.config = config
-        self.is_active = False
-        self.current_notifications = 0
-        self.stop_event = asyncio.Event()
+        self.asset_cache = asset_cache  # AlertAssetCache для повторного использования file_id стикеров
+        # Активные оповещения по (chat_id, star_gift_id): у каждого подарка своя эскалация,
+        # новый подарок не ждёт и не теряется, пока идёт оповещение о предыдущем
+        self.campaigns: Dict[Tuple[int, Optional[int]], NotificationCampaign] = {}
+        self.last_results: Dict[int, Tuple[Optional[str], int]] = {}  # chat_id -> (причина остановки, вызовов)
+        self.campaigns_started = 0
         
-        # HTTP клиент для Bot API
-        self.http_client = AsyncClient(
-            base_url="https://api.telegram.org/",
-            timeout=config.HTTP_REQUEST_TIMEOUT
+        # Один стикер на всех получателей: остальные ждут file_id первой загрузки
+        self.sticker_uploads: Dict[int, asyncio.Future] = {}
+        
+        # Лестница эскалации: из файла или по умолчанию из NOTIFICATION_INTERVAL / MAX_NOTIFICATIONS
+        self.policy = policy or (
+            EscalationPolicy.load(config.ESCALATION_POLICY_FILEPATH)
+            if config.ESCALATION_POLICY_FILEPATH else
+            get_default_policy(config.NOTIFICATION_INTERVAL, config.MAX_NOTIFICATIONS)
         )
         
+        # Прочтение / реакция в чате с любым из ботов останавливает эскалацию
+        self.bot_ids = get_bot_ids(config.BOT_TOKENS)
+        
+        # file_id стикера и закреп действуют только в чате своего бота - их шлёт один бот
+        self.primary_bot_token = config.BOT_TOKENS[0] if config.BOT_TOKENS else None
+        
+        # HTTP клиент для Bot API (после close() новый открывает open())
+        self.http_client = self.make_http_client()
+        
         # Циклический итератор по токенам ботов
         self.bot_tokens_cycle = cycle(config.BOT_TOKENS)
         
@@ -37,11 +75,29 @@ class IntensiveNotifier:
             "disable_web_page_preview": True
         }
     
-    async def send_bot_request(self, method: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Отправка запроса к Bot API с ротацией токенов"""
-        retries = len(self.config.BOT_TOKENS)
+    def make_http_client(self) -> AsyncClient:
+        return AsyncClient(
+            base_url="https://api.telegram.org/",
+            timeout=self.config.HTTP_REQUEST_TIMEOUT
+        )
+    
+    def open(self):
+        """Новый HTTP клиент вместо закрытого при прошлой остановке"""
+        if self.http_client.is_closed:
+            self.http_client = self.make_http_client()
+    
+    def get_chat_campaigns(self, chat_id: int) -> list[NotificationCampaign]:
+        return [campaign for campaign in self.campaigns.values() if campaign.chat_id == chat_id]
+    
+    def is_active(self, chat_id: Optional[int] = None) -> bool:
+        """Идёт ли оповещение получателя (без chat_id - хоть одно)"""
+        return bool(self.campaigns) if chat_id is None else bool(self.get_chat_campaigns(chat_id))
+    
+    async def send_bot_request(self, method: str, data: Dict[str, Any], bot_token: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Отправка запроса к Bot API с ротацией токенов (или через заданного бота)"""
+        retries = len(self.config.BOT_TOKENS) if bot_token is None else 1
         
-        for bot_token in self.bot_tokens_cycle:
+        for bot_token in (self.bot_tokens_cycle if bot_token is None else [bot_token]):
             retries -= 1
             if retries < 0:
                 break
@@ -62,29 +118,34 @@ class IntensiveNotifier:
         logger.error(f"Не удалось отправить запрос {method}")
         return None
     
-    async def send_wake_up_sticker(self, chat_id: int, sticker_data: bytes, filename: str) -> Optional[int]:
-        """Отправка стикера для пробуждения"""
+    async def send_wake_up_sticker(self, chat_id: int, sticker_data: Union[bytes, Path], filename: str, file_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Отправка стикера для пробуждения (по file_id - без повторной загрузки, из файла - потоком)"""
         try:
-            # Используем первый доступный токен для загрузки стикера
-            bot_token = next(self.bot_tokens_cycle)
+            bot_token = self.primary_bot_token
+
+            if file_id:
+                return await self.send_bot_request("sendSticker", {
+                    "chat_id": chat_id,
+                    "sticker": file_id
+                }, bot_token=bot_token)
             
-            # Отправляем стикер через multipart/form-data
-            files = {
-                'sticker': (filename, sticker_data, 'application/octet-stream')
-            }
             data = {
                 'chat_id': str(chat_id)
             }
             
-            response = await self.http_client.post(
-                f"/bot{bot_token}/sendSticker",
-                files=files,
-                data=data
-            )
+            # Отправляем стикер через multipart/form-data; файл httpx читает частями
+            with (sticker_data.open("rb") if isinstance(sticker_data, Path) else nullcontext(sticker_data)) as sticker:
+                response = await self.http_client.post(
+                    f"/bot{bot_token}/sendSticker",
+                    files={
+                        'sticker': (filename, sticker, 'application/octet-stream')
+                    },
+                    data=data
+                )
             
             result = response.json()
             if result.get("ok"):
-                return result["result"]["message_id"]
+                return result["result"]
                 
         except Exception as e:
             logger.error(f"Ошибка отправки стикера: {e}")
@@ -115,77 +176,267 @@ class IntensiveNotifier:
         result = await self.send_bot_request("sendMessage", data)
         return result is not None
     
-    async def start_intensive_notifications(self, chat_id: int, gift_message: str, sticker_data: bytes, sticker_filename: str):
-        """Запуск интенсивных уведомлений"""
-        if self.is_active:
-            logger.warning("Уведомления уже активны")
-            return
+    async def send_pinned_notification(self, chat_id: int, message: str) -> Optional[int]:
+        """Сообщение с закреплением: Telegram присылает отдельное звуковое уведомление"""
+        result = await self.send_bot_request("sendMessage", {
+            "chat_id": chat_id,
+            "text": f"📞 ПОДАРОК ЖДЁТ! ОТКРОЙ ЧАТ!\n\n{message}",
+            **self.basic_request_data
+        }, bot_token=self.primary_bot_token)
         
-        self.is_active = True
-        self.current_notifications = 0
-        self.stop_event.clear()
+        if result is None:
+            return None
         
-        logger.info(f"🚨 НАЧИНАЮ ИНТЕНСИВНЫЕ УВЕДОМЛЕНИЯ! Максимум: {self.config.MAX_NOTIFICATIONS}")
+        await self.send_bot_request("pinChatMessage", {
+            "chat_id": chat_id,
+            "message_id": result["message_id"],
+            "disable_notification": False
+        }, bot_token=self.primary_bot_token)
+        
+        return result["message_id"]
+    
+    async def wait_stop(self, campaign: NotificationCampaign, delay: float) -> bool:
+        """Пауза перед следующим шагом; True - эскалацию остановили"""
+        try:
+            await asyncio.wait_for(campaign.stop_event.wait(), delay)
+        except (TimeoutError, asyncio.TimeoutError):
+            pass
+        
+        return campaign.stop_event.is_set()
+    
+    def get_sticker_file_id(self, campaign: NotificationCampaign) -> Optional[str]:
+        if campaign.sticker_file_id is None and self.asset_cache and campaign.star_gift_id is not None:
+            campaign.sticker_file_id = self.asset_cache.get_uploaded_file_id(campaign.star_gift_id)
+        
+        return campaign.sticker_file_id
+    
+    async def send_campaign_sticker(self, campaign: NotificationCampaign, sticker_data: Union[bytes, Path, Awaitable[Union[bytes, Path]]], sticker_filename: str) -> Optional[Dict[str, Any]]:
+        """Стикер получателю: загружается один раз на подарок, дальше - по file_id"""
+        star_gift_id = campaign.star_gift_id
+        upload = self.sticker_uploads.get(star_gift_id) if star_gift_id is not None else None
+        
+        # Стикер уже загружает другой получатель - ждём его file_id
+        if self.get_sticker_file_id(campaign) is None and upload is not None:
+            campaign.sticker_file_id = await asyncio.shield(upload)
+        
+        if campaign.sticker_file_id:
+            return await self.send_wake_up_sticker(campaign.chat_id, b"", sticker_filename, campaign.sticker_file_id)
+        
+        upload = None
+        
+        if star_gift_id is not None and star_gift_id not in self.sticker_uploads:
+            upload = self.sticker_uploads[star_gift_id] = asyncio.get_running_loop().create_future()
         
         try:
-            # Первый стикер для пробуждения
-            sticker_msg_id = await self.send_wake_up_sticker(chat_id, sticker_data, sticker_filename)
-            if sticker_msg_id:
-                logger.info("📌 Стикер отправлен для пробуждения")
+            try:
+                sticker_binary = sticker_data if isinstance(sticker_data, (bytes, Path)) else await sticker_data
+            except Exception as e:
+                logger.error(f"Ошибка скачивания стикера: {e}")
+                return None
             
-            # Задержка после стикера
-            await asyncio.sleep(self.config.NOTIFY_AFTER_STICKER_DELAY)
+            message = await self.send_wake_up_sticker(campaign.chat_id, sticker_binary, sticker_filename)
             
-            # Цикл интенсивных уведомлений
-            while (self.current_notifications < self.config.MAX_NOTIFICATIONS and 
-                   not self.stop_event.is_set()):
+            if message:
+                campaign.sticker_file_id = message.get("sticker", {}).get("file_id")
                 
-                self.current_notifications += 1
+                if campaign.sticker_file_id and self.asset_cache and star_gift_id is not None:
+                    self.asset_cache.set_uploaded_file_id(star_gift_id, campaign.sticker_file_id)
+            
+            return message
+        
+        finally:
+            # Неудачная загрузка отдаёт None - ожидающие загрузят стикер сами
+            if upload is not None:
+                upload.set_result(campaign.sticker_file_id)
+                self.sticker_uploads.pop(star_gift_id, None)
+    
+    async def start_intensive_notifications(self, chat_id: int, gift_message: str, sticker_data: Union[bytes, Path, Awaitable[Union[bytes, Path]]], sticker_filename: str, star_gift_id: Optional[int] = None, first_sent: Optional[asyncio.Future] = None, policy: Optional[EscalationPolicy] = None):
+        """Проход по лестнице эскалации для одного получателя
+
+        sticker_data может быть задачей скачивания: первый текст отправляется
+        сразу, не дожидаясь стикера. first_sent завершается после первого шага.
+        policy - лестница получателя, по умолчанию общая
+        """
+        key = (chat_id, star_gift_id)
+        
+        if key in self.campaigns:
+            logger.warning(f"Уведомления для {chat_id} о подарке {star_gift_id} уже активны")
+            return
+        
+        campaign = NotificationCampaign(chat_id, policy or self.policy, star_gift_id)
+        campaign.task = asyncio.current_task()
+        
+        self.campaigns[key] = campaign
+        self.campaigns_started += 1
+        
+        logger.info(f"🚨 НАЧИНАЮ ИНТЕНСИВНЫЕ УВЕДОМЛЕНИЯ для {chat_id}! Лимит вызовов: {campaign.policy.max_calls}")
+        
+        notification_num = 0
+        pinned_message_ids: list[int] = []
+        
+        # Стикер не вытесняется из кэша, пока идёт оповещение
+        if self.asset_cache and star_gift_id is not None:
+            self.asset_cache.pin(star_gift_id)
+        
+        try:
+            for delay, channel in campaign.policy.iter_actions():
+                # Лимит проверяется до паузы: лишних ожиданий и вызовов нет
+                if campaign.calls + CHANNEL_CALLS[channel] > campaign.policy.max_calls:
+                    campaign.stop_reason = STOP_BUDGET
+                    break
                 
-                # Отправляем уведомление
-                success = await self.send_intensive_notification(
-                    chat_id, 
-                    gift_message, 
-                    self.current_notifications
-                )
+                if await self.wait_stop(campaign, delay):
+                    break
                 
-                if success:
-                    logger.info(f"📱 Уведомление #{self.current_notifications} отправлено")
-                else:
-                    logger.error(f"❌ Не удалось отправить уведомление #{self.current_notifications}")
+                campaign.calls += CHANNEL_CALLS[channel]
                 
-                # Дополнительный стикер каждые 5 уведомлений
-                if self.current_notifications % 5 == 0:
-                    await self.send_wake_up_sticker(chat_id, sticker_data, sticker_filename)
-                    logger.info(f"📌 Дополнительный стикер #{self.current_notifications//5}")
+                if channel == CHANNEL_STICKER:
+                    if await self.send_campaign_sticker(campaign, sticker_data, sticker_filename):
+                        logger.info("📌 Стикер отправлен для пробуждения")
+                
+                elif channel == CHANNEL_PINNED:
+                    pinned_message_id = await self.send_pinned_notification(chat_id, gift_message)
+                    
+                    if pinned_message_id is not None:
+                        pinned_message_ids.append(pinned_message_id)
+                        logger.info("📞 Закреплённое уведомление отправлено")
+                
+                else:
+                    notification_num += 1
+                    
+                    if await self.send_intensive_notification(chat_id, gift_message, notification_num):
+                        logger.info(f"📱 Уведомление #{notification_num} отправлено")
+                    else:
+                        logger.error(f"❌ Не удалось отправить уведомление #{notification_num}")
                 
-                # Задержка между уведомлениями
-                await asyncio.sleep(self.config.NOTIFICATION_INTERVAL)
+                if first_sent is not None and not first_sent.done():
+                    first_sent.set_result(None)
             
-            if self.stop_event.is_set():
-                logger.info(f"🛑 Уведомления остановлены вручную на #{self.current_notifications}")
             else:
-                logger.info(f"✅ Отправлено максимальное количество уведомлений: {self.current_notifications}")
+                campaign.stop_reason = STOP_COMPLETED
+            
+            logger.info(f"🛑 Эскалация для {chat_id} завершена ({campaign.stop_reason}), вызовов: {campaign.calls}")
                 
         except Exception as e:
             logger.error(f"❌ Ошибка в интенсивных уведомлениях: {e}")
         finally:
-            self.is_active = False
-            self.current_notifications = 0
-    
-    def stop_notifications(self):
-        """Остановка интенсивных уведомлений"""
-        if self.is_active:
-            self.stop_event.set()
-            logger.info("🛑 Получен сигнал остановки уведомлений")
-        else:
+            # Закрепы снимаются всегда - их вызовы уже учтены в лимите
+            for pinned_message_id in pinned_message_ids:
+                try:
+                    await self.send_bot_request("unpinChatMessage", {
+                        "chat_id": chat_id,
+                        "message_id": pinned_message_id
+                    }, bot_token=self.primary_bot_token)
+                except Exception as e:
+                    logger.error(f"Ошибка снятия закрепа: {e}")
+            
+            if first_sent is not None and not first_sent.done():
+                first_sent.set_result(None)
+            
+            if self.asset_cache and star_gift_id is not None:
+                self.asset_cache.unpin(star_gift_id)
+            
+            self.last_results[chat_id] = (campaign.stop_reason, campaign.calls)
+            del self.campaigns[key]
+    
+    async def launch_intensive_notifications(self, chat_id: int, *args, star_gift_id: Optional[int] = None, **kwargs) -> Optional[asyncio.Task]:
+        """Запускает эскалацию в фоне и возвращается после первого шага
+
+        Так цикл детектора не блокируется на всё время оповещения и успевает
+        заметить распродажу. Оповещения о разных подарках идут параллельно
+        """
+        if (chat_id, star_gift_id) in self.campaigns:
+            logger.warning(f"Уведомления для {chat_id} о подарке {star_gift_id} уже активны")
+            return None
+        
+        first_sent = asyncio.get_running_loop().create_future()
+        
+        task = asyncio.create_task(self.start_intensive_notifications(chat_id, *args, star_gift_id=star_gift_id, first_sent=first_sent, **kwargs))
+        
+        await asyncio.wait([first_sent, task], return_when=asyncio.FIRST_COMPLETED)
+        
+        return task
+    
+    def stop_campaign(self, campaign: NotificationCampaign, reason: str) -> bool:
+        if campaign.stop_event.is_set():
+            return False
+        
+        campaign.stop_reason = reason
+        campaign.stop_event.set()
+        logger.info(f"🛑 Получен сигнал остановки уведомлений для {campaign.chat_id} ({reason})")
+        return True
+    
+    def stop_notifications(self, reason: str = STOP_MANUAL, chat_id: Optional[int] = None) -> bool:
+        """Остановка интенсивных уведомлений получателя (без chat_id - всех)"""
+        campaigns = list(self.campaigns.values()) if chat_id is None else self.get_chat_campaigns(chat_id)
+        
+        is_stopped = False
+        
+        for campaign in campaigns:
+            is_stopped = self.stop_campaign(campaign, reason) or is_stopped
+        
+        if not is_stopped:
             logger.info("ℹ️ Уведомления не активны")
+        
+        return is_stopped
+    
+    def acknowledge(self, reason: str, chat_id: int) -> bool:
+        """Получатель прочитал чат или поставил реакцию - останавливаются все его оповещения"""
+        is_stopped = False
+        
+        for campaign in self.get_chat_campaigns(chat_id):
+            if campaign.calls == 0:
+                continue
+            
+            if (reason == STOP_READ and not campaign.policy.stop_on_read) or (reason == STOP_REACTION and not campaign.policy.stop_on_reaction):
+                continue
+            
+            is_stopped = self.stop_campaign(campaign, reason) or is_stopped
+        
+        return is_stopped
+    
+    def on_sold_out(self, star_gift_id: int) -> int:
+        """Распроданный подарок будить уже незачем; возвращает число остановленных оповещений"""
+        return sum(
+            self.stop_campaign(campaign, STOP_SOLD_OUT)
+            for campaign in list(self.campaigns.values())
+            if campaign.policy.stop_on_sold_out and campaign.star_gift_id == star_gift_id
+        )
     
-    def get_status(self) -> Dict[str, Any]:
-        """Получение статуса уведомлений"""
+    async def close(self):
+        """Остановка эскалаций и закрытие HTTP клиента при завершении"""
+        tasks = [campaign.task for campaign in self.campaigns.values() if campaign.task and not campaign.task.done()]
+        
+        if tasks:
+            self.stop_notifications(STOP_MANUAL)
+            await asyncio.gather(*tasks, return_exceptions=True)
+        
+        await self.http_client.aclose()
+    
+    def get_status(self, chat_id: Optional[int] = None) -> Dict[str, Any]:
+        """Статус уведомлений получателя или сводка по всем"""
+        if chat_id is not None:
+            campaigns = self.get_chat_campaigns(chat_id)
+            last_stop_reason, last_calls = self.last_results.get(chat_id, (None, 0))
+            
+            return {
+                "is_active": bool(campaigns),
+                "active_campaigns": len(campaigns),
+                "current_notifications": sum(campaign.calls for campaign in campaigns),
+                "max_notifications": sum(campaign.policy.max_calls for campaign in campaigns) if campaigns else self.policy.max_calls,
+                "interval": self.config.NOTIFICATION_INTERVAL,
+                "star_gift_ids": [campaign.star_gift_id for campaign in campaigns],
+                "last_stop_reason": last_stop_reason,
+                "last_calls": last_calls
+            }
+        
         return {
-            "is_active": self.is_active,
-            "current_notifications": self.current_notifications,
-            "max_notifications": self.config.MAX_NOTIFICATIONS,
-            "interval": self.config.NOTIFICATION_INTERVAL
-        }
\ No newline at end of file
+            "is_active": bool(self.campaigns),
+            "active_campaigns": len(self.campaigns),
+            "active_chats": len({campaign.chat_id for campaign in self.campaigns.values()}),
+            "campaigns_started": self.campaigns_started,
+            "current_notifications": sum(campaign.calls for campaign in self.campaigns.values()),
+            "max_notifications": self.policy.max_calls,
+            "interval": self.config.NOTIFICATION_INTERVAL,
+            "sticker_uploads_pending": len(self.sticker_uploads)
+        }
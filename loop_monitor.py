@@ -0,0 +1,115 @@
+"""
+Мониторинг задержки event loop: перцентили лагов и сторожевой поток,
+который при зависании цикла пишет в лог стек блокирующего кода
+"""
+
+from collections import deque
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+import typing
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class LoopLagMonitor:
+    def __init__(self, interval: float, stall_threshold: float, window_size: int = 3_000) -> None:
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+
+        self.stalls = 0
+        self.max_stall_seconds = 0.0
+        self.loop_implementation: str | None = None
+
+        self._lags: deque[float] = deque(maxlen=window_size)
+        self._heartbeat: float | None = None
+        self._loop_thread_id: int | None = None
+        self._stop_event = threading.Event()
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        self.loop_implementation = f"{type(loop).__module__}.{type(loop).__name__}"
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.perf_counter()
+        self._stop_event.clear()
+
+        watchdog = threading.Thread(
+            target = self._watchdog,
+            name = "loop-watchdog",
+            daemon = True
+        )
+
+        watchdog.start()
+
+        try:
+            while True:
+                started_at = time.perf_counter()
+
+                await asyncio.sleep(self.interval)
+
+                self._heartbeat = time.perf_counter()
+                self._lags.append(max(self._heartbeat - started_at - self.interval, 0.0))
+
+        finally:
+            self._stop_event.set()
+
+    def _watchdog(self) -> None:
+        is_stall_reported = False
+
+        while not self._stop_event.wait(self.stall_threshold / 2):
+            heartbeat = self._heartbeat
+
+            if heartbeat is None or self._loop_thread_id is None:
+                continue
+
+            stalled_for = time.perf_counter() - heartbeat - self.interval
+
+            if stalled_for < self.stall_threshold:
+                is_stall_reported = False
+
+                continue
+
+            self.max_stall_seconds = max(self.max_stall_seconds, stalled_for)
+
+            # Один дамп стека на одно зависание
+            if is_stall_reported:
+                continue
+
+            is_stall_reported = True
+            self.stalls += 1
+
+            frame = sys._current_frames().get(self._loop_thread_id)  # pyright: ignore[reportPrivateUsage]
+
+            logger.warning(
+                "Event loop is blocked for %.3fs, stack:\n%s",
+                stalled_for,
+                "".join(traceback.format_stack(frame)) if frame else "<unavailable>"
+            )
+
+    def get_status(self) -> dict[str, typing.Any]:
+        lags = np.fromiter(self._lags, dtype=np.float64)
+
+        p50, p95, p99 = (
+            np.percentile(lags, (50, 95, 99)) * 1000
+            if lags.size else
+            (None, None, None)
+        )
+
+        return {
+            "loop": self.loop_implementation,
+            "samples": int(lags.size),
+            "lag_ms": {
+                "p50": round(float(p50), 3) if p50 is not None else None,
+                "p95": round(float(p95), 3) if p95 is not None else None,
+                "p99": round(float(p99), 3) if p99 is not None else None,
+                "max": round(float(lags.max()) * 1000, 3) if lags.size else None
+            },
+            "stalls": self.stalls,
+            "max_stall_ms": round(self.max_stall_seconds * 1000, 3)
+        }
@@ -7,14 +7,29 @@ Telegram Gifts Monitor Bot - Интенсивные уведомления
 
 import asyncio
 import os
+import time
 import threading
-from flask import Flask
+from flask import Flask, Response, request, stream_with_context
 import logging
 
+from analytics import gift_analytics
+from gift_events import gift_event_bus, format_sse, EVENT_TYPES
+from runtime_status import get_runtime_status
+import config
+import utils
+
 # Настройка логирования
+# Запись логов идёт в отдельном потоке, event loop только кладёт записи в очередь
+_console_handler = logging.StreamHandler()
+_console_handler.setFormatter(
+    utils.JsonFormatter()
+    if config.LOG_JSON else
+    logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+)
+
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    handlers=[utils.get_queue_handler(_console_handler)]
 )
 logger = logging.getLogger(__name__)
 
@@ -41,25 +56,128 @@ def status():
     return {
         "status": "active",
         "monitoring": "gifts_detector",
-        "notifications": "enabled"
+        "notifications": "enabled",
+        "events": gift_event_bus.get_status(),
+        **get_runtime_status()
     }
 
+@app.route('/analytics')
+def analytics_summary():
+    """Сводка продаж: последние распродажи, время до улучшения
+
+    ?limit=10 - сколько последних распродаж вернуть
+    """
+    return gift_analytics.get_summary(
+        sell_outs_limit = request.args.get("limit", 10, type=int)
+    )
+
+@app.route('/analytics/gifts/<int:star_gift_id>')
+def analytics_gift(star_gift_id):
+    """Остаток подарка на равномерной сетке
+
+    ?step=60&since=<unix>&until=<unix> - шаг и границы в секундах;
+    без step шаг кратен минуте и растёт, чтобы вся история уместилась в ответ
+    """
+    try:
+        grid, values = gift_analytics.resample(
+            star_gift_id = star_gift_id,
+            step = request.args.get("step", type=int),
+            since = request.args.get("since", type=int),
+            until = request.args.get("until", type=int)
+        )
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    return {
+        "id": star_gift_id,
+        "sales_per_minute": gift_analytics.get_sales_rate(star_gift_id),
+        "timestamps": grid.tolist(),
+        "available_amounts": values.tolist()
+    }
+
+@app.route('/events')
+def events():
+    """Поток событий о подарках (Server-Sent Events)
+
+    ?types=new_gift,sold_out - фильтр по типам событий
+    """
+    event_types = [
+        event_type
+        for event_type in request.args.get("types", "").split(",")
+        if event_type in EVENT_TYPES
+    ]
+
+    subscriber = gift_event_bus.subscribe(
+        event_types = event_types or None
+    )
+
+    def generate():
+        try:
+            yield ": connected\n\n"
+
+            while not subscriber.closed:
+                event = subscriber.get(timeout=config.EVENTS_KEEPALIVE_INTERVAL)
+
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+
+                yield format_sse(event)
+
+        finally:
+            subscriber.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
 def run_flask():
     """Запуск Flask сервера в отдельном потоке"""
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=False)
+    app.run(host='0.0.0.0', port=port, debug=False, threaded=True)
 
 async def run_bot():
-    """Запуск основного бота"""
-    try:
-        logger.info("🚀 Запуск Telegram Gifts Monitor Bot...")
-        from detector import main as detector_main
-        await detector_main()
-    except Exception as e:
-        logger.error(f"❌ Ошибка в работе бота: {e}")
-        # Перезапуск через 30 секунд
-        await asyncio.sleep(30)
-        await run_bot()
+    """Запуск основного бота с перезапуском (без рекурсии) и экспоненциальной задержкой"""
+    delay = config.SUPERVISOR_RESTART_INITIAL_DELAY
+
+    while True:
+        started_at = time.monotonic()
+
+        try:
+            logger.info("🚀 Запуск Telegram Gifts Monitor Bot...")
+            from detector import main as detector_main
+            await detector_main()
+            return
+        except Exception as e:
+            logger.error(f"❌ Ошибка в работе бота: {e}")
+
+        # Долгая стабильная работа сбрасывает задержку
+        if time.monotonic() - started_at > 60:
+            delay = config.SUPERVISOR_RESTART_INITIAL_DELAY
+
+        logger.info(f"🔁 Перезапуск через {delay:.1f} секунд")
+        await asyncio.sleep(delay)
+
+        delay = min(delay * 2, config.SUPERVISOR_RESTART_MAX_DELAY)
+
+def run_event_loop(coro):
+    """asyncio.run или, если включено USE_UVLOOP, цикл uvloop"""
+    if config.USE_UVLOOP:
+        try:
+            import uvloop
+        except ImportError:
+            logger.warning("⚠️ uvloop не установлен, используется стандартный event loop")
+        else:
+            logger.info("⚡ Используется uvloop")
+            with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+                return runner.run(coro)
+
+    return asyncio.run(coro)
 
 def main():
     """Главная функция - запуск веб-сервера и бота"""
@@ -72,7 +190,7 @@ def main():
     
     # Запуск основного бота
     try:
-        asyncio.run(run_bot())
+        run_event_loop(run_bot())
     except KeyboardInterrupt:
         logger.info("🛑 Получен сигнал остановки")
     except Exception as e:
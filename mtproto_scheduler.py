@@ -0,0 +1,219 @@
+"""
+Планировщик MTProto-запросов с учётом FLOOD_WAIT: полосы приоритетов
+(детект > медиа > проверки улучшений), бюджеты запросов по методам и пауза
+только того метода и тех полос, которые получили FLOOD_WAIT - опрос
+каталога не ждёт флуд-лимиты фоновых задач
+"""
+
+from pydantic import BaseModel, Field
+from functools import partial
+
+from pyrogram.errors import FloodWait
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+import typing
+
+import config
+
+logger = logging.getLogger(__name__)
+
+LANE_DETECTION = 0  # опрос каталога и покупка - критический путь
+LANE_MEDIA = 1
+LANE_UPGRADE_PROBE = 2
+
+LANE_NAMES = {
+    LANE_DETECTION: "detection",
+    LANE_MEDIA: "media",
+    LANE_UPGRADE_PROBE: "upgrade_probe"
+}
+
+T = typing.TypeVar("T")
+
+class MethodBudget(BaseModel):
+    rate: float = Field(gt=0.0)  # запросов в секунду
+    burst: int = Field(default=1, ge=1)
+
+class MethodStats(BaseModel):
+    calls: int = Field(default=0)
+    flood_waits: int = Field(default=0)
+    last_flood_wait: float | None = Field(default=None)
+    blocked_until: float = Field(default=0.0)  # time.monotonic()
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+
+    def reserve(self) -> float:
+        """Занимает токен и возвращает, сколько ждать до него (очередь - в минус)"""
+        now = time.monotonic()
+
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+        self._tokens -= 1
+
+        return max(-self._tokens / self.rate, 0.0)
+
+class MTProtoScheduler:
+    def __init__(self, max_in_flight: int, budgets: dict[str, MethodBudget] | None = None, max_flood_wait: float = 120.0) -> None:
+        self.max_in_flight = max_in_flight
+        self.max_flood_wait = max_flood_wait
+
+        self._buckets = {
+            method: TokenBucket(budget.rate, budget.burst)
+            for method, budget in (budgets or {}).items()
+        }
+
+        self._stats: dict[str, MethodStats] = {}
+        self._lane_paused_until = dict.fromkeys(LANE_NAMES, 0.0)
+
+        self._in_flight = 0
+        self._waiters: list[tuple[int, int, asyncio.Future[None]]] = []
+        self._sequence = itertools.count()
+
+    def _get_stats(self, method: str) -> MethodStats:
+        stats = self._stats.get(method)
+
+        if stats is None:
+            stats = self._stats[method] = MethodStats()
+
+        return stats
+
+    async def _wait_until_allowed(self, lane: int, method: str) -> None:
+        while True:
+            delay = max(self._get_stats(method).blocked_until, self._lane_paused_until[lane]) - time.monotonic()
+
+            if delay <= 0:
+                return
+
+            await asyncio.sleep(delay)
+
+    async def _acquire_slot(self, lane: int) -> None:
+        # Детект не ждёт слот: фоновые запросы не могут его задержать
+        if lane == LANE_DETECTION or (self._in_flight < self.max_in_flight and not self._waiters):
+            self._in_flight += 1
+
+            return
+
+        future = asyncio.get_running_loop().create_future()
+
+        heapq.heappush(self._waiters, (lane, next(self._sequence), future))
+
+        try:
+            await future
+
+        except asyncio.CancelledError:
+            # Слот мог быть уже передан - вернуть его следующему
+            if future.done() and not future.cancelled():
+                self._release_slot()
+
+            raise
+
+    def _release_slot(self) -> None:
+        self._in_flight -= 1
+
+        while self._waiters and self._in_flight < self.max_in_flight:
+            _, _, future = heapq.heappop(self._waiters)
+
+            if not future.done():
+                self._in_flight += 1
+
+                future.set_result(None)
+
+    def _on_flood_wait(self, lane: int, method: str, value: float) -> None:
+        stats = self._get_stats(method)
+        blocked_until = time.monotonic() + value
+
+        stats.flood_waits += 1
+        stats.last_flood_wait = value
+        stats.blocked_until = max(stats.blocked_until, blocked_until)
+
+        # Пауза своей и менее важных полос; полоса детекта паузой не останавливается
+        for paused_lane in LANE_NAMES:
+            if paused_lane >= max(lane, LANE_MEDIA):
+                self._lane_paused_until[paused_lane] = max(self._lane_paused_until[paused_lane], blocked_until)
+
+        logger.warning(f"FLOOD_WAIT {value:.0f}s on {method} ({LANE_NAMES[lane]} lane)")
+
+    async def run(self, lane: int, method: str, factory: typing.Callable[[], typing.Awaitable[T]], retries: int = 1) -> T:
+        """Выполняет запрос в своей полосе; после FLOOD_WAIT ждёт и повторяет до retries раз
+
+        Ожидание длиннее max_flood_wait или сверх retries - FloodWait вызывающему
+        """
+        bucket = self._buckets.get(method)
+
+        for attempt in range(retries + 1):
+            await self._wait_until_allowed(lane, method)
+
+            if bucket is not None:
+                delay = bucket.reserve()
+
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            await self._acquire_slot(lane)
+
+            try:
+                self._get_stats(method).calls += 1
+
+                return await factory()
+
+            except FloodWait as ex:
+                value = float(typing.cast(int, ex.value))
+
+                self._on_flood_wait(lane, method, value)
+
+                if attempt >= retries or value > self.max_flood_wait:
+                    raise
+
+            finally:
+                self._release_slot()
+
+        raise AssertionError("unreachable")
+
+    async def invoke(self, client: typing.Any, query: typing.Any, lane: int = LANE_DETECTION, retries: int = 1) -> typing.Any:
+        """Сырой запрос; sleep_threshold=0 - pyrogram не спит на FLOOD_WAIT сам"""
+        return await self.run(
+            lane,
+            type(query).__name__,
+            partial(client.invoke, query, sleep_threshold=0),
+            retries
+        )
+
+    def get_status(self) -> dict[str, typing.Any]:
+        now = time.monotonic()
+
+        return {
+            "in_flight": self._in_flight,
+            "waiting": len(self._waiters),
+            "lanes_paused_seconds": {
+                LANE_NAMES[lane]: round(max(paused_until - now, 0.0), 3)
+                for lane, paused_until in self._lane_paused_until.items()
+            },
+            "methods": {
+                method: {
+                    "calls": stats.calls,
+                    "flood_waits": stats.flood_waits,
+                    "last_flood_wait": stats.last_flood_wait,
+                    "blocked_seconds": round(max(stats.blocked_until - now, 0.0), 3)
+                }
+                for method, stats in self._stats.items()
+            }
+        }
+
+mtproto_scheduler = MTProtoScheduler(
+    max_in_flight = config.MTPROTO_MAX_IN_FLIGHT,
+    budgets = {
+        method: MethodBudget.model_validate(budget)
+        for method, budget in config.MTPROTO_METHOD_BUDGETS.items()
+    },
+    max_flood_wait = config.MTPROTO_MAX_FLOOD_WAIT
+)
@@ -0,0 +1,202 @@
+"""
+Вынос CPU-нагрузки из event loop: разбор каталога, сериализация данных,
+рендер текстов выполняются в пуле потоков или процессов
+"""
+
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import typing
+
+import config
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_INLINE = "inline"
+EXECUTOR_THREAD = "thread"
+EXECUTOR_PROCESS = "process"
+
+T = typing.TypeVar("T")
+
+_cpu_executor: Executor | None = None
+_io_executor: ThreadPoolExecutor | None = None
+
+def get_cpu_executor() -> Executor | None:
+    """Пул для CPU-задач; None - выполнять прямо в event loop"""
+    global _cpu_executor
+
+    if _cpu_executor is None:
+        if config.CPU_EXECUTOR == EXECUTOR_PROCESS:
+            # spawn: в дочерний процесс не копируются потоки логирования и веб-сервера
+            _cpu_executor = ProcessPoolExecutor(
+                max_workers = config.CPU_EXECUTOR_WORKERS,
+                mp_context = multiprocessing.get_context("spawn")
+            )
+
+        elif config.CPU_EXECUTOR == EXECUTOR_THREAD:
+            _cpu_executor = ThreadPoolExecutor(
+                max_workers = config.CPU_EXECUTOR_WORKERS,
+                thread_name_prefix = "cpu"
+            )
+
+    return _cpu_executor
+
+def get_io_executor() -> ThreadPoolExecutor:
+    global _io_executor
+
+    if _io_executor is None:
+        _io_executor = ThreadPoolExecutor(
+            max_workers = 1,  # запись файлов строго по очереди
+            thread_name_prefix = "io"
+        )
+
+    return _io_executor
+
+async def run_cpu_bound(func: typing.Callable[..., T], *args: typing.Any, **kwargs: typing.Any) -> T:
+    """В пуле процессов аргументы и результат pickle-уются: передавайте компактные записи"""
+    executor = get_cpu_executor()
+
+    if executor is None:
+        return func(*args, **kwargs)
+
+    return await asyncio.get_running_loop().run_in_executor(
+        executor,
+        functools.partial(func, *args, **kwargs)
+    )
+
+async def run_blocking(func: typing.Callable[..., T], *args: typing.Any, **kwargs: typing.Any) -> T:
+    """Блокирующий ввод-вывод (сохранение файлов) в отдельном потоке"""
+    if config.CPU_EXECUTOR == EXECUTOR_INLINE:
+        return func(*args, **kwargs)
+
+    return await asyncio.get_running_loop().run_in_executor(
+        get_io_executor(),
+        functools.partial(func, *args, **kwargs)
+    )
+
+async def warm_up() -> None:
+    """Запуск воркеров заранее, чтобы первая волна подарков не ждала spawn"""
+    if get_cpu_executor() is not None:
+        await run_cpu_bound(int)
+
+def shutdown() -> None:
+    global _cpu_executor, _io_executor
+
+    if _cpu_executor is not None:
+        _cpu_executor.shutdown(wait=True, cancel_futures=True)
+        _cpu_executor = None
+
+    if _io_executor is not None:
+        _io_executor.shutdown(wait=True)
+        _io_executor = None
+
+if __name__ == "__main__":
+    # Задержка event loop во время имитации волны из 20 новых подарков
+    from pathlib import Path
+    from tempfile import TemporaryDirectory
+
+    import time
+
+    from pyrogram.raw.types.document import Document
+    from pyrogram.raw.types.document_attribute_filename import DocumentAttributeFilename
+    from pyrogram.raw.types.payments.star_gifts import StarGifts
+    from pyrogram.raw.types.star_gift import StarGift
+
+    from parse_data import get_all_star_gifts
+    from star_gifts_data import StarGiftsData
+
+    CATALOG_SIZE = 1_000
+    DROP_SIZE = 20
+
+    def make_star_gifts_response(amount: int) -> StarGifts:
+        return StarGifts(
+            hash = amount,
+            gifts = [
+                StarGift(
+                    id = 5_000_000_000_000_000_000 + i,
+                    sticker = Document(
+                        id = 6_000_000_000_000_000_000 + i,
+                        access_hash = 1_234_567_890_123 + i,
+                        file_reference = bytes(range(32)),
+                        date = 1_700_000_000,
+                        mime_type = "application/x-tgsticker",
+                        size = 40_000,
+                        dc_id = 2,
+                        attributes = [DocumentAttributeFilename(file_name="sticker.tgs")]
+                    ),
+                    stars = 50 + i,
+                    convert_stars = 40 + i,
+                    limited = i % 2 == 0,
+                    availability_remains = 1_000,
+                    availability_total = 1_000,
+                    first_sale_date = 1_700_000_000
+                )
+                for i in range(amount)
+            ]
+        )
+
+    class FakeClient:
+        def __init__(self, response: StarGifts) -> None:
+            self.response = response
+
+        async def invoke(self, query: typing.Any, **kwargs: typing.Any) -> StarGifts:
+            return self.response
+
+    async def measure(executor_kind: str, data_filepath: Path) -> None:
+        config.CPU_EXECUTOR = executor_kind
+
+        await warm_up()
+
+        client = FakeClient(make_star_gifts_response(CATALOG_SIZE + DROP_SIZE))
+
+        lags: list[float] = []
+        is_running = True
+
+        async def ticker() -> None:
+            while is_running:
+                started_at = time.perf_counter()
+                await asyncio.sleep(0.001)
+                lags.append(time.perf_counter() - started_at - 0.001)
+
+        ticker_task = asyncio.create_task(ticker())
+
+        await asyncio.sleep(0.05)
+
+        started_at = time.perf_counter()
+
+        # Каждая из DROP_SIZE итераций: опрос + разбор каталога + сохранение
+        for _ in range(DROP_SIZE):
+            _, all_star_gifts_dict = await get_all_star_gifts(typing.cast(typing.Any, client))
+
+            star_gifts_data = StarGiftsData(
+                DATA_FILEPATH = data_filepath,
+                star_gifts = list(all_star_gifts_dict.values())
+            )
+
+            await run_blocking(star_gifts_data.save)
+
+        elapsed = time.perf_counter() - started_at
+
+        is_running = False
+        await ticker_task
+
+        shutdown()
+
+        lags.sort()
+
+        print(
+            f"{executor_kind:>8}: total={elapsed * 1000:.0f}ms, "
+            f"loop lag p50={lags[len(lags) // 2] * 1000:.2f}ms, "
+            f"p99={lags[int(len(lags) * 0.99)] * 1000:.2f}ms, "
+            f"max={lags[-1] * 1000:.2f}ms"
+        )
+
+    async def main() -> None:
+        with TemporaryDirectory() as tmp_dirname:
+            for executor_kind in (EXECUTOR_INLINE, EXECUTOR_THREAD, EXECUTOR_PROCESS):
+                await measure(executor_kind, Path(tmp_dirname) / "star_gifts.json")
+
+    asyncio.run(main())
@@ -6,11 +6,118 @@ from pyrogram.raw.functions.payments.get_star_gift_upgrade_preview import GetSta
 from pyrogram.raw.types.star_gift import StarGift
 from pyrogram.raw.types.document_attribute_filename import DocumentAttributeFilename
 from pyrogram.file_id import FileId, FileType
+from pyrogram.errors import FloodWait
 
 import utils
+import offload
 import typing
 
 from star_gifts_data import StarGiftData
+from mtproto_scheduler import mtproto_scheduler, LANE_DETECTION, LANE_UPGRADE_PROBE
+from catalog_diff import CatalogSnapshot
+from star_gifts_capture import star_gifts_capture
+
+# id, dc_id, media_id, access_hash, file_reference, file_name, stars, convert_stars,
+# availability_remains, availability_total, limited, first_sale_date, last_sale_date
+STAR_GIFT_RECORD_T = tuple[int, int, int, int, bytes, str | None, int, int, int | None, int | None, bool | None, int | None, int | None]
+
+STAR_GIFT_ROW_FIELDS = (
+    "id",
+    "number",
+    "sticker_file_id",
+    "sticker_file_name",
+    "price",
+    "convert_price",
+    "available_amount",
+    "total_amount",
+    "is_limited",
+    "first_appearance_timestamp",
+    "last_sale_timestamp"
+)
+
+STAR_GIFT_ROW_T = tuple[int, int, str, str, int, int, int, int, bool, int, int | None]
+
+def extract_star_gift_records(r_gifts: list[StarGift]) -> list[STAR_GIFT_RECORD_T]:
+    """Компактные записи из TL-объектов: дёшево pickle-уются в пул процессов"""
+    return [
+        (
+            star_gift_raw.id,
+            typing.cast(int, star_gift_raw.sticker.dc_id),  # pyright: ignore[reportUnknownMemberType, reportAttributeAccessIssue]
+            typing.cast(int, star_gift_raw.sticker.id),  # pyright: ignore[reportUnknownMemberType, reportAttributeAccessIssue]
+            typing.cast(int, star_gift_raw.sticker.access_hash),  # pyright: ignore[reportUnknownMemberType, reportAttributeAccessIssue]
+            typing.cast(bytes, star_gift_raw.sticker.file_reference),  # pyright: ignore[reportUnknownMemberType, reportAttributeAccessIssue]
+            next(
+                (
+                    attr.file_name
+                    for attr in typing.cast(list[DocumentAttributeFilename | typing.Any], star_gift_raw.sticker.attributes)  # pyright: ignore[reportUnknownMemberType, reportAttributeAccessIssue]
+                    if isinstance(attr, DocumentAttributeFilename)
+                ),
+                None
+            ),
+            star_gift_raw.stars,
+            star_gift_raw.convert_stars,
+            star_gift_raw.availability_remains,
+            star_gift_raw.availability_total,
+            star_gift_raw.limited,
+            star_gift_raw.first_sale_date,
+            star_gift_raw.last_sale_date
+        )
+        for star_gift_raw in r_gifts
+    ]
+
+def build_star_gift_rows(records: list[STAR_GIFT_RECORD_T], current_timestamp: int) -> list[STAR_GIFT_ROW_T]:
+    """Сортировка и FileId.encode() - выполняется в пуле (см. offload.py)"""
+    return [
+        (
+            star_gift_id,
+            number,
+            FileId(
+                file_type = FileType.DOCUMENT,
+                dc_id = dc_id,
+                media_id = media_id,
+                access_hash = access_hash,
+                file_reference = file_reference
+            ).encode(),
+            file_name or f"{star_gift_id}.tgs",  # hardcode
+            stars,
+            convert_stars,
+            availability_remains or 0,
+            availability_total or 0,
+            limited or False,
+            first_sale_date or current_timestamp,
+            last_sale_date
+        )
+        for number, (
+            star_gift_id,
+            dc_id,
+            media_id,
+            access_hash,
+            file_reference,
+            file_name,
+            stars,
+            convert_stars,
+            availability_remains,
+            availability_total,
+            limited,
+            first_sale_date,
+            last_sale_date
+        ) in enumerate(sorted(
+            records,
+            key = lambda record: record[0],
+            reverse = False
+        ), 1)
+    ]
+
+def build_star_gift_catalog(records: list[STAR_GIFT_RECORD_T], current_timestamp: int) -> tuple[list[STAR_GIFT_ROW_T], CatalogSnapshot]:
+    """Строки подарков и массивы для catalog_diff - в пуле, вне event loop"""
+    star_gift_rows = build_star_gift_rows(records, current_timestamp)
+
+    return star_gift_rows, CatalogSnapshot.from_columns(
+        (star_gift_row[0] for star_gift_row in star_gift_rows),
+        (star_gift_row[6] for star_gift_row in star_gift_rows),
+        (star_gift_row[8] for star_gift_row in star_gift_rows),
+        count = len(star_gift_rows)
+    )
 
 @typing.overload
 async def get_all_star_gifts(
@@ -28,68 +135,71 @@ async def get_all_star_gifts(
     client: Client,
     hash: int | None = None
 ) -> tuple[int, dict[int, StarGiftData] | None]:
-    r = typing.cast(StarGifts | StarGiftsNotModified, await client.invoke(
+    r_hash, all_star_gifts_dict, _ = await get_star_gifts_catalog(client, hash)
+
+    return (
+        r_hash,
+        all_star_gifts_dict
+    )
+
+async def get_star_gifts_catalog(
+    client: Client,
+    hash: int | None = None
+) -> tuple[int, dict[int, StarGiftData] | None, CatalogSnapshot | None]:
+    """Как get_all_star_gifts, плюс массивы каталога для catalog_diff"""
+    r = typing.cast(StarGifts | StarGiftsNotModified, await mtproto_scheduler.invoke(
+        client,
         GetStarGifts(
             hash = hash or 0
-        )
+        ),
+        lane = LANE_DETECTION
     ))
 
+    if star_gifts_capture is not None:
+        star_gifts_capture.submit(r)
+
     if isinstance(r, StarGiftsNotModified):
         return (
             typing.cast(int, hash),
+            None,
             None
         )
 
     r_gifts = typing.cast(list[StarGift], r.gifts)
 
+    # В event loop только чтение атрибутов TL-объектов, остальное - в пуле
+    star_gift_rows, catalog_snapshot = await offload.run_cpu_bound(
+        build_star_gift_catalog,
+        extract_star_gift_records(r_gifts),
+        utils.get_current_timestamp()
+    )
+
     all_star_gifts_dict: dict[int, StarGiftData] = {
-        star_gift_raw.id: StarGiftData(
-            id = star_gift_raw.id,
-            number = number,
-            sticker_file_id = FileId(
-                file_type = FileType.DOCUMENT,
-                dc_id = typing.cast(int, star_gift_raw.sticker.dc_id),  # pyright: ignore[reportUnknownMemberType, reportAttributeAccessIssue]
-                media_id = typing.cast(int, star_gift_raw.sticker.id),  # pyright: ignore[reportUnknownMemberType, reportAttributeAccessIssue]
-                access_hash = typing.cast(int, star_gift_raw.sticker.access_hash),  # pyright: ignore[reportUnknownMemberType, reportAttributeAccessIssue]
-                file_reference = typing.cast(bytes, star_gift_raw.sticker.file_reference)  # pyright: ignore[reportUnknownMemberType, reportAttributeAccessIssue]
-            ).encode(),
-            sticker_file_name = next(
-                (
-                    attr.file_name
-                    for attr in typing.cast(list[DocumentAttributeFilename | typing.Any], star_gift_raw.sticker.attributes)  # pyright: ignore[reportUnknownMemberType, reportAttributeAccessIssue]
-                    if isinstance(attr, DocumentAttributeFilename)
-                ),
-                f"{star_gift_raw.id}.tgs"  # hardcode
-            ),
-            price = star_gift_raw.stars,
-            convert_price = star_gift_raw.convert_stars,
-            available_amount = star_gift_raw.availability_remains or 0,
-            total_amount = star_gift_raw.availability_total or 0,
-            is_limited = star_gift_raw.limited or False,
-            first_appearance_timestamp = star_gift_raw.first_sale_date or utils.get_current_timestamp(),
-            channel_number_sent_to = None,
-            last_sale_timestamp = star_gift_raw.last_sale_date
-        )
-        for number, star_gift_raw in enumerate(sorted(
-            r_gifts,
-            key = lambda star_gift_raw: star_gift_raw.id,
-            reverse = False
-        ), 1)
+        star_gift_row[0]: StarGiftData.model_construct(**dict(zip(STAR_GIFT_ROW_FIELDS, star_gift_row)))
+        for star_gift_row in star_gift_rows
     }
 
     return (
         r.hash,
-        all_star_gifts_dict
+        all_star_gifts_dict,
+        catalog_snapshot
     )
 
 async def check_is_star_gift_upgradable(app: Client, star_gift_id: int) -> bool:
+    """FloodWait пробрасывается: проверяющий цикл должен прервать раунд, а не счесть подарок неулучшаемым"""
     try:
-        await app.invoke(
+        await mtproto_scheduler.invoke(
+            app,
             GetStarGiftUpgradePreview(
                 gift_id = star_gift_id
-            )
+            ),
+            lane = LANE_UPGRADE_PROBE,
+            retries = 0
         )
 
+    except FloodWait:
+        raise
+
     except Exception:
         return False
 
@@ -0,0 +1,342 @@
+"""
+Автопокупка новых подарков прямо из detector() (opt-in)
+Пир и запросы готовятся заранее, каждая стадия покупки замеряется
+"""
+
+from collections import deque
+from pydantic import BaseModel, Field
+
+import asyncio
+import itertools
+import logging
+import time
+import typing
+
+from star_gifts_data import StarGiftData
+from mtproto_scheduler import mtproto_scheduler
+
+logger = logging.getLogger(__name__)
+
+class PurchaseRules(BaseModel):
+    max_price: int | None = Field(default=None)  # None - без ограничения
+    only_limited: bool = Field(default=True)
+    min_total_amount: int | None = Field(default=None)
+    max_total_amount: int | None = Field(default=None)
+    quantity: int = Field(default=1)
+    stars_budget: int | None = Field(default=None)  # None - без ограничения
+
+    def get_reject_reason(self, star_gift: StarGiftData) -> str | None:
+        """None, если подарок подходит под правила"""
+        if self.only_limited and not star_gift.is_limited:
+            return "not limited"
+
+        if self.max_price is not None and star_gift.price > self.max_price:
+            return f"price {star_gift.price} > {self.max_price}"
+
+        if star_gift.is_limited:
+            if self.min_total_amount is not None and star_gift.total_amount < self.min_total_amount:
+                return f"total amount {star_gift.total_amount} < {self.min_total_amount}"
+
+            if self.max_total_amount is not None and star_gift.total_amount > self.max_total_amount:
+                return f"total amount {star_gift.total_amount} > {self.max_total_amount}"
+
+            if star_gift.available_amount <= 0:
+                return "sold out"
+
+        return None
+
+class PurchaseAttempt(BaseModel):
+    star_gift_id: int
+    price: int
+    detected_at: float
+    matched_at: float | None = Field(default=None)
+    form_requested_at: float | None = Field(default=None)
+    form_received_at: float | None = Field(default=None)
+    purchase_sent_at: float | None = Field(default=None)
+    purchase_done_at: float | None = Field(default=None)
+    success: bool = Field(default=False)
+    error: str | None = Field(default=None)
+
+    def get_stage_durations_ms(self) -> dict[str, float | None]:
+        """Длительность стадий относительно момента обнаружения"""
+        return {
+            stage: (
+                round((timestamp - self.detected_at) * 1000, 3)
+                if timestamp is not None else
+                None
+            )
+            for stage, timestamp in (
+                ("matched", self.matched_at),
+                ("form_requested", self.form_requested_at),
+                ("form_received", self.form_received_at),
+                ("purchase_sent", self.purchase_sent_at),
+                ("purchase_done", self.purchase_done_at)
+            )
+        }
+
+class PurchaseBackend(typing.Protocol):
+    async def prepare(self) -> None: ...
+
+    async def get_payment_form(self, star_gift_id: int) -> typing.Any: ...
+
+    async def send_payment_form(self, star_gift_id: int, payment_form: typing.Any) -> typing.Any: ...
+
+class PyrogramPurchaseBackend:
+    """Покупка через MTProto: payments.getPaymentForm + payments.sendStarsForm"""
+
+    def __init__(self, app: typing.Any, peer: int | str = "me", hide_name: bool = False) -> None:
+        self.app = app
+        self.peer = peer
+        self.hide_name = hide_name
+
+        self._input_peer: typing.Any = None
+
+    async def prepare(self) -> None:
+        from pyrogram.raw.functions.payments.get_stars_status import GetStarsStatus
+        from pyrogram.raw.types.input_peer_self import InputPeerSelf
+
+        # Разрешаем получателя заранее, чтобы на горячем пути не было resolve_peer
+        self._input_peer = await self.app.resolve_peer(self.peer)
+
+        # Прогрев соединения и проверка доступа к Stars
+        await mtproto_scheduler.invoke(
+            self.app,
+            GetStarsStatus(
+                peer = InputPeerSelf()
+            )
+        )
+
+    def _build_invoice(self, star_gift_id: int) -> typing.Any:
+        from pyrogram.raw.types.input_invoice_star_gift import InputInvoiceStarGift
+
+        if self._input_peer is None:
+            raise RuntimeError("Purchase backend is not prepared")
+
+        return InputInvoiceStarGift(
+            peer = self._input_peer,
+            gift_id = star_gift_id,
+            hide_name = self.hide_name or None
+        )
+
+    async def get_payment_form(self, star_gift_id: int) -> typing.Any:
+        from pyrogram.raw.functions.payments.get_payment_form import GetPaymentForm
+
+        return await mtproto_scheduler.invoke(
+            self.app,
+            GetPaymentForm(
+                invoice = self._build_invoice(star_gift_id)
+            )
+        )
+
+    async def send_payment_form(self, star_gift_id: int, payment_form: typing.Any) -> typing.Any:
+        from pyrogram.raw.functions.payments.send_stars_form import SendStarsForm
+
+        return await mtproto_scheduler.invoke(
+            self.app,
+            SendStarsForm(
+                form_id = payment_form.form_id,
+                invoice = self._build_invoice(star_gift_id)
+            )
+        )
+
+class PurchaseEngine:
+    """Движок автопокупки, вызывается из detector() сразу после диффа"""
+
+    def __init__(
+        self,
+        backend: PurchaseBackend,
+        rules: PurchaseRules,
+        history_size: int = 50,
+        claim: typing.Callable[[str], typing.Awaitable[bool]] | None = None
+    ) -> None:
+        self.backend = backend
+        self.rules = rules
+        self.claim = claim  # при нескольких экземплярах покупку выполняет только захвативший её
+
+        self.stars_spent = 0
+        self.attempts: deque[PurchaseAttempt] = deque(maxlen=history_size)
+
+        self._tasks: set[asyncio.Task[list[PurchaseAttempt]]] = set()
+        self._handled_star_gift_ids: set[int] = set()
+
+    async def prepare(self) -> None:
+        await self.backend.prepare()
+
+        logger.info("Purchase engine is prepared")
+
+    def on_new_gift(self, star_gift: StarGiftData, detected_at: float | None = None) -> asyncio.Task[list[PurchaseAttempt]] | None:
+        """Не блокирует цикл опроса: покупка идёт в отдельной задаче"""
+        if detected_at is None:
+            detected_at = time.perf_counter()
+
+        if star_gift.id in self._handled_star_gift_ids:
+            return None
+
+        self._handled_star_gift_ids.add(star_gift.id)
+
+        task = asyncio.create_task(self.purchase(star_gift, detected_at))
+
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        return task
+
+    def forget(self, star_gift_ids: typing.Iterable[int]) -> None:
+        """Подарки ушли из каталога: больше не нужно помнить, что они обработаны"""
+        self._handled_star_gift_ids.difference_update(star_gift_ids)
+
+    async def purchase(self, star_gift: StarGiftData, detected_at: float) -> list[PurchaseAttempt]:
+        attempts: list[PurchaseAttempt] = []
+
+        reject_reason = self.rules.get_reject_reason(star_gift)
+
+        if reject_reason:
+            logger.info(f"Auto-purchase skipped for star gift {star_gift.id}: {reject_reason}")
+
+            return attempts
+
+        if self.claim and not await self.claim(f"purchase:{star_gift.id}"):
+            logger.info(f"Auto-purchase of star gift {star_gift.id} is handled by another instance")
+
+            return attempts
+
+        for _ in range(self.rules.quantity):
+            if self.rules.stars_budget is not None and self.stars_spent + star_gift.price > self.rules.stars_budget:
+                logger.info(f"Auto-purchase budget exhausted ({self.stars_spent}/{self.rules.stars_budget} stars)")
+
+                break
+
+            # Резервируем звёзды до запроса, чтобы параллельные покупки не превысили бюджет
+            self.stars_spent += star_gift.price
+
+            attempt = PurchaseAttempt(
+                star_gift_id = star_gift.id,
+                price = star_gift.price,
+                detected_at = detected_at,
+                matched_at = time.perf_counter()
+            )
+
+            attempts.append(attempt)
+            self.attempts.append(attempt)
+
+            try:
+                attempt.form_requested_at = time.perf_counter()
+                payment_form = await self.backend.get_payment_form(star_gift.id)
+                attempt.form_received_at = time.perf_counter()
+
+                attempt.purchase_sent_at = time.perf_counter()
+                await self.backend.send_payment_form(star_gift.id, payment_form)
+                attempt.purchase_done_at = time.perf_counter()
+
+            except Exception as ex:
+                attempt.error = f"{type(ex).__name__}: {ex}"
+
+                self.stars_spent -= star_gift.price
+
+                logger.error(f"Auto-purchase of star gift {star_gift.id} failed: {attempt.error}, stages: {attempt.get_stage_durations_ms()}")
+
+                break
+
+            attempt.success = True
+
+            logger.info(f"Auto-purchased star gift {star_gift.id} for {star_gift.price} stars, stages: {attempt.get_stage_durations_ms()}")
+
+            # Каждая следующая покупка начинается от конца предыдущей
+            detected_at = time.perf_counter()
+
+        return attempts
+
+    async def drain(self) -> None:
+        """Дождаться покупок в процессе"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def get_status(self) -> dict[str, typing.Any]:
+        successful_attempts = [
+            attempt
+            for attempt in self.attempts
+            if attempt.success and attempt.purchase_sent_at is not None
+        ]
+
+        return {
+            "stars_spent": self.stars_spent,
+            "attempts": len(self.attempts),
+            "successful": len(successful_attempts),
+            "last_detection_to_request_ms": (
+                round((successful_attempts[-1].purchase_sent_at - successful_attempts[-1].detected_at) * 1000, 3)  # pyright: ignore[reportOptionalOperand]
+                if successful_attempts else
+                None
+            )
+        }
+
+class FakePaymentForm(typing.NamedTuple):
+    form_id: int
+
+class FakePurchaseBackend:
+    """Подменный бэкенд с искусственной задержкой (для проверок без Telegram)"""
+
+    def __init__(self, rtt: float = 0.0, fail_star_gift_ids: typing.Collection[int] = ()) -> None:
+        self.rtt = rtt
+        self.fail_star_gift_ids = set(fail_star_gift_ids)
+
+        self.prepared = False
+        self.purchased_star_gift_ids: list[int] = []
+
+        self._form_ids = itertools.count(1)
+
+    async def prepare(self) -> None:
+        self.prepared = True
+
+    async def get_payment_form(self, star_gift_id: int) -> typing.Any:
+        await asyncio.sleep(self.rtt)
+
+        if star_gift_id in self.fail_star_gift_ids:
+            raise RuntimeError("STARGIFT_USAGE_LIMITED")
+
+        return FakePaymentForm(
+            form_id = next(self._form_ids)
+        )
+
+    async def send_payment_form(self, star_gift_id: int, payment_form: typing.Any) -> typing.Any:
+        await asyncio.sleep(self.rtt)
+
+        self.purchased_star_gift_ids.append(star_gift_id)
+
+        return True
+
+if __name__ == "__main__":
+    # Замер времени от обнаружения до запроса покупки на фейковом бэкенде
+    async def main() -> None:
+        backend = FakePurchaseBackend(rtt=0.05)
+
+        engine = PurchaseEngine(
+            backend = backend,
+            rules = PurchaseRules(
+                max_price = 1_000,
+                quantity = 2
+            )
+        )
+
+        await engine.prepare()
+
+        for star_gift_id, price in ((1, 500), (2, 5_000), (3, 100)):
+            engine.on_new_gift(StarGiftData(
+                id = star_gift_id,
+                number = star_gift_id,
+                sticker_file_id = "",
+                sticker_file_name = f"{star_gift_id}.tgs",
+                price = price,
+                convert_price = price,
+                available_amount = 1_000,
+                total_amount = 1_000,
+                is_limited = True
+            ))
+
+        await engine.drain()
+
+        for attempt in engine.attempts:
+            print(attempt.star_gift_id, attempt.success, attempt.get_stage_durations_ms())
+
+        print(engine.get_status())
+
+    asyncio.run(main())
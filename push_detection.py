@@ -0,0 +1,132 @@
+"""
+Push-детект: сырые MTProto-обновления (посты отслеживаемого канала,
+сервисные сообщения о подарках, изменения баланса звёзд) запускают
+внеочередной опрос каталога; обычный опрос по CHECK_INTERVAL остаётся
+запасным вариантом
+"""
+
+from pyrogram.raw.types.update_new_message import UpdateNewMessage
+from pyrogram.raw.types.update_new_channel_message import UpdateNewChannelMessage
+from pyrogram.raw.types.update_edit_channel_message import UpdateEditChannelMessage
+from pyrogram.raw.types.update_stars_balance import UpdateStarsBalance
+from pyrogram.raw.types.message_service import MessageService
+from pyrogram.raw.types.message_action_star_gift import MessageActionStarGift
+from pyrogram.raw.types.message_action_star_gift_unique import MessageActionStarGiftUnique
+from pyrogram.raw.types.peer_channel import PeerChannel
+
+import asyncio
+import logging
+import time
+import typing
+
+logger = logging.getLogger(__name__)
+
+class PollTrigger:
+    """Будит цикл detector() раньше CHECK_INTERVAL"""
+
+    def __init__(self, min_interval: float) -> None:
+        self.min_interval = min_interval
+
+        self.triggers = 0
+        self.triggered_polls = 0
+        self.last_reason: str | None = None
+        self.last_trigger_to_poll_seconds: float | None = None
+
+        self._event = asyncio.Event()
+        self._triggered_at: float | None = None
+        self._last_poll_at: float | None = None
+
+    def trigger(self, reason: str) -> None:
+        self.triggers += 1
+        self.last_reason = reason
+
+        if self._triggered_at is None:
+            self._triggered_at = time.monotonic()
+
+        self._event.set()
+
+    def mark_polled(self) -> None:
+        """Вызывается в начале каждого опроса"""
+        now = time.monotonic()
+
+        if self._triggered_at is not None:
+            self.triggered_polls += 1
+            self.last_trigger_to_poll_seconds = round(now - self._triggered_at, 3)
+
+        self._triggered_at = None
+        self._last_poll_at = now
+
+        self._event.clear()
+
+    async def wait(self, timeout: float) -> None:
+        """Ждёт триггер или timeout; опросы не чаще min_interval"""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+
+        except TimeoutError:
+            return
+
+        if self._last_poll_at is not None:
+            delay = self._last_poll_at + self.min_interval - time.monotonic()
+
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    def get_status(self) -> dict[str, typing.Any]:
+        return {
+            "triggers": self.triggers,
+            "triggered_polls": self.triggered_polls,
+            "last_reason": self.last_reason,
+            "last_trigger_to_poll_seconds": self.last_trigger_to_poll_seconds
+        }
+
+def get_message_trigger_reason(message: typing.Any, watch_channel_id: int | None) -> str | None:
+    """Причина опроса по сырому сообщению (raw.types.Message / MessageService)"""
+    if isinstance(message, MessageService) and isinstance(message.action, (MessageActionStarGift, MessageActionStarGiftUnique)):
+        return "star_gift_service_message"
+
+    peer_id = getattr(message, "peer_id", None)
+
+    if watch_channel_id is not None and isinstance(peer_id, PeerChannel) and peer_id.channel_id == watch_channel_id:
+        return "watch_channel_post"
+
+    return None
+
+def get_update_trigger_reason(update: typing.Any, watch_channel_id: int | None) -> str | None:
+    """Причина внеочередного опроса или None, если обновление не интересно"""
+    if isinstance(update, UpdateStarsBalance):
+        return "stars_balance"
+
+    if isinstance(update, (UpdateNewMessage, UpdateNewChannelMessage, UpdateEditChannelMessage)):
+        return get_message_trigger_reason(update.message, watch_channel_id)
+
+    return None
+
+def make_raw_update_handler(
+    poll_trigger: PollTrigger,
+    watch_channel_id: int | None
+) -> typing.Callable[..., typing.Coroutine[typing.Any, typing.Any, None]]:
+    async def handle_raw_update(client: typing.Any, update: typing.Any, users: typing.Any, chats: typing.Any) -> None:
+        reason = get_update_trigger_reason(update, watch_channel_id)
+
+        if reason:
+            logger.debug("Out-of-cycle poll triggered by %s", reason)
+
+            poll_trigger.trigger(reason)
+
+    return handle_raw_update
+
+def make_message_handler(
+    poll_trigger: PollTrigger,
+    watch_channel_id: int | None
+) -> typing.Callable[..., typing.Coroutine[typing.Any, typing.Any, None]]:
+    """Сообщения pyrogram разбирает сам и в RawUpdateHandler не передаёт - сырое сообщение берётся из message.raw"""
+    async def handle_message(client: typing.Any, message: typing.Any) -> None:
+        reason = get_message_trigger_reason(getattr(message, "raw", None), watch_channel_id)
+
+        if reason:
+            logger.debug("Out-of-cycle poll triggered by %s", reason)
+
+            poll_trigger.trigger(reason)
+
+    return handle_message
@@ -0,0 +1,198 @@
+"""
+Воспроизведение записанных ответов GetStarGifts (см. star_gifts_capture.py)
+через detector() в реальном или ускоренном времени: задержки разбора
+каталога, обработки опроса и доставки нового подарка до уведомления
+
+python replay.py capture.gz --speed 10
+"""
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from io import BytesIO
+
+import argparse
+import asyncio
+import time
+import typing
+
+import numpy as np
+
+from star_gifts_capture import CaptureFrame, read_capture
+from star_gifts_data import StarGiftData, StarGiftsData
+
+import offload
+import constants
+import config
+
+class ReplayFinished(Exception):
+    pass
+
+class ReplayClient:
+    """Отдаёт кадры записи вместо ответов GetStarGifts"""
+
+    is_connected = True
+
+    def __init__(self, frames: list[CaptureFrame], speed: float) -> None:
+        self.frames = frames
+        self.speed = speed  # 0 - без пауз между кадрами
+
+        self.index = 0
+        self.started_at: float | None = None
+        self.returned_at: float | None = None
+
+        self.poll_latencies: list[float] = []  # от ответа до следующего запроса - вся обработка опроса
+        self.schedule_lags: list[float] = []  # опоздание запроса кадра относительно записи
+
+    async def start(self) -> None:
+        pass
+
+    async def invoke(self, query: typing.Any, **kwargs: typing.Any) -> typing.Any:
+        now = time.perf_counter()
+
+        if self.returned_at is not None:
+            self.poll_latencies.append(now - self.returned_at)
+
+        if self.index >= len(self.frames):
+            raise ReplayFinished()
+
+        frame = self.frames[self.index]
+
+        if self.started_at is None:
+            self.started_at = now
+
+        if self.speed > 0:
+            due = self.started_at + (frame.captured_at - self.frames[0].captured_at) / self.speed
+
+            if due > now:
+                await asyncio.sleep(due - now)
+
+            self.schedule_lags.append(max(now - due, 0.0))
+
+        self.index += 1
+        self.returned_at = time.perf_counter()
+
+        return frame.response
+
+    async def download_media(self, message: typing.Any, in_memory: bool = True, **kwargs: typing.Any) -> BytesIO:
+        # Стикеры не записываются
+        return BytesIO()
+
+def isolate_work_files(dirpath: Path) -> None:
+    """Логи, каталог, снапшот, аналитика и стикеры прогона - во временной папке
+
+    Вызывается до import detector: при импорте он открывает лог (и чистит старые),
+    загружает каталог и очищает папку стикеров
+    """
+    constants.LOG_FILEPATH = dirpath / "main.log"
+
+    config.DATA_FILEPATH = dirpath / "star_gifts.json"
+    config.DATA_SNAPSHOT_FILEPATH = dirpath / "star_gifts.snapshot"
+    config.ANALYTICS_FILEPATH = dirpath / "analytics.npz"
+    config.ALERT_ASSETS_DIRPATH = dirpath / "stickers"
+
+    # Воспроизведение не дописывает запись, которую само читает
+    config.CAPTURE_FILEPATH = None
+
+    import parse_data
+
+    parse_data.star_gifts_capture = None
+
+def get_percentiles(values: list[float]) -> str:
+    if not values:
+        return "-"
+
+    array = np.asarray(values, dtype=np.float64) * 1000
+    p50, p95 = np.percentile(array, (50, 95))
+
+    return f"p50={p50:.2f}ms p95={p95:.2f}ms max={array.max():.2f}ms (n={array.size})"
+
+async def replay(capture_filepath: Path, speed: float) -> None:
+    frames = list(read_capture(capture_filepath))
+
+    if len(frames) < 2:
+        raise SystemExit(f"{capture_filepath}: need at least 2 frames, got {len(frames)}")
+
+    # Опрос сразу после обработки: темп задают кадры записи
+    config.CHECK_INTERVAL = 0.0
+
+    temp_directory = TemporaryDirectory()
+    temp_dirpath = Path(temp_directory.name)
+
+    isolate_work_files(temp_dirpath)
+
+    import detector
+
+    client = ReplayClient(frames, speed)
+
+    parse_latencies: list[float] = []
+    alert_latencies: list[float] = []
+
+    get_star_gifts_catalog = detector.get_star_gifts_catalog
+
+    async def timed_get_star_gifts_catalog(*args: typing.Any, **kwargs: typing.Any) -> typing.Any:
+        result = await get_star_gifts_catalog(*args, **kwargs)
+
+        parse_latencies.append(time.perf_counter() - typing.cast(float, client.returned_at))
+
+        return result
+
+    async def on_new_gift(star_gift: StarGiftData) -> None:
+        alert_latencies.append(time.perf_counter() - typing.cast(float, client.returned_at))
+
+    await offload.warm_up()
+
+    with temp_directory:
+        # Первый кадр - исходное состояние каталога, сравнение начинается со второго
+        _, first_star_gifts_dict, _ = await get_star_gifts_catalog(typing.cast(typing.Any, client))
+
+        detector.STAR_GIFTS_DATA = StarGiftsData(
+            DATA_FILEPATH = config.DATA_FILEPATH,
+            star_gifts = list((first_star_gifts_dict or {}).values())
+        )
+
+        detector.get_star_gifts_catalog = timed_get_star_gifts_catalog
+
+        client.returned_at = None
+        client.started_at = None
+        client.frames = frames[1:]
+        client.index = 0
+        client.schedule_lags.clear()
+
+        update_gifts_queue: detector.UPDATE_GIFTS_QUEUE_T = asyncio.Queue()
+
+        started_at = time.perf_counter()
+
+        try:
+            await detector.detector(
+                app = typing.cast(typing.Any, client),
+                new_gift_callback = on_new_gift,
+                update_gifts_queue = update_gifts_queue
+            )
+
+        except ReplayFinished:
+            pass
+
+        finally:
+            detector.get_star_gifts_catalog = get_star_gifts_catalog
+
+        elapsed = time.perf_counter() - started_at
+
+        offload.shutdown()
+
+    recorded_seconds = frames[-1].captured_at - frames[1].captured_at
+
+    print(f"frames: {len(frames) - 1} over {recorded_seconds:.1f}s recorded, replayed in {elapsed:.1f}s (speed {speed or 'max'})")
+    print(f"new gifts: {len(alert_latencies)}, edits enqueued: {update_gifts_queue.qsize()}")
+    print(f"parse:      {get_percentiles(parse_latencies)}")
+    print(f"poll total: {get_percentiles(client.poll_latencies)}")
+    print(f"new gift -> alert callback: {get_percentiles(alert_latencies)}")
+    print(f"schedule lag: {get_percentiles(client.schedule_lags)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay captured GetStarGifts responses through detector()")
+    parser.add_argument("capture_filepath", type=Path)
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier, 0 - as fast as possible")
+
+    args = parser.parse_args()
+
+    asyncio.run(replay(args.capture_filepath, args.speed))
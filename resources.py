@@ -0,0 +1,168 @@
+"""
+Учёт ресурсов процесса для /status: RSS и его пик, сборщик мусора, потоки,
+место под логи и стикеры на диске, по желанию - tracemalloc
+"""
+
+from pathlib import Path
+
+import gc
+import os
+import sys
+import threading
+import tracemalloc
+import typing
+
+MB = 1024 * 1024
+
+def get_rss_bytes() -> int | None:
+    """Текущий RSS (Linux); None - недоступно на этой платформе"""
+    try:
+        with open("/proc/self/statm", "rb") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+    except (OSError, ValueError, IndexError):
+        return None
+
+def get_peak_rss_bytes() -> int | None:
+    try:
+        import resource
+
+    except ImportError:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # macOS отдаёт байты, Linux - килобайты
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+def get_directory_size(dirpath: Path) -> int:
+    if not dirpath.exists():
+        return 0
+
+    return sum(
+        filepath.stat().st_size
+        for filepath in dirpath.iterdir()
+        if filepath.is_file()
+    )
+
+def start_tracemalloc(frames: int = 1) -> None:
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+def get_tracemalloc_status(top: int = 5) -> dict[str, typing.Any] | None:
+    if not tracemalloc.is_tracing():
+        return None
+
+    current, peak = tracemalloc.get_traced_memory()
+
+    return {
+        "current_mb": round(current / MB, 3),
+        "peak_mb": round(peak / MB, 3),
+        "top": [
+            {
+                "location": str(statistic.traceback),
+                "size_kb": round(statistic.size / 1024, 1),
+                "count": statistic.count
+            }
+            for statistic in tracemalloc.take_snapshot().statistics("lineno")[:top]
+        ]
+    }
+
+def get_memory_status(directories: dict[str, Path] | None = None) -> dict[str, typing.Any]:
+    rss = get_rss_bytes()
+    peak_rss = get_peak_rss_bytes()
+
+    return {
+        "rss_mb": round(rss / MB, 1) if rss is not None else None,
+        "peak_rss_mb": round(peak_rss / MB, 1) if peak_rss is not None else None,
+        "gc_counts": gc.get_count(),
+        "threads": threading.active_count(),
+        "disk_mb": {
+            name: round(get_directory_size(dirpath) / MB, 3)
+            for name, dirpath in (directories or {}).items()
+        },
+        "tracemalloc": get_tracemalloc_status()
+    }
+
+if __name__ == "__main__":
+    # Память на стикеры волны из 40 подарков: в памяти (по умолчанию) и на диске (lean)
+    from tempfile import TemporaryDirectory
+    from io import BytesIO
+
+    import asyncio
+
+    from alert_assets import AlertAssetCache
+    from star_gifts_data import StarGiftData
+
+    STICKERS = 40
+    STICKER_SIZE = 64 * 1024
+    CHUNK_SIZE = 16 * 1024
+
+    class FakeClient:
+        """download_media как у pyrogram: in_memory - BytesIO, иначе запись в файл частями"""
+
+        async def download_media(self, message: str, in_memory: bool = False, file_name: str = "") -> BytesIO | str:
+            if in_memory:
+                binary = BytesIO()
+
+                for _ in range(STICKER_SIZE // CHUNK_SIZE):
+                    binary.write(os.urandom(CHUNK_SIZE))
+
+                return binary
+
+            with open(file_name, "wb") as file:
+                for _ in range(STICKER_SIZE // CHUNK_SIZE):
+                    file.write(os.urandom(CHUNK_SIZE))
+
+            return file_name
+
+    def make_star_gift(star_gift_id: int) -> StarGiftData:
+        return StarGiftData.model_construct(
+            id = star_gift_id,
+            number = star_gift_id,
+            sticker_file_id = "",
+            sticker_file_name = "sticker.tgs",
+            price = 50,
+            convert_price = 40,
+            available_amount = 1_000,
+            total_amount = 1_000,
+            is_limited = True
+        )
+
+    async def measure(name: str, max_entries: int, dirpath: Path | None) -> None:
+        gc.collect()
+        tracemalloc.start()
+
+        cache = AlertAssetCache(max_entries=max_entries, dirpath=dirpath)
+        client = FakeClient()
+
+        # Как в detector: все скачивания стартуют сразу, ожидание - по очереди
+        tasks = [
+            cache.prefetch(client, make_star_gift(star_gift_id))
+            for star_gift_id in range(STICKERS)
+        ]
+
+        for task in tasks:
+            await task
+
+        del tasks, task
+
+        gc.collect()
+
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        on_disk = get_directory_size(dirpath) if dirpath is not None else 0
+
+        print(f"{name:>26}: retained {current / MB:6.2f}MB, peak {peak / MB:6.2f}MB, on disk {on_disk / MB:5.2f}MB")
+
+        cache.close()
+
+    async def main() -> None:
+        await measure("in memory, 64 entries", 64, None)
+        await measure("in memory, 16 entries", 16, None)
+
+        with TemporaryDirectory() as temp_dirpath:
+            await measure("on disk (lean), 16 entries", 16, Path(temp_dirpath))
+
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+"""
+Реестр источников статуса для /status веб-сервера
+Модули регистрируют функции, возвращающие словарь со своими метриками.
+Источники, зарегистрированные из event loop, опрашиваются в нём же: /status
+приходит из потока Flask, а состояние модулей меняет только event loop
+"""
+
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+import asyncio
+import logging
+import typing
+
+logger = logging.getLogger(__name__)
+
+STATUS_PROVIDER_T = typing.Callable[[], dict[str, typing.Any]]
+
+# Сколько поток Flask ждёт снимок от event loop
+STATUS_LOOP_TIMEOUT = 2.0
+
+# Имя -> (источник, event loop владельца; None - можно вызывать из любого потока)
+_status_providers: dict[str, tuple[STATUS_PROVIDER_T, asyncio.AbstractEventLoop | None]] = {}
+
+def _get_running_loop() -> asyncio.AbstractEventLoop | None:
+    try:
+        return asyncio.get_running_loop()
+
+    except RuntimeError:
+        return None
+
+def register_status_provider(name: str, provider: STATUS_PROVIDER_T, is_thread_safe: bool = False) -> None:
+    """is_thread_safe - источник не читает состояние event loop и вызывается прямо из потока Flask"""
+    _status_providers[name] = (provider, None if is_thread_safe else _get_running_loop())
+
+def unregister_status_provider(name: str) -> None:
+    _status_providers.pop(name, None)
+
+def _collect_status(providers: list[tuple[str, STATUS_PROVIDER_T]]) -> dict[str, typing.Any]:
+    status: dict[str, typing.Any] = {}
+
+    for name, provider in providers:
+        try:
+            status[name] = provider()
+
+        except Exception as ex:
+            logger.warning(f"Status provider {name} failed: {ex}")
+
+            status[name] = {"error": str(ex)}
+
+    return status
+
+def _collect_status_on_loop(loop: asyncio.AbstractEventLoop, providers: list[tuple[str, STATUS_PROVIDER_T]]) -> dict[str, typing.Any]:
+    """Снимок всех источников одного event loop за один его шаг"""
+    if loop is _get_running_loop() or not loop.is_running():
+        return _collect_status(providers)
+
+    future: Future[dict[str, typing.Any]] = Future()
+
+    def collect() -> None:
+        if future.set_running_or_notify_cancel():
+            future.set_result(_collect_status(providers))
+
+    try:
+        loop.call_soon_threadsafe(collect)
+
+    except RuntimeError:  # event loop уже закрыт
+        return _collect_status(providers)
+
+    try:
+        return future.result(STATUS_LOOP_TIMEOUT)
+
+    except FutureTimeoutError:
+        future.cancel()
+
+        return {
+            name: {"error": f"event loop did not respond in {STATUS_LOOP_TIMEOUT}s"}
+            for name, _ in providers
+        }
+
+def get_runtime_status() -> dict[str, typing.Any]:
+    providers_by_loop: dict[asyncio.AbstractEventLoop | None, list[tuple[str, STATUS_PROVIDER_T]]] = {}
+
+    for name, (provider, loop) in list(_status_providers.items()):
+        providers_by_loop.setdefault(loop, []).append((name, provider))
+
+    status: dict[str, typing.Any] = {}
+
+    for loop, providers in providers_by_loop.items():
+        status.update(
+            _collect_status(providers)
+            if loop is None else
+            _collect_status_on_loop(loop, providers)
+        )
+
+    return status
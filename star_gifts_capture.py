@@ -0,0 +1,145 @@
+"""
+Запись ответов GetStarGifts для воспроизведения: сырые TL-объекты с временем
+получения пишутся кадрами в gzip-файл, replay.py прогоняет их через detector()
+"""
+
+from pathlib import Path
+from io import BytesIO
+from concurrent.futures import Future
+
+from pyrogram.raw.core import TLObject
+
+import gzip
+import logging
+import struct
+import threading
+import time
+import typing
+import zlib
+
+import offload
+import config
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_MAGIC = b"SGCAPTURE1\n"
+
+# time.time() получения ответа, длина TL-байтов
+FRAME_HEADER = struct.Struct("<dI")
+
+class CaptureFrame(typing.NamedTuple):
+    captured_at: float
+    response: typing.Any  # StarGifts | StarGiftsNotModified
+
+class CaptureError(Exception):
+    pass
+
+class StarGiftsCaptureWriter:
+    def __init__(self, filepath: Path, compresslevel: int = 6) -> None:
+        self.filepath = filepath
+        self.compresslevel = compresslevel
+
+        self.frames = 0
+        self.bytes_written = 0  # до сжатия
+        self.failed = 0
+        self.skipped_unchanged = 0
+
+        self._last_hash: int | None = None
+        self._file: gzip.GzipFile | None = None
+        self._lock = threading.Lock()
+
+    def write_frame(self, captured_at: float, data: bytes) -> None:
+        with self._lock:
+            if self._file is None:
+                is_new = not self.filepath.exists() or self.filepath.stat().st_size == 0
+
+                # Дозапись - новый gzip-член того же файла, gzip.open читает их подряд
+                self._file = typing.cast(gzip.GzipFile, gzip.open(self.filepath, "ab", compresslevel=self.compresslevel))
+
+                if is_new:
+                    self._file.write(CAPTURE_MAGIC)
+
+            self._file.write(FRAME_HEADER.pack(captured_at, len(data)))
+            self._file.write(data)
+
+            # Кадр переживает аварийное завершение процесса
+            self._file.flush(zlib.Z_SYNC_FLUSH)
+
+            self.frames += 1
+            self.bytes_written += FRAME_HEADER.size + len(data)
+
+    def _on_written(self, future: Future[None]) -> None:
+        ex = future.exception()
+
+        if ex is not None:
+            self.failed += 1
+
+            logger.error(f"Failed to write star gifts capture frame: {ex}")
+
+    def submit(self, response: TLObject, captured_at: float | None = None) -> None:
+        """Сериализация в event loop (объект не потокобезопасен), сжатие и запись - в io-потоке"""
+        captured_at = captured_at if captured_at is not None else time.time()
+
+        # Каталог без изменений не пишется: при воспроизведении между кадрами ничего не происходит
+        response_hash = getattr(response, "hash", None)
+
+        if response_hash is not None and response_hash == self._last_hash:
+            self.skipped_unchanged += 1
+
+            return
+
+        self._last_hash = response_hash
+
+        offload.get_io_executor().submit(self.write_frame, captured_at, response.write()).add_done_callback(self._on_written)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def get_status(self) -> dict[str, typing.Any]:
+        return {
+            "filepath": self.filepath.as_posix(),
+            "frames": self.frames,
+            "bytes_written": self.bytes_written,
+            "failed": self.failed,
+            "skipped_unchanged": self.skipped_unchanged
+        }
+
+def read_capture(filepath: Path) -> typing.Iterator[CaptureFrame]:
+    with gzip.open(filepath, "rb") as file:
+        if file.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise CaptureError(f"{filepath} is not a star gifts capture")
+
+        while True:
+            # Запись, оборванную аварийным завершением, читаем до последнего целого кадра
+            try:
+                header = file.read(FRAME_HEADER.size)
+
+                if not header:
+                    return
+
+                captured_at, length = FRAME_HEADER.unpack(header)
+                data = file.read(length)
+
+            except (EOFError, struct.error):
+                logger.warning(f"Truncated capture {filepath}, stopping")
+
+                return
+
+            if len(data) < length:
+                logger.warning(f"Truncated capture {filepath}, stopping")
+
+                return
+
+            yield CaptureFrame(
+                captured_at = captured_at,
+                response = TLObject.read(BytesIO(data))
+            )
+
+star_gifts_capture = (
+    StarGiftsCaptureWriter(config.CAPTURE_FILEPATH)
+    if config.CAPTURE_FILEPATH else
+    None
+)
@@ -2,6 +2,7 @@ from pydantic import BaseModel, Field
 from pathlib import Path
 
 import simplejson as json
+import typing
 
 import constants
 
@@ -19,34 +20,80 @@ class StarGiftData(BaseConfigModel):
     total_amount: int
     is_limited: bool
     first_appearance_timestamp: int | None = Field(default=None)  # None if posted before this update
-    message_id: int | None = Field(default=None)
+    messages: dict[int, int] = Field(default_factory=dict[int, int])  # chat_id получателя -> message_id сообщения о подарке
     last_sale_timestamp: int | None = Field(default=None)
     is_upgradable: bool = Field(default=False)
 
+class StarGiftsDataDump(typing.NamedTuple):
+    data: str
+    snapshot: bytes | None
+
 class StarGiftsData(BaseConfigModel):
     DATA_FILEPATH: Path = Field(exclude=True)
+    SNAPSHOT_FILEPATH: Path | None = Field(default=None, exclude=True)
     star_gifts: list[StarGiftData] = Field(default_factory=list[StarGiftData])
 
     @classmethod
-    def load(cls, data_filepath: Path) -> "StarGiftsData":
+    def load(cls, data_filepath: Path, snapshot_filepath: Path | None = None) -> "StarGiftsData":
+        if snapshot_filepath is not None:
+            from star_gifts_snapshot import StarGiftsSnapshot, SnapshotError, is_snapshot_fresh
+
+            if is_snapshot_fresh(snapshot_filepath, data_filepath):
+                try:
+                    # Подарки материализуются лениво при первом обращении
+                    return cls.model_construct(
+                        DATA_FILEPATH = data_filepath,
+                        SNAPSHOT_FILEPATH = snapshot_filepath,
+                        star_gifts = typing.cast(list[StarGiftData], StarGiftsSnapshot(snapshot_filepath))
+                    )
+
+                except SnapshotError:
+                    pass
+
         try:
             with data_filepath.open("r", encoding=constants.ENCODING) as file:
                 return cls.model_validate({
                     **json.load(file),
-                    "DATA_FILEPATH": data_filepath
+                    "DATA_FILEPATH": data_filepath,
+                    "SNAPSHOT_FILEPATH": snapshot_filepath
                 })
 
         except FileNotFoundError:
             return cls(
-                DATA_FILEPATH = data_filepath
+                DATA_FILEPATH = data_filepath,
+                SNAPSHOT_FILEPATH = snapshot_filepath
             )
 
-    def save(self) -> None:
-        with self.DATA_FILEPATH.open("w", encoding=constants.ENCODING) as file:
-            json.dump(
+    def dump(self) -> StarGiftsDataDump:
+        """Сериализация в потоке, который меняет подарки; готовые данные записывает write (можно из другого потока)"""
+        if not isinstance(self.star_gifts, list):
+            self.star_gifts = list(self.star_gifts)
+
+        snapshot: bytes | None = None
+
+        if self.SNAPSHOT_FILEPATH is not None:
+            from star_gifts_snapshot import pack_snapshot
+
+            snapshot = pack_snapshot(self.star_gifts)
+
+        return StarGiftsDataDump(
+            data = json.dumps(
                 obj = self.model_dump(),
-                fp = file,
                 indent = 4,
                 ensure_ascii = True,
                 sort_keys = False
-            )
\ No newline at end of file
+            ),
+            snapshot = snapshot
+        )
+
+    def write(self, dump: StarGiftsDataDump) -> None:
+        with self.DATA_FILEPATH.open("w", encoding=constants.ENCODING) as file:
+            file.write(dump.data)
+
+        if self.SNAPSHOT_FILEPATH is not None and dump.snapshot is not None:
+            from star_gifts_snapshot import write_snapshot_file
+
+            write_snapshot_file(self.SNAPSHOT_FILEPATH, dump.snapshot)
+
+    def save(self) -> None:
+        self.write(self.dump())
\ No newline at end of file
@@ -0,0 +1,330 @@
+"""
+Бинарный снапшот каталога подарков для быстрого тёплого старта
+Записи фиксированной длины + таблица строк, чтение через mmap
+"""
+
+from pathlib import Path
+
+import mmap
+import os
+import struct
+import typing
+
+from star_gifts_data import StarGiftData
+
+SNAPSHOT_MAGIC = b"SGSN"
+SNAPSHOT_VERSION = 2
+
+# magic, version, record_size, count, strings_offset
+HEADER_STRUCT = struct.Struct("<4sHHIQ")
+
+# id, number, price, convert_price, available_amount, total_amount,
+# first_appearance_timestamp, last_sale_timestamp, flags,
+# sticker_file_id (offset, length), sticker_file_name (offset, length),
+# messages (offset, length) - "chat_id:message_id,..." получателей
+RECORD_STRUCT = struct.Struct("<qiqqqqqqBIHIHII")
+
+ID_STRUCT = struct.Struct("<q")
+
+FLAG_IS_LIMITED = 1 << 0
+FLAG_IS_UPGRADABLE = 1 << 1
+FLAG_HAS_FIRST_APPEARANCE = 1 << 2
+FLAG_HAS_LAST_SALE = 1 << 4
+
+class SnapshotError(Exception):
+    pass
+
+def encode_messages(messages: dict[int, int]) -> str:
+    return ",".join(
+        f"{chat_id}:{message_id}"
+        for chat_id, message_id in messages.items()
+    )
+
+def decode_messages(value: str) -> dict[int, int]:
+    if not value:
+        return {}
+
+    return {
+        int(chat_id): int(message_id)
+        for chat_id, message_id in (
+            item.split(":")
+            for item in value.split(",")
+        )
+    }
+
+def pack_snapshot(star_gifts: typing.Iterable[StarGiftData]) -> bytes:
+    """Содержимое файла снапшота"""
+    sorted_star_gifts = sorted(
+        star_gifts,
+        key = lambda star_gift: star_gift.id
+    )
+
+    strings = bytearray()
+    records = bytearray()
+
+    def add_string(value: str) -> tuple[int, int]:
+        encoded = value.encode("utf-8")
+        offset = len(strings)
+        strings.extend(encoded)
+
+        return offset, len(encoded)
+
+    for star_gift in sorted_star_gifts:
+        flags = (
+            (FLAG_IS_LIMITED if star_gift.is_limited else 0)
+            | (FLAG_IS_UPGRADABLE if star_gift.is_upgradable else 0)
+            | (FLAG_HAS_FIRST_APPEARANCE if star_gift.first_appearance_timestamp is not None else 0)
+            | (FLAG_HAS_LAST_SALE if star_gift.last_sale_timestamp is not None else 0)
+        )
+
+        records.extend(RECORD_STRUCT.pack(
+            star_gift.id,
+            star_gift.number,
+            star_gift.price,
+            star_gift.convert_price,
+            star_gift.available_amount,
+            star_gift.total_amount,
+            star_gift.first_appearance_timestamp or 0,
+            star_gift.last_sale_timestamp or 0,
+            flags,
+            *add_string(star_gift.sticker_file_id),
+            *add_string(star_gift.sticker_file_name),
+            *add_string(encode_messages(star_gift.messages))
+        ))
+
+    header = HEADER_STRUCT.pack(
+        SNAPSHOT_MAGIC,
+        SNAPSHOT_VERSION,
+        RECORD_STRUCT.size,
+        len(sorted_star_gifts),
+        HEADER_STRUCT.size + len(records)
+    )
+
+    return header + records + strings
+
+def write_snapshot_file(snapshot_filepath: Path, data: bytes) -> None:
+    """Атомарная запись снапшота (через временный файл)"""
+    tmp_filepath = snapshot_filepath.with_name(snapshot_filepath.name + ".tmp")
+
+    with tmp_filepath.open("wb") as file:
+        file.write(data)
+
+    os.replace(tmp_filepath, snapshot_filepath)
+
+def write_snapshot(snapshot_filepath: Path, star_gifts: typing.Iterable[StarGiftData]) -> None:
+    write_snapshot_file(snapshot_filepath, pack_snapshot(star_gifts))
+
+class StarGiftsSnapshot(typing.Sequence[StarGiftData]):
+    """Ленивое представление снапшота: StarGiftData создаются только при обращении"""
+
+    def __init__(self, snapshot_filepath: Path) -> None:
+        self.snapshot_filepath = snapshot_filepath
+
+        self._file = snapshot_filepath.open("rb")
+
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        except ValueError:  # empty file
+            self._file.close()
+            raise SnapshotError(f"Snapshot file is empty: {snapshot_filepath}")
+
+        if len(self._mmap) < HEADER_STRUCT.size:
+            self.close()
+            raise SnapshotError(f"Snapshot file is truncated: {snapshot_filepath}")
+
+        magic, version, record_size, self._count, self._strings_offset = HEADER_STRUCT.unpack_from(self._mmap, 0)
+
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION or record_size != RECORD_STRUCT.size:
+            self.close()
+            raise SnapshotError(f"Unsupported snapshot format: {snapshot_filepath}")
+
+        if self._strings_offset != HEADER_STRUCT.size + self._count * RECORD_STRUCT.size or self._strings_offset > len(self._mmap):
+            self.close()
+            raise SnapshotError(f"Snapshot file is corrupted: {snapshot_filepath}")
+
+        self._cache: list[StarGiftData | None] = [None] * self._count
+
+    def __len__(self) -> int:
+        return self._count
+
+    @typing.overload
+    def __getitem__(self, index: int) -> StarGiftData: ...
+
+    @typing.overload
+    def __getitem__(self, index: slice) -> list[StarGiftData]: ...
+
+    def __getitem__(self, index: int | slice) -> StarGiftData | list[StarGiftData]:
+        if isinstance(index, slice):
+            return [
+                self[i]
+                for i in range(*index.indices(self._count))
+            ]
+
+        if index < 0:
+            index += self._count
+
+        if not 0 <= index < self._count:
+            raise IndexError("snapshot index out of range")
+
+        star_gift = self._cache[index]
+
+        if star_gift is None:
+            star_gift = self._cache[index] = self._materialize(index)
+
+        return star_gift
+
+    def _record_offset(self, index: int) -> int:
+        return HEADER_STRUCT.size + index * RECORD_STRUCT.size
+
+    def _read_string(self, offset: int, length: int) -> str:
+        start = self._strings_offset + offset
+
+        return self._mmap[start:start + length].decode("utf-8")
+
+    def _materialize(self, index: int) -> StarGiftData:
+        (
+            star_gift_id,
+            number,
+            price,
+            convert_price,
+            available_amount,
+            total_amount,
+            first_appearance_timestamp,
+            last_sale_timestamp,
+            flags,
+            sticker_file_id_offset,
+            sticker_file_id_length,
+            sticker_file_name_offset,
+            sticker_file_name_length,
+            messages_offset,
+            messages_length
+        ) = RECORD_STRUCT.unpack_from(self._mmap, self._record_offset(index))
+
+        # Данные писали мы сами, поэтому валидация pydantic не нужна
+        return StarGiftData.model_construct(
+            id = star_gift_id,
+            number = number,
+            sticker_file_id = self._read_string(sticker_file_id_offset, sticker_file_id_length),
+            sticker_file_name = self._read_string(sticker_file_name_offset, sticker_file_name_length),
+            price = price,
+            convert_price = convert_price,
+            available_amount = available_amount,
+            total_amount = total_amount,
+            is_limited = bool(flags & FLAG_IS_LIMITED),
+            first_appearance_timestamp = first_appearance_timestamp if flags & FLAG_HAS_FIRST_APPEARANCE else None,
+            messages = decode_messages(self._read_string(messages_offset, messages_length)),
+            last_sale_timestamp = last_sale_timestamp if flags & FLAG_HAS_LAST_SALE else None,
+            is_upgradable = bool(flags & FLAG_IS_UPGRADABLE)
+        )
+
+    def get_id(self, index: int) -> int:
+        """id записи без создания StarGiftData"""
+        return ID_STRUCT.unpack_from(self._mmap, self._record_offset(index))[0]
+
+    def find(self, star_gift_id: int) -> StarGiftData | None:
+        """Бинарный поиск по id (записи отсортированы)"""
+        low, high = 0, self._count
+
+        while low < high:
+            middle = (low + high) // 2
+
+            if self.get_id(middle) < star_gift_id:
+                low = middle + 1
+
+            else:
+                high = middle
+
+        if low < self._count and self.get_id(low) == star_gift_id:
+            return self[low]
+
+        return None
+
+    def close(self) -> None:
+        if not self._mmap.closed:
+            self._mmap.close()
+
+        self._file.close()
+
+    def __enter__(self) -> "StarGiftsSnapshot":
+        return self
+
+    def __exit__(self, *args: typing.Any) -> None:
+        self.close()
+
+def is_snapshot_fresh(snapshot_filepath: Path, data_filepath: Path) -> bool:
+    """Снапшот актуален, если он не старше JSON-файла"""
+    try:
+        snapshot_mtime = snapshot_filepath.stat().st_mtime
+
+    except FileNotFoundError:
+        return False
+
+    try:
+        return snapshot_mtime >= data_filepath.stat().st_mtime
+
+    except FileNotFoundError:
+        return True
+
+if __name__ == "__main__":
+    # Бенчмарк старта: JSON + model_validate против mmap-снапшота
+    from tempfile import TemporaryDirectory
+
+    import time
+
+    from star_gifts_data import StarGiftsData
+
+    def make_star_gifts(amount: int) -> list[StarGiftData]:
+        return [
+            StarGiftData(
+                id = 5_000_000_000_000_000_000 + i,
+                number = i + 1,
+                sticker_file_id = "CAACAgIAAxUAAWd" + "x" * 60 + str(i),
+                sticker_file_name = f"{i}.tgs",
+                price = 50 + i % 1000,
+                convert_price = 40 + i % 800,
+                available_amount = i % 5000,
+                total_amount = 5000 if i % 3 == 0 else 0,
+                is_limited = i % 3 == 0,
+                first_appearance_timestamp = 1_700_000_000 + i,
+                messages = {1_000_000 + i: i} if i % 2 == 0 else {},
+                last_sale_timestamp = None,
+                is_upgradable = i % 7 == 0
+            )
+            for i in range(amount)
+        ]
+
+    with TemporaryDirectory() as tmp_dirname:
+        tmp_dirpath = Path(tmp_dirname)
+
+        for amount in (1_000, 10_000, 100_000):
+            data_filepath = tmp_dirpath / f"star_gifts_{amount}.json"
+            snapshot_filepath = tmp_dirpath / f"star_gifts_{amount}.snapshot"
+
+            StarGiftsData(
+                DATA_FILEPATH = data_filepath,
+                star_gifts = make_star_gifts(amount)
+            ).save()
+
+            json_started_at = time.perf_counter()
+            star_gifts_data = StarGiftsData.load(data_filepath)
+            json_elapsed = time.perf_counter() - json_started_at
+
+            write_snapshot(snapshot_filepath, star_gifts_data.star_gifts)
+
+            snapshot_started_at = time.perf_counter()
+            snapshot = StarGiftsSnapshot(snapshot_filepath)
+            snapshot_open_elapsed = time.perf_counter() - snapshot_started_at
+            snapshot.find(star_gifts_data.star_gifts[-1].id)
+            snapshot_lookup_elapsed = time.perf_counter() - snapshot_started_at
+            list(snapshot)
+            snapshot_full_elapsed = time.perf_counter() - snapshot_started_at
+            snapshot.close()
+
+            print(
+                f"{amount:>7,} gifts: "
+                f"json={json_elapsed * 1000:.1f}ms, "
+                f"snapshot open={snapshot_open_elapsed * 1000:.2f}ms, "
+                f"open+lookup={snapshot_lookup_elapsed * 1000:.2f}ms, "
+                f"open+materialize all={snapshot_full_elapsed * 1000:.1f}ms"
+            )
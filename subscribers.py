@@ -0,0 +1,227 @@
+"""
+Подписчики одного общего опроса: у каждого свои фильтры подарков и своя
+лестница эскалации. Фильтры заранее разложены по корзинам (цена, лимитированность,
+улучшаемость) - получатели нового подарка находятся за O(совпадений)
+"""
+
+from pydantic import BaseModel, Field, model_validator
+from pathlib import Path
+from bisect import bisect_right
+
+import itertools
+import typing
+
+import simplejson as json
+
+from star_gifts_data import StarGiftData
+from escalation import EscalationPolicy
+
+import constants
+
+# Нижние границы ценовых корзин в звёздах
+PRICE_BUCKETS = (0, 25, 50, 100, 250, 500, 1_000, 2_500, 5_000, 10_000, 25_000, 100_000)
+
+INDEX_KEY_T = tuple[int, bool, bool]  # (корзина цены, is_limited, is_upgradable)
+
+class SubscriberFilter(BaseModel):
+    min_price: int | None = Field(default=None, ge=0)
+    max_price: int | None = Field(default=None, ge=0)
+    is_limited: bool | None = Field(default=None)  # None - любые
+    is_upgradable: bool | None = Field(default=None)
+
+    @model_validator(mode="after")
+    def check_price_range(self) -> "SubscriberFilter":
+        if self.min_price is not None and self.max_price is not None and self.min_price > self.max_price:
+            raise ValueError("min_price must not be greater than max_price")
+
+        return self
+
+    def matches(self, star_gift: StarGiftData) -> bool:
+        return (
+            (self.min_price is None or star_gift.price >= self.min_price)
+            and (self.max_price is None or star_gift.price <= self.max_price)
+            and (self.is_limited is None or star_gift.is_limited == self.is_limited)
+            and (self.is_upgradable is None or star_gift.is_upgradable == self.is_upgradable)
+        )
+
+class Subscriber(BaseModel):
+    chat_id: int
+    filters: SubscriberFilter = Field(default_factory=SubscriberFilter)
+    escalation: EscalationPolicy | None = Field(default=None)  # None - общая политика
+    is_enabled: bool = Field(default=True)
+
+class Subscribers(BaseModel):
+    """Файл подписчиков"""
+    subscribers: list[Subscriber] = Field(default_factory=list[Subscriber])
+
+    @classmethod
+    def load(cls, filepath: Path) -> list[Subscriber]:
+        with filepath.open("r", encoding=constants.ENCODING) as file:
+            return cls.model_validate(json.load(file)).subscribers
+
+def get_price_bucket(price: int) -> int:
+    return max(bisect_right(PRICE_BUCKETS, price) - 1, 0)
+
+def _get_bucket_range(bucket: int) -> tuple[int, int | None]:
+    """Цены корзины: [от, до] включительно, None - без верхней границы"""
+    return (
+        PRICE_BUCKETS[bucket],
+        PRICE_BUCKETS[bucket + 1] - 1 if bucket + 1 < len(PRICE_BUCKETS) else None
+    )
+
+class SubscriberIndex:
+    def __init__(self, subscribers: typing.Iterable[Subscriber]) -> None:
+        self._subscribers: dict[int, Subscriber] = {}
+
+        # Ключ -> (фильтр покрывает корзину целиком, покрывает частично - нужна проверка цены)
+        self._index: dict[INDEX_KEY_T, tuple[list[Subscriber], list[Subscriber]]] = {}
+
+        for subscriber in subscribers:
+            if subscriber.is_enabled:
+                self._subscribers[subscriber.chat_id] = subscriber
+
+        for subscriber in self._subscribers.values():
+            self._add(subscriber)
+
+    def _add(self, subscriber: Subscriber) -> None:
+        subscriber_filter = subscriber.filters
+
+        flags = [
+            (is_limited, is_upgradable)
+            for is_limited, is_upgradable in itertools.product((False, True), repeat=2)
+            if subscriber_filter.is_limited in (None, is_limited) and subscriber_filter.is_upgradable in (None, is_upgradable)
+        ]
+
+        for bucket in range(len(PRICE_BUCKETS)):
+            bucket_min, bucket_max = _get_bucket_range(bucket)
+
+            if subscriber_filter.max_price is not None and subscriber_filter.max_price < bucket_min:
+                break
+
+            if subscriber_filter.min_price is not None and bucket_max is not None and subscriber_filter.min_price > bucket_max:
+                continue
+
+            is_full = (
+                (subscriber_filter.min_price is None or subscriber_filter.min_price <= bucket_min)
+                and (subscriber_filter.max_price is None or (bucket_max is not None and subscriber_filter.max_price >= bucket_max))
+            )
+
+            for is_limited, is_upgradable in flags:
+                full, partial = self._index.setdefault((bucket, is_limited, is_upgradable), ([], []))
+
+                (full if is_full else partial).append(subscriber)
+
+    def match(self, star_gift: StarGiftData) -> list[Subscriber]:
+        """Получатели подарка
+
+        У нового подарка is_upgradable ещё не проверен (False по умолчанию):
+        фильтры is_upgradable=True дождутся match_upgradable
+        """
+        entry = self._index.get((get_price_bucket(star_gift.price), star_gift.is_limited, star_gift.is_upgradable))
+
+        if entry is None:
+            return []
+
+        full, partial = entry
+
+        return full + [
+            subscriber
+            for subscriber in partial
+            if subscriber.filters.matches(star_gift)
+        ]
+
+    def match_upgradable(self, star_gift: StarGiftData) -> list[Subscriber]:
+        """Получатели, ждавшие улучшаемости: вызывается, когда проверка её подтвердила"""
+        return [
+            subscriber
+            for subscriber in self.match(star_gift)
+            if subscriber.filters.is_upgradable
+        ]
+
+    @property
+    def has_upgradable_filters(self) -> bool:
+        return any(subscriber.filters.is_upgradable for subscriber in self._subscribers.values())
+
+    def get(self, chat_id: int) -> Subscriber | None:
+        return self._subscribers.get(chat_id)
+
+    def __contains__(self, chat_id: object) -> bool:
+        return chat_id in self._subscribers
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def get_status(self) -> dict[str, typing.Any]:
+        return {
+            "subscribers": len(self._subscribers),
+            "index_keys": len(self._index),
+            "partial_entries": sum(len(partial) for _, partial in self._index.values())
+        }
+
+def load_subscribers(filepath: Path | None, default_chat_id: int) -> list[Subscriber]:
+    """Подписчики из файла; без файла - один получатель NOTIFY_CHAT_ID без фильтров"""
+    if filepath is not None:
+        return Subscribers.load(filepath)
+
+    return [Subscriber(chat_id=default_chat_id)] if default_chat_id else []
+
+if __name__ == "__main__":
+    # Сопоставление подарка с получателями: индекс против перебора всех подписчиков
+    import random
+    import time
+
+    random.seed(0)
+
+    PRICES = (15, 25, 50, 100, 200, 350, 500, 1_000, 2_500, 5_000, 10_000, 20_000)
+
+    def make_subscriber(chat_id: int) -> Subscriber:
+        min_price = random.choice((None, 25, 100, 500, 1_000))
+
+        return Subscriber(
+            chat_id = chat_id,
+            filters = SubscriberFilter(
+                min_price = min_price,
+                max_price = random.choice((None, None, 2_500, 10_000)) if not min_price or min_price <= 2_500 else None,
+                is_limited = random.choice((None, True, True, False)),
+                is_upgradable = random.choice((None, None, None, True))
+            )
+        )
+
+    def make_star_gift(price: int) -> StarGiftData:
+        return StarGiftData.model_construct(
+            id = 1,
+            number = 1,
+            sticker_file_id = "",
+            sticker_file_name = "",
+            price = price,
+            convert_price = price,
+            available_amount = 1_000,
+            total_amount = 1_000,
+            is_limited = random.random() < 0.9,
+            is_upgradable = random.random() < 0.2
+        )
+
+    star_gifts = [make_star_gift(random.choice(PRICES)) for _ in range(1_000)]
+
+    print(f"{'subscribers':>12} {'avg matches':>12} {'linear scan':>12} {'index':>10} {'speedup':>8}")
+
+    for size in (100, 1_000, 10_000):
+        subscribers = [make_subscriber(chat_id) for chat_id in range(size)]
+        subscriber_index = SubscriberIndex(subscribers)
+
+        started_at = time.perf_counter()
+        linear_matches = [[subscriber for subscriber in subscribers if subscriber.filters.matches(star_gift)] for star_gift in star_gifts]
+        linear_us = (time.perf_counter() - started_at) / len(star_gifts) * 1e6
+
+        started_at = time.perf_counter()
+        index_matches = [subscriber_index.match(star_gift) for star_gift in star_gifts]
+        index_us = (time.perf_counter() - started_at) / len(star_gifts) * 1e6
+
+        assert all(
+            sorted(subscriber.chat_id for subscriber in linear) == sorted(subscriber.chat_id for subscriber in indexed)
+            for linear, indexed in zip(linear_matches, index_matches)
+        )
+
+        avg_matches = sum(map(len, index_matches)) / len(index_matches)
+
+        print(f"{size:>12} {avg_matches:>12.1f} {linear_us:>10.1f}us {index_us:>8.1f}us {linear_us / index_us:>7.1f}x")
@@ -0,0 +1,205 @@
+"""
+Супервизор фоновых задач на asyncio.TaskGroup: политики перезапуска,
+экспоненциальная задержка, статус задач и корректное завершение
+"""
+
+from pydantic import BaseModel, Field
+
+import asyncio
+import inspect
+import logging
+import time
+import typing
+
+logger = logging.getLogger(__name__)
+
+RESTART_ALWAYS = "always"
+RESTART_ON_FAILURE = "on_failure"
+RESTART_NEVER = "never"
+
+TASK_FACTORY_T = typing.Callable[[], typing.Coroutine[typing.Any, typing.Any, typing.Any]]
+CLEANUP_T = typing.Callable[[], typing.Awaitable[typing.Any] | typing.Any]
+
+class RestartPolicy(BaseModel):
+    mode: typing.Literal["always", "on_failure", "never"] = Field(default=RESTART_ON_FAILURE)
+    initial_delay: float = Field(default=0.5)
+    max_delay: float = Field(default=30.0)
+    factor: float = Field(default=2.0)
+    reset_after: float = Field(default=60.0)  # после стольких секунд стабильной работы задержка сбрасывается
+
+class TaskHealth(BaseModel):
+    name: str
+    state: typing.Literal["pending", "running", "backoff", "stopped", "failed"] = Field(default="pending")
+    restarts: int = Field(default=0)
+    last_error: str | None = Field(default=None)
+    last_started_at: float | None = Field(default=None)
+    last_failed_at: float | None = Field(default=None)
+    last_recovery_seconds: float | None = Field(default=None)  # от падения до повторного запуска
+
+class SupervisedTask(typing.NamedTuple):
+    name: str
+    factory: TASK_FACTORY_T
+    policy: RestartPolicy
+
+class Supervisor:
+    """Запускает задачи в одном TaskGroup и перезапускает их по политике"""
+
+    def __init__(self, drain_timeout: float = 10.0) -> None:
+        self.drain_timeout = drain_timeout
+
+        self.health: dict[str, TaskHealth] = {}
+
+        self._tasks: dict[str, SupervisedTask] = {}
+        self._cleanups: list[tuple[str, CLEANUP_T]] = []
+        self._stopping = asyncio.Event()
+
+    def add_task(self, name: str, factory: TASK_FACTORY_T, policy: RestartPolicy | None = None) -> None:
+        if name in self._tasks:
+            raise ValueError(f"Task {name} is already supervised")
+
+        self._tasks[name] = SupervisedTask(
+            name = name,
+            factory = factory,
+            policy = policy or RestartPolicy()
+        )
+
+        self.health[name] = TaskHealth(
+            name = name
+        )
+
+    def add_cleanup(self, name: str, cleanup: CLEANUP_T) -> None:
+        """Действия при завершении; выполняются в обратном порядке добавления"""
+        self._cleanups.append((name, cleanup))
+
+    def stop(self) -> None:
+        if not self._stopping.is_set():
+            logger.info("Supervisor is stopping")
+
+            self._stopping.set()
+
+    @property
+    def is_stopping(self) -> bool:
+        return self._stopping.is_set()
+
+    async def _sleep_unless_stopping(self, delay: float) -> None:
+        try:
+            await asyncio.wait_for(self._stopping.wait(), delay)
+
+        except TimeoutError:
+            pass
+
+    async def _supervise(self, supervised_task: SupervisedTask) -> None:
+        health = self.health[supervised_task.name]
+        policy = supervised_task.policy
+
+        delay = policy.initial_delay
+        failed_at_monotonic: float | None = None
+
+        while not self.is_stopping:
+            started_at_monotonic = time.monotonic()
+
+            if failed_at_monotonic is not None:
+                health.last_recovery_seconds = round(started_at_monotonic - failed_at_monotonic, 3)
+
+            health.state = "running"
+            health.last_started_at = time.time()
+
+            failed = False
+
+            try:
+                await supervised_task.factory()
+
+            except asyncio.CancelledError:
+                health.state = "stopped"
+
+                raise
+
+            except Exception as ex:
+                failed = True
+
+                health.last_error = f"{type(ex).__name__}: {ex}"
+                health.last_failed_at = time.time()
+
+                failed_at_monotonic = time.monotonic()
+
+                logger.exception(f"Error in supervised task {supervised_task.name}: {ex}")
+
+            if self.is_stopping:
+                break
+
+            if policy.mode == RESTART_NEVER or (policy.mode == RESTART_ON_FAILURE and not failed):
+                health.state = "failed" if failed else "stopped"
+
+                return
+
+            if not failed:
+                failed_at_monotonic = time.monotonic()
+
+            if time.monotonic() - started_at_monotonic >= policy.reset_after:
+                delay = policy.initial_delay
+
+            health.state = "backoff"
+            health.restarts += 1
+
+            logger.warning(f"Restarting supervised task {supervised_task.name} in {delay:.1f}s")
+
+            try:
+                await self._sleep_unless_stopping(delay)
+
+            except asyncio.CancelledError:
+                health.state = "stopped"
+
+                raise
+
+            delay = min(delay * policy.factor, policy.max_delay)
+
+        health.state = "stopped"
+
+    async def run(self) -> None:
+        """Работает до stop(), затем отменяет задачи и выполняет drain"""
+        try:
+            async with asyncio.TaskGroup() as task_group:
+                supervise_tasks = [
+                    task_group.create_task(
+                        self._supervise(supervised_task),
+                        name = f"supervised:{supervised_task.name}"
+                    )
+                    for supervised_task in self._tasks.values()
+                ]
+
+                async def cancel_on_stop() -> None:
+                    await self._stopping.wait()
+
+                    for supervise_task in supervise_tasks:
+                        supervise_task.cancel()
+
+                stop_watcher = task_group.create_task(cancel_on_stop())
+
+                # Если все задачи завершились сами, наблюдатель тоже не нужен
+                await asyncio.gather(*supervise_tasks, return_exceptions=True)
+
+                stop_watcher.cancel()
+
+        finally:
+            await self.drain()
+
+    async def drain(self) -> None:
+        for name, cleanup in reversed(self._cleanups):
+            try:
+                result = cleanup()
+
+                if inspect.isawaitable(result):
+                    await asyncio.wait_for(result, self.drain_timeout)
+
+                logger.debug(f"Cleanup {name} finished")
+
+            except Exception as ex:
+                logger.exception(f"Error in cleanup {name}: {ex}")
+
+        self._cleanups.clear()
+
+    def get_status(self) -> dict[str, typing.Any]:
+        return {
+            name: health.model_dump()
+            for name, health in self.health.items()
+        }
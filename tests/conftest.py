@@ -0,0 +1,42 @@
+from pathlib import Path
+
+import types
+import typing
+
+import pytest
+
+import config
+import constants
+
+CHAT_ID = 42
+
+@pytest.fixture(scope="session")
+def detector(tmp_path_factory: pytest.TempPathFactory) -> typing.Iterator[types.ModuleType]:
+    """detector, импортированный на временных рабочих файлах; config восстанавливается после тестов"""
+    import parse_data
+
+    from replay import isolate_work_files
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        # isolate_work_files меняет атрибуты сам: исходные значения запоминаются заранее
+        for module, name in (
+            (constants, "LOG_FILEPATH"),
+            (config, "DATA_FILEPATH"),
+            (config, "DATA_SNAPSHOT_FILEPATH"),
+            (config, "ANALYTICS_FILEPATH"),
+            (config, "ALERT_ASSETS_DIRPATH"),
+            (config, "CAPTURE_FILEPATH"),
+            (parse_data, "star_gifts_capture")
+        ):
+            monkeypatch.setattr(module, name, getattr(module, name))
+
+        isolate_work_files(Path(tmp_path_factory.mktemp("work")))
+
+        # Читаются при импорте detector
+        monkeypatch.setattr(config, "BOT_TOKENS", ["1:test"])
+        monkeypatch.setattr(config, "NOTIFY_CHAT_ID", CHAT_ID)
+        monkeypatch.setattr(config, "SUBSCRIBERS_FILEPATH", None)
+
+        import detector
+
+        yield detector
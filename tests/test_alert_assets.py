@@ -0,0 +1,95 @@
+"""
+Кэш стикеров на диске: стикеры идущих оповещений не вытесняются и не удаляются
+"""
+
+from pathlib import Path
+
+import asyncio
+import typing
+
+from alert_assets import AlertAssetCache
+from star_gifts_data import StarGiftData
+
+def make_star_gift(star_gift_id: int) -> StarGiftData:
+    return StarGiftData(
+        id = star_gift_id,
+        number = star_gift_id,
+        sticker_file_id = f"file_{star_gift_id}",
+        sticker_file_name = f"{star_gift_id}.tgs",
+        price = 50,
+        convert_price = 40,
+        available_amount = 100,
+        total_amount = 100,
+        is_limited = True
+    )
+
+class FakeClient:
+    def __init__(self) -> None:
+        self.downloads: list[str] = []
+
+    async def download_media(self, message: str, file_name: str, **kwargs: typing.Any) -> str:
+        self.downloads.append(message)
+
+        Path(file_name).write_bytes(b"sticker")
+
+        return file_name
+
+def test_pinned_stickers_survive_a_burst(tmp_path: Path) -> None:
+    client = FakeClient()
+    cache = AlertAssetCache(max_entries=2, dirpath=tmp_path)
+
+    async def run() -> None:
+        # Оповещения о первых трёх подарках ещё идут, когда приходит четвёртый
+        stickers: dict[int, typing.Any] = {}
+
+        for star_gift_id in (1, 2, 3, 4):
+            if star_gift_id < 4:
+                cache.pin(star_gift_id)
+
+            stickers[star_gift_id] = await cache.prefetch(client, make_star_gift(star_gift_id))
+
+        assert all(sticker.exists() for sticker in stickers.values())
+        assert cache.get_status()["stickers"] == 4
+
+        assert client.downloads == ["file_1", "file_2", "file_3", "file_4"]
+
+        for star_gift_id in (1, 2, 3):
+            cache.unpin(star_gift_id)
+
+        # После рассылки кэш сжимается до max_entries, старые файлы удаляются
+        await asyncio.sleep(0)
+
+        assert cache.get_status()["stickers"] == 2
+        assert cache.get_status()["pinned"] == 0
+        assert not stickers[1].exists() and not stickers[2].exists()
+        assert stickers[3].exists() and stickers[4].exists()
+
+        cache.close()
+
+    asyncio.run(run())
+
+def test_nested_pins_keep_sticker(tmp_path: Path) -> None:
+    client = FakeClient()
+    cache = AlertAssetCache(max_entries=1, dirpath=tmp_path)
+
+    async def run() -> None:
+        cache.pin(1)
+        cache.pin(1)
+
+        sticker = await cache.prefetch(client, make_star_gift(1))
+
+        await cache.prefetch(client, make_star_gift(2))
+
+        cache.unpin(1)
+
+        assert sticker.exists()
+
+        cache.unpin(1)
+
+        await asyncio.sleep(0)
+
+        assert not sticker.exists()
+
+        cache.close()
+
+    asyncio.run(run())
@@ -0,0 +1,76 @@
+"""
+Ресемплинг истории остатков: forward-fill, подбор шага по умолчанию и
+ограничения сетки для публичного эндпоинта
+"""
+
+import pytest
+
+from analytics import GiftAnalyticsStore, NO_VALUE, RESAMPLE_DEFAULT_STEP, RESAMPLE_MAX_POINTS
+from star_gifts_data import StarGiftData
+
+STAR_GIFT_ID = 1
+STARTED_AT = 1_700_000_000
+DAY = 86_400
+
+def make_store(*samples: tuple[int, int]) -> GiftAnalyticsStore:
+    store = GiftAnalyticsStore()
+
+    for timestamp, available_amount in samples:
+        store.record([
+            StarGiftData(
+                id = STAR_GIFT_ID,
+                number = 1,
+                sticker_file_id = "",
+                sticker_file_name = "",
+                price = 50,
+                convert_price = 40,
+                available_amount = available_amount,
+                total_amount = 1_000,
+                is_limited = True
+            )
+        ], timestamp)
+
+    return store
+
+def test_resample_forward_fills_between_samples() -> None:
+    store = make_store((STARTED_AT, 1_000), (STARTED_AT + 90, 900), (STARTED_AT + 200, 850))
+
+    grid, values = store.resample(STAR_GIFT_ID, step=60, since=STARTED_AT - 120, until=STARTED_AT + 240)
+
+    # Сетка начинается с первого отсчёта, а не с since
+    assert grid.tolist() == [STARTED_AT + offset for offset in (0, 60, 120, 180, 240)]
+    assert values.tolist() == [1_000, 1_000, 900, 900, 850]
+    assert NO_VALUE not in values.tolist()
+
+def test_default_step_fits_long_history() -> None:
+    store = make_store((STARTED_AT, 1_000), (STARTED_AT + 30 * DAY, 0))
+
+    grid, values = store.resample(STAR_GIFT_ID, until=STARTED_AT + 30 * DAY)
+
+    step = int(grid[1] - grid[0])
+
+    assert grid.size <= RESAMPLE_MAX_POINTS
+    assert step % RESAMPLE_DEFAULT_STEP == 0
+    assert values[0] == 1_000 and values[-1] == 0
+
+def test_default_step_is_a_minute_for_short_history() -> None:
+    store = make_store((STARTED_AT, 1_000))
+
+    grid, _ = store.resample(STAR_GIFT_ID, until=STARTED_AT + 3_600)
+
+    assert grid.size == 61
+    assert int(grid[1] - grid[0]) == RESAMPLE_DEFAULT_STEP
+
+def test_explicit_out_of_range_parameters_are_rejected() -> None:
+    store = make_store((STARTED_AT, 1_000))
+
+    with pytest.raises(ValueError):
+        store.resample(STAR_GIFT_ID, step=1, until=STARTED_AT + 60)
+
+    with pytest.raises(ValueError):
+        store.resample(STAR_GIFT_ID, step=60, until=STARTED_AT + 30 * DAY)
+
+def test_unknown_gift_has_empty_series() -> None:
+    grid, values = make_store().resample(STAR_GIFT_ID)
+
+    assert grid.size == 0 and values.size == 0
@@ -0,0 +1,73 @@
+"""
+Векторное сравнение каталога совпадает с проходом по словарям
+"""
+
+import random
+
+import numpy as np
+
+from catalog_diff import CatalogSnapshot, diff_catalogs
+
+def python_diff(old: dict[int, tuple[int, bool]], new: dict[int, tuple[int, bool]]) -> tuple[list[int], list[int], list[int], list[int], list[int]]:
+    decreased_ids = sorted(
+        star_gift_id
+        for star_gift_id, (amount, _) in new.items()
+        if star_gift_id in old and amount < old[star_gift_id][0]
+    )
+
+    return (
+        sorted(star_gift_id for star_gift_id in new if star_gift_id not in old),
+        sorted(star_gift_id for star_gift_id in old if star_gift_id not in new),
+        decreased_ids,
+        [old[star_gift_id][0] for star_gift_id in decreased_ids],
+        [star_gift_id for star_gift_id in decreased_ids if new[star_gift_id] == (0, True)]
+    )
+
+def make_snapshot(catalog: dict[int, tuple[int, bool]], rng: random.Random) -> CatalogSnapshot:
+    # Порядок не гарантирован - from_columns сортирует сам
+    items = list(catalog.items())
+    rng.shuffle(items)
+
+    return CatalogSnapshot.from_columns(
+        (star_gift_id for star_gift_id, _ in items),
+        (amount for _, (amount, _) in items),
+        (is_limited for _, (_, is_limited) in items)
+    )
+
+def test_diff_matches_dict_diff() -> None:
+    rng = random.Random(0)
+
+    for _ in range(200):
+        old = {
+            rng.randrange(1, 60): (rng.randrange(0, 5), rng.random() < 0.7)
+            for _ in range(rng.randrange(0, 40))
+        }
+
+        new = {
+            star_gift_id: (max(amount - rng.randrange(0, 3), 0), is_limited)
+            for star_gift_id, (amount, is_limited) in old.items()
+            if rng.random() < 0.9
+        }
+
+        for _ in range(rng.randrange(0, 5)):
+            new.setdefault(rng.randrange(1, 60), (rng.randrange(0, 5), rng.random() < 0.7))
+
+        diff = diff_catalogs(make_snapshot(old, rng), make_snapshot(new, rng))
+
+        assert tuple(array.tolist() for array in diff) == python_diff(old, new)
+
+def test_empty_catalogs() -> None:
+    empty = CatalogSnapshot.from_columns((), (), ())
+    catalog = CatalogSnapshot.from_columns((3, 1), (0, 5), (True, False))
+
+    assert catalog.ids.tolist() == [1, 3]
+
+    diff = diff_catalogs(empty, catalog)
+
+    assert diff.new_ids.tolist() == [1, 3]
+    assert not diff.removed_ids.size and not diff.decreased_ids.size
+
+    diff = diff_catalogs(catalog, empty)
+
+    assert diff.removed_ids.tolist() == [1, 3]
+    assert diff.new_ids.dtype == np.int64
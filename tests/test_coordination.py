@@ -0,0 +1,233 @@
+"""
+Координация экземпляров на SQLiteCoordinationBackend: разовые действия,
+покупки, истечение аренд и общие сообщения о подарках
+"""
+
+from pathlib import Path
+
+import asyncio
+import time
+import typing
+
+import pytest
+
+from coordination import Coordinator, SQLiteCoordinationBackend, CLAIM_ACQUIRED, CLAIM_HELD, CLAIM_DONE
+from star_gifts_data import StarGiftData
+
+def make_star_gift(star_gift_id: int, messages: dict[int, int] | None = None) -> StarGiftData:
+    return StarGiftData(
+        id = star_gift_id,
+        number = star_gift_id,
+        sticker_file_id = "",
+        sticker_file_name = f"{star_gift_id}.tgs",
+        price = 50,
+        convert_price = 40,
+        available_amount = 100,
+        total_amount = 100,
+        is_limited = True,
+        messages = messages or {}
+    )
+
+@pytest.fixture
+def backend(tmp_path: Path) -> typing.Iterator[SQLiteCoordinationBackend]:
+    backend = SQLiteCoordinationBackend(tmp_path / "coordination.db")
+
+    yield backend
+
+    backend.close()
+
+def make_coordinator(backend: SQLiteCoordinationBackend, instance_id: str, claim_ttl: float = 3.0) -> Coordinator:
+    return Coordinator(
+        backend = backend,
+        instance_id = instance_id,
+        leader_ttl = 0.4,
+        renew_interval = 0.1,
+        claim_ttl = claim_ttl
+    )
+
+def test_lease_is_exclusive_until_expiry(backend: SQLiteCoordinationBackend) -> None:
+    assert backend.try_acquire("lease", "a", 0.2) == CLAIM_ACQUIRED
+    assert backend.try_acquire("lease", "b", 0.2) == CLAIM_HELD
+    assert backend.try_acquire("lease", "a", 0.2) == CLAIM_ACQUIRED  # продление владельцем
+
+    time.sleep(0.25)
+
+    assert backend.try_acquire("lease", "b", 0.2) == CLAIM_ACQUIRED
+
+    backend.complete("lease", "b")
+
+    assert backend.try_acquire("lease", "a", 0.2) == CLAIM_DONE
+
+def test_run_once_runs_action_on_one_instance(backend: SQLiteCoordinationBackend) -> None:
+    first = make_coordinator(backend, "a")
+    second = make_coordinator(backend, "b")
+
+    calls: list[str] = []
+
+    async def action(instance_id: str) -> None:
+        calls.append(instance_id)
+
+        await asyncio.sleep(0.05)
+
+    async def run() -> list[bool]:
+        return await asyncio.gather(
+            first.run_once("new_gift:1", lambda: action("a")),
+            second.run_once("new_gift:1", lambda: action("b"))
+        )
+
+    assert sorted(asyncio.run(run())) == [False, True]
+    assert len(calls) == 1
+
+    # Выполненное действие не повторяется и не остаётся в очереди перехвата
+    assert asyncio.run(second.run_once("new_gift:1", lambda: action("b"))) is False
+    assert len(calls) == 1
+    assert second.get_status()["pending_actions"] == 0
+
+def test_failed_action_is_released_for_another_instance(backend: SQLiteCoordinationBackend) -> None:
+    first = make_coordinator(backend, "a")
+    second = make_coordinator(backend, "b")
+
+    async def fail() -> None:
+        raise RuntimeError("bot api is down")
+
+    async def succeed() -> None:
+        pass
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(first.run_once("new_gift:1", fail))
+
+    assert asyncio.run(second.run_once("new_gift:1", succeed)) is True
+
+def test_claim_is_done_once(backend: SQLiteCoordinationBackend) -> None:
+    first = make_coordinator(backend, "a")
+    second = make_coordinator(backend, "b")
+
+    async def run() -> list[bool]:
+        return await asyncio.gather(
+            first.claim("purchase:1"),
+            second.claim("purchase:1")
+        )
+
+    assert sorted(asyncio.run(run())) == [False, True]
+    assert asyncio.run(first.claim("purchase:1")) is False
+
+def test_abandoned_action_is_taken_over_after_lease_expiry(backend: SQLiteCoordinationBackend) -> None:
+    # Экземпляр "a" захватил действие и умер, не завершив его
+    assert backend.try_acquire("new_gift:1", "a", 0.2) == CLAIM_ACQUIRED
+
+    second = make_coordinator(backend, "b", claim_ttl=0.2)
+
+    calls: list[str] = []
+
+    async def action() -> None:
+        calls.append("b")
+
+    async def run() -> None:
+        assert await second.run_once("new_gift:1", action) is False
+        assert second.get_status()["pending_actions"] == 1
+
+        election_task = asyncio.create_task(second.run_leader_election())
+
+        await asyncio.sleep(0.5)
+
+        election_task.cancel()
+
+    asyncio.run(run())
+
+    assert calls == ["b"]
+    assert backend.try_acquire("new_gift:1", "a", 0.2) == CLAIM_DONE
+
+def test_action_stops_when_claim_renewal_keeps_failing(backend: SQLiteCoordinationBackend, monkeypatch: pytest.MonkeyPatch) -> None:
+    coordinator = make_coordinator(backend, "a", claim_ttl=0.3)
+
+    try_acquire = backend.try_acquire
+    calls = 0
+
+    def flaky_try_acquire(name: str, owner: str, ttl: float) -> str:
+        nonlocal calls
+
+        calls += 1
+
+        # Первый захват проходит, продления - нет
+        if calls > 1:
+            raise OSError("disk I/O error")
+
+        return try_acquire(name, owner, ttl)
+
+    monkeypatch.setattr(backend, "try_acquire", flaky_try_acquire)
+
+    finished = False
+
+    async def long_action() -> None:
+        nonlocal finished
+
+        await asyncio.sleep(2)
+
+        finished = True
+
+    async def run() -> bool:
+        started_at = time.monotonic()
+
+        result = await coordinator.run_once("new_gift:1", long_action)
+
+        # Остановлено до того, как аренда истекла бы с запасом
+        assert time.monotonic() - started_at < 0.5
+
+        return result
+
+    assert asyncio.run(run()) is False
+    assert not finished
+
+def test_leadership_handler_does_not_block_renewal(backend: SQLiteCoordinationBackend) -> None:
+    coordinator = make_coordinator(backend, "a")
+
+    async def slow_merge() -> None:
+        await asyncio.sleep(1)
+
+    coordinator.on_leadership_acquired = slow_merge
+
+    async def run() -> None:
+        election_task = asyncio.create_task(coordinator.run_leader_election())
+
+        await asyncio.sleep(0.8)
+
+        assert coordinator.is_leader
+        assert coordinator.leadership_changes == 1
+
+        election_task.cancel()
+
+    asyncio.run(run())
+
+def test_leadership_lapses_when_loop_stalls(backend: SQLiteCoordinationBackend) -> None:
+    coordinator = make_coordinator(backend, "a")
+
+    async def run() -> None:
+        election_task = asyncio.create_task(coordinator.run_leader_election())
+
+        await asyncio.sleep(0.05)
+
+        assert coordinator.is_leader
+
+        # Цикл завис дольше аренды - лидерство истекает без продления
+        time.sleep(0.4)
+
+        assert not coordinator.is_leader
+
+        election_task.cancel()
+
+    asyncio.run(run())
+
+def test_gift_messages_survive_saves_without_them(backend: SQLiteCoordinationBackend) -> None:
+    # Сообщение отправил не лидер, лидер сохраняет тот же подарок без messages
+    backend.save_star_gifts([make_star_gift(1, {42: 7})])
+    backend.save_star_gifts([make_star_gift(1), make_star_gift(2)])
+
+    assert backend.load_star_gift_messages([1, 2]) == {1: {42: 7}}
+
+    star_gifts = {
+        star_gift.id: star_gift
+        for star_gift in backend.load_star_gifts()
+    }
+
+    assert star_gifts[1].messages == {42: 7}
+    assert star_gifts[2].messages == {}
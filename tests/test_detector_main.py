@@ -0,0 +1,46 @@
+"""
+main(): ошибка настройки до supervisor.run() не оставляет открытыми клиенты
+"""
+
+import asyncio
+import typing
+
+import pytest
+
+import config
+
+class FakeApp:
+    instances: list["FakeApp"] = []
+
+    def __init__(self, **kwargs: typing.Any) -> None:
+        self.is_stopped = False
+
+        FakeApp.instances.append(self)
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        self.is_stopped = True
+
+    async def export_session_string(self) -> str:
+        raise RuntimeError("no session")
+
+def test_failed_setup_runs_cleanups(detector: typing.Any, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(detector, "Client", FakeApp)
+    monkeypatch.setattr(config, "validate_config", lambda: None)
+    monkeypatch.setattr(config, "ANALYTICS_ENABLED", False)
+
+    async def fail_warm_up() -> None:
+        raise RuntimeError("warm-up failed")
+
+    monkeypatch.setattr(detector.offload, "warm_up", fail_warm_up)
+
+    with pytest.raises(RuntimeError, match="warm-up failed"):
+        asyncio.run(detector.main())
+
+    app, = FakeApp.instances
+
+    assert app.is_stopped
+    assert detector.BOT_HTTP_CLIENT is not None and detector.BOT_HTTP_CLIENT.is_closed
+    assert detector.intensive_notifier.http_client.is_closed
@@ -0,0 +1,137 @@
+"""
+Лестница эскалации и её остановка: прочтение или реакция останавливают
+оповещения только того чата, к которому относится обновление
+"""
+
+from types import SimpleNamespace
+
+import asyncio
+
+from pyrogram.raw.types import (
+    Message, MessageReactions, PeerChannel, PeerChat, PeerUser,
+    UpdateEditMessage, UpdateMessageReactions, UpdateReadHistoryInbox
+)
+
+from escalation import (
+    EscalationPolicy, EscalationStep, get_acknowledgement, get_message_acknowledgement,
+    CHANNEL_MESSAGE, CHANNEL_PINNED, STOP_READ, STOP_REACTION
+)
+from intensive_notifier import IntensiveNotifier, NotificationCampaign
+
+BOT_ID = 100
+OWN_USER_ID = 42
+GROUP_CHAT_ID = -555
+OTHER_GROUP_CHAT_ID = -777
+
+SUBSCRIBER_CHAT_IDS = {OWN_USER_ID, GROUP_CHAT_ID, 43}
+
+def get_update_acknowledgement(update: object) -> tuple[str, int] | None:
+    return get_acknowledgement(update, {BOT_ID}, OWN_USER_ID, SUBSCRIBER_CHAT_IDS)
+
+def test_policy_actions_follow_backoff_and_cap() -> None:
+    policy = EscalationPolicy(steps=[
+        EscalationStep(channel=CHANNEL_MESSAGE),
+        EscalationStep(channel=CHANNEL_PINNED, repeat=4, delay=10.0, backoff=2.0, max_delay=30.0)
+    ])
+
+    assert list(policy.iter_actions()) == [
+        (0.0, CHANNEL_MESSAGE),
+        (10.0, CHANNEL_PINNED),
+        (20.0, CHANNEL_PINNED),
+        (30.0, CHANNEL_PINNED),
+        (30.0, CHANNEL_PINNED)
+    ]
+
+    assert policy.get_planned_calls() == 1 + 4 * 3
+
+def test_read_of_bot_chat_acknowledges_session_owner_chat() -> None:
+    update = UpdateReadHistoryInbox(peer=PeerUser(user_id=BOT_ID), max_id=10, still_unread_count=0, pts=1, pts_count=1)
+
+    assert get_update_acknowledgement(update) == (STOP_READ, OWN_USER_ID)
+
+def test_read_of_other_user_chat_is_ignored() -> None:
+    update = UpdateReadHistoryInbox(peer=PeerUser(user_id=BOT_ID + 1), max_id=10, still_unread_count=0, pts=1, pts_count=1)
+
+    assert get_update_acknowledgement(update) is None
+
+def test_reaction_in_subscriber_group_acknowledges_that_group() -> None:
+    update = UpdateMessageReactions(peer=PeerChat(chat_id=-GROUP_CHAT_ID), msg_id=1, reactions=MessageReactions(results=[]))
+
+    assert get_update_acknowledgement(update) == (STOP_REACTION, GROUP_CHAT_ID)
+
+    other_update = UpdateMessageReactions(peer=PeerChat(chat_id=-OTHER_GROUP_CHAT_ID), msg_id=1, reactions=MessageReactions(results=[]))
+
+    assert get_update_acknowledgement(other_update) is None
+
+def test_reaction_edit_counts_only_on_bot_messages() -> None:
+    def make_message(from_id: PeerUser | None, peer_id: PeerUser | PeerChat | PeerChannel) -> Message:
+        return Message(id=1, peer_id=peer_id, date=0, message="", from_id=from_id, reactions=MessageReactions(results=[]))
+
+    group_peer = PeerChat(chat_id=-GROUP_CHAT_ID)
+
+    assert get_message_acknowledgement(make_message(PeerUser(user_id=BOT_ID), group_peer), {BOT_ID}, OWN_USER_ID, SUBSCRIBER_CHAT_IDS) == (STOP_REACTION, GROUP_CHAT_ID)
+    assert get_message_acknowledgement(make_message(PeerUser(user_id=7), group_peer), {BOT_ID}, OWN_USER_ID, SUBSCRIBER_CHAT_IDS) is None
+
+    update = UpdateEditMessage(message=make_message(None, PeerUser(user_id=BOT_ID)), pts=1, pts_count=1)
+
+    assert get_update_acknowledgement(update) == (STOP_REACTION, OWN_USER_ID)
+
+def make_notifier() -> IntensiveNotifier:
+    config = SimpleNamespace(
+        BOT_TOKENS = [f"{BOT_ID}:test"],
+        ESCALATION_POLICY_FILEPATH = None,
+        NOTIFICATION_INTERVAL = 3.0,
+        MAX_NOTIFICATIONS = 20,
+        HTTP_REQUEST_TIMEOUT = 1.0
+    )
+
+    return IntensiveNotifier(config)
+
+def add_campaign(notifier: IntensiveNotifier, chat_id: int, star_gift_id: int, calls: int = 1) -> NotificationCampaign:
+    campaign = NotificationCampaign(chat_id, notifier.policy, star_gift_id)
+    campaign.calls = calls
+
+    notifier.campaigns[(chat_id, star_gift_id)] = campaign
+
+    return campaign
+
+def test_acknowledge_stops_only_campaigns_of_that_chat() -> None:
+    async def run() -> None:
+        notifier = make_notifier()
+
+        own_campaigns = [add_campaign(notifier, OWN_USER_ID, 1), add_campaign(notifier, OWN_USER_ID, 2)]
+        group_campaign = add_campaign(notifier, GROUP_CHAT_ID, 1)
+
+        # Реакция в группе подписчика
+        assert notifier.acknowledge(STOP_REACTION, GROUP_CHAT_ID)
+
+        assert group_campaign.stop_reason == STOP_REACTION
+        assert not any(campaign.stop_event.is_set() for campaign in own_campaigns)
+
+        assert notifier.acknowledge(STOP_READ, OWN_USER_ID)
+
+        assert all(campaign.stop_reason == STOP_READ for campaign in own_campaigns)
+
+        await notifier.http_client.aclose()
+
+    asyncio.run(run())
+
+def test_acknowledge_skips_campaign_before_first_call_and_disabled_signals() -> None:
+    async def run() -> None:
+        notifier = make_notifier()
+
+        # Прочтение до первого уведомления относится к старым сообщениям
+        fresh_campaign = add_campaign(notifier, OWN_USER_ID, 1, calls=0)
+
+        assert not notifier.acknowledge(STOP_READ, OWN_USER_ID)
+        assert not fresh_campaign.stop_event.is_set()
+
+        campaign = add_campaign(notifier, 43, 1)
+        campaign.policy = notifier.policy.model_copy(update={"stop_on_read": False})
+
+        assert not notifier.acknowledge(STOP_READ, 43)
+        assert notifier.acknowledge(STOP_REACTION, 43)
+
+        await notifier.http_client.aclose()
+
+    asyncio.run(run())
@@ -0,0 +1,165 @@
+"""
+Сообщение о подарке правится по реальному уменьшению остатка: новый подарок
+из каталога -> sendMessage получателю -> уменьшения через detector() и
+EditThrottle -> editMessageText того же сообщения
+"""
+
+from io import BytesIO
+
+import asyncio
+import typing
+
+import httpx
+import pytest
+import simplejson as json
+
+from pyrogram.raw.types.document import Document
+from pyrogram.raw.types.document_attribute_filename import DocumentAttributeFilename
+from pyrogram.raw.types.payments.star_gifts import StarGifts
+from pyrogram.raw.types.star_gift import StarGift
+
+import config
+
+from conftest import CHAT_ID
+
+STAR_GIFT_ID = 5_000_000_000_000_000_000
+TOTAL_AMOUNT = 1_000
+
+class CatalogFinished(Exception):
+    pass
+
+class FakeClient:
+    """Каталог GetStarGifts по кадрам: по одному остатку подарка на опрос
+
+    Между опросами - пауза дольше цикла process_update_gifts (0.1с): правки
+    разных опросов не сливаются в одну
+    """
+
+    is_connected = True
+
+    def __init__(self, available_amounts: list[int], poll_delay: float = 0.3) -> None:
+        self.available_amounts = available_amounts
+        self.poll_delay = poll_delay
+
+        self.polls = 0
+
+    async def invoke(self, query: typing.Any, **kwargs: typing.Any) -> StarGifts:
+        if self.polls:
+            await asyncio.sleep(self.poll_delay)
+
+        self.polls += 1
+
+        if not self.available_amounts:
+            raise CatalogFinished()
+
+        available_amount = self.available_amounts.pop(0)
+
+        return StarGifts(
+            hash = available_amount,
+            gifts = [
+                StarGift(
+                    id = STAR_GIFT_ID,
+                    sticker = Document(
+                        id = 1,
+                        access_hash = 1,
+                        file_reference = b"",
+                        date = 1_700_000_000,
+                        mime_type = "application/x-tgsticker",
+                        size = 1,
+                        dc_id = 2,
+                        attributes = [DocumentAttributeFilename(file_name="sticker.tgs")]
+                    ),
+                    stars = 50,
+                    convert_stars = 40,
+                    limited = True,
+                    availability_remains = available_amount,
+                    availability_total = TOTAL_AMOUNT,
+                    first_sale_date = 1_700_000_000,
+                    last_sale_date = 1_700_000_000
+                )
+            ]
+        )
+
+    async def download_media(self, message: typing.Any, in_memory: bool = True, **kwargs: typing.Any) -> BytesIO:
+        return BytesIO(b"sticker")
+
+def test_decrease_edits_gift_message_through_throttle(detector: typing.Any, monkeypatch: pytest.MonkeyPatch) -> None:
+    from edit_throttle import EditThrottle, EditThreshold
+
+    requests: list[tuple[str, dict[str, typing.Any]]] = []
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        method = request.url.path.rsplit("/", 1)[-1]
+
+        data = json.loads(request.content) if request.headers.get("content-type") == "application/json" else {}
+
+        requests.append((method, data))
+
+        return httpx.Response(200, json={
+            "ok": True,
+            "result": {
+                "message_id": len(requests),
+                "sticker": {"file_id": "sticker"}
+            }
+        })
+
+    def get_requests(method: str) -> list[dict[str, typing.Any]]:
+        return [data for request_method, data in requests if request_method == method]
+
+    monkeypatch.setattr(config, "CHECK_INTERVAL", 0.0)
+
+    # Порог 1% тиража (10 штук), без интервала - результат не зависит от скорости опроса
+    monkeypatch.setattr(detector, "edit_throttle", EditThrottle(
+        default = EditThreshold(min_delta=1, min_percent=1.0, min_interval=0.0)
+    ))
+
+    async def run() -> None:
+        transport = httpx.MockTransport(handle)
+
+        monkeypatch.setattr(detector, "BOT_HTTP_CLIENT", httpx.AsyncClient(base_url="https://api.telegram.org/", transport=transport))
+        monkeypatch.setattr(detector.intensive_notifier, "http_client", httpx.AsyncClient(base_url="https://api.telegram.org/", transport=transport))
+
+        # Новый подарок, первое уменьшение (точка отсчёта), -5 (ниже порога), -15
+        client = FakeClient([1_000, 990, 985, 970])
+
+        update_gifts_queue: detector.UPDATE_GIFTS_QUEUE_T = asyncio.Queue()
+        update_task = asyncio.create_task(detector.process_update_gifts(update_gifts_queue))
+
+        try:
+            with pytest.raises(CatalogFinished):
+                await detector.detector(
+                    app = typing.cast(typing.Any, client),
+                    new_gift_callback = typing.cast(typing.Any, lambda star_gift: detector.process_new_gift(client, star_gift)),
+                    update_gifts_queue = update_gifts_queue
+                )
+
+        finally:
+            update_task.cancel()
+
+            await detector.intensive_notifier.close()
+            await typing.cast(httpx.AsyncClient, detector.BOT_HTTP_CLIENT).aclose()
+
+    asyncio.run(run())
+
+    gift_messages = [
+        data
+        for data in get_requests("sendMessage")
+        if data["text"].startswith(config.NOTIFY_TEXT_TITLES[True])
+    ]
+
+    assert len(gift_messages) == 1
+    assert gift_messages[0]["chat_id"] == CHAT_ID
+
+    star_gift = detector.find_star_gift(STAR_GIFT_ID)
+
+    assert star_gift is not None
+    assert list(star_gift.messages) == [CHAT_ID]
+
+    edits = get_requests("editMessageText")
+
+    # 985 отсеян порогом: правок две, обе - того же сообщения
+    assert [(data["chat_id"], data["message_id"]) for data in edits] == [(CHAT_ID, star_gift.messages[CHAT_ID])] * 2
+    assert "Available amount: 990" in edits[0]["text"]
+    assert "Available amount: 970" in edits[1]["text"]
+
+    assert detector.edit_throttle.get_status()["suppressed_delta"] == 1
@@ -0,0 +1,54 @@
+"""
+Очередь логов: запись с изменяемыми аргументами форматируется в момент вызова
+"""
+
+from queue import SimpleQueue
+
+import logging
+
+from utils import LazyQueueHandler
+
+def log(*args: object) -> logging.LogRecord:
+    log_queue: SimpleQueue[logging.LogRecord] = SimpleQueue()
+
+    logger = logging.getLogger("tests.logging")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+
+    handler = LazyQueueHandler(log_queue)
+    logger.addHandler(handler)
+
+    try:
+        logger.debug(*args)
+
+    finally:
+        logger.removeHandler(handler)
+
+    return log_queue.get_nowait()
+
+def test_mutable_args_are_formatted_at_call_time() -> None:
+    data = {"chat_id": 42}
+
+    record = log("Sending request %s with data: %s", "sendMessage", data)
+
+    # Слушатель форматирует запись позже, когда вызывающий уже изменил данные
+    data["chat_id"] = 43
+
+    assert record.args is None
+    assert record.getMessage() == "Sending request sendMessage with data: {'chat_id': 42}"
+
+def test_scalar_args_stay_lazy() -> None:
+    record = log("Star gift updated with %d available amount", 990)
+
+    assert record.msg == "Star gift updated with %d available amount"
+    assert record.args == (990,)
+    assert record.getMessage() == "Star gift updated with 990 available amount"
+
+def test_mapping_args_are_formatted() -> None:
+    data = {"id": 1}
+
+    record = log("Gift %(id)s", data)
+
+    data["id"] = 2
+
+    assert record.getMessage() == "Gift 1"
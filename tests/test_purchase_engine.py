@@ -0,0 +1,272 @@
+"""
+Автопокупка: PyrogramPurchaseBackend на заглушке invoke (GetPaymentForm ->
+SendStarsForm, прогрев, ошибки), бюджет и первый опрос без сохранённых данных
+"""
+
+from types import SimpleNamespace
+
+import asyncio
+import typing
+
+import pytest
+
+from pyrogram.errors import StargiftUsageLimited
+from pyrogram.raw.functions.payments.get_payment_form import GetPaymentForm
+from pyrogram.raw.functions.payments.get_stars_status import GetStarsStatus
+from pyrogram.raw.functions.payments.send_stars_form import SendStarsForm
+from pyrogram.raw.types.input_peer_self import InputPeerSelf
+from pyrogram.raw.types.input_peer_user import InputPeerUser
+from pyrogram.raw.types.document import Document
+from pyrogram.raw.types.payments.star_gifts import StarGifts
+from pyrogram.raw.types.star_gift import StarGift
+
+from purchase_engine import PurchaseEngine, PurchaseRules, PyrogramPurchaseBackend, FakePurchaseBackend
+from star_gifts_data import StarGiftData, StarGiftsData
+
+import config
+
+PEER = InputPeerUser(user_id=1, access_hash=2)
+
+def make_star_gift(star_gift_id: int, price: int = 50, available_amount: int = 100, is_limited: bool = True) -> StarGiftData:
+    return StarGiftData(
+        id = star_gift_id,
+        number = star_gift_id,
+        sticker_file_id = "",
+        sticker_file_name = f"{star_gift_id}.tgs",
+        price = price,
+        convert_price = price,
+        available_amount = available_amount,
+        total_amount = 100,
+        is_limited = is_limited
+    )
+
+class StubClient:
+    """invoke записывает запросы; ошибки задаются по типу запроса"""
+
+    def __init__(self, errors: dict[type, Exception] | None = None) -> None:
+        self.errors = errors or {}
+
+        self.queries: list[typing.Any] = []
+        self.resolved_peers: list[int | str] = []
+
+    async def resolve_peer(self, peer: int | str) -> typing.Any:
+        self.resolved_peers.append(peer)
+
+        return PEER
+
+    async def invoke(self, query: typing.Any, sleep_threshold: int | None = None) -> typing.Any:
+        # Планировщик сам обрабатывает FLOOD_WAIT
+        assert sleep_threshold == 0
+
+        self.queries.append(query)
+
+        error = self.errors.get(type(query))
+
+        if error is not None:
+            raise error
+
+        if isinstance(query, GetPaymentForm):
+            return SimpleNamespace(form_id=777)
+
+        return True
+
+def run_purchase(engine: PurchaseEngine, star_gifts: list[StarGiftData]) -> None:
+    async def run() -> None:
+        await engine.prepare()
+
+        for star_gift in star_gifts:
+            engine.on_new_gift(star_gift)
+
+        await engine.drain()
+
+    asyncio.run(run())
+
+def test_prepare_resolves_peer_and_warms_up() -> None:
+    client = StubClient()
+    backend = PyrogramPurchaseBackend(app=client, peer="someone")
+
+    asyncio.run(backend.prepare())
+
+    assert client.resolved_peers == ["someone"]
+    assert len(client.queries) == 1
+    assert isinstance(client.queries[0], GetStarsStatus)
+    assert isinstance(client.queries[0].peer, InputPeerSelf)
+
+def test_unprepared_backend_does_not_send_requests() -> None:
+    client = StubClient()
+    backend = PyrogramPurchaseBackend(app=client)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(backend.get_payment_form(1))
+
+    assert client.queries == []
+
+def test_purchase_sends_stars_form_for_payment_form() -> None:
+    client = StubClient()
+
+    engine = PurchaseEngine(
+        backend = PyrogramPurchaseBackend(app=client, hide_name=True),
+        rules = PurchaseRules(quantity=2)
+    )
+
+    run_purchase(engine, [make_star_gift(1)])
+
+    _, *purchase_queries = client.queries
+
+    assert [type(query) for query in purchase_queries] == [GetPaymentForm, SendStarsForm] * 2
+
+    for query in purchase_queries:
+        assert query.invoice.peer == PEER
+        assert query.invoice.gift_id == 1
+        assert query.invoice.hide_name is True
+
+    assert purchase_queries[1].form_id == 777
+
+    assert engine.stars_spent == 100
+    assert [attempt.success for attempt in engine.attempts] == [True, True]
+
+def test_failed_payment_form_is_not_paid_and_refunds_budget() -> None:
+    client = StubClient(errors={GetPaymentForm: StargiftUsageLimited()})
+
+    engine = PurchaseEngine(
+        backend = PyrogramPurchaseBackend(app=client),
+        rules = PurchaseRules(quantity=3, stars_budget=1_000)
+    )
+
+    run_purchase(engine, [make_star_gift(1)])
+
+    assert not any(isinstance(query, SendStarsForm) for query in client.queries)
+
+    # После ошибки остальные покупки того же подарка не пробуются
+    assert len(engine.attempts) == 1
+    assert engine.attempts[0].success is False
+    assert engine.attempts[0].error is not None and "StargiftUsageLimited" in engine.attempts[0].error
+    assert engine.stars_spent == 0
+
+def test_failed_stars_form_refunds_budget() -> None:
+    client = StubClient(errors={SendStarsForm: StargiftUsageLimited()})
+
+    engine = PurchaseEngine(
+        backend = PyrogramPurchaseBackend(app=client),
+        rules = PurchaseRules()
+    )
+
+    run_purchase(engine, [make_star_gift(1)])
+
+    assert [type(query) for query in client.queries[1:]] == [GetPaymentForm, SendStarsForm]
+    assert engine.stars_spent == 0
+    assert engine.get_status()["successful"] == 0
+
+def test_rules_and_budget_cap_spend() -> None:
+    backend = FakePurchaseBackend()
+
+    engine = PurchaseEngine(
+        backend = backend,
+        rules = PurchaseRules(max_price=100, stars_budget=120)
+    )
+
+    run_purchase(engine, [
+        make_star_gift(1, price=50),
+        make_star_gift(2, price=500),  # дороже max_price
+        make_star_gift(3, price=50, is_limited=False),  # не лимитированный
+        make_star_gift(4, price=50, available_amount=0),  # распродан
+        make_star_gift(5, price=50),
+        make_star_gift(6, price=50)  # сверх бюджета
+    ])
+
+    assert backend.purchased_star_gift_ids == [1, 5]
+    assert engine.stars_spent == 100
+
+def test_handled_gifts_are_forgotten_after_leaving_catalog() -> None:
+    backend = FakePurchaseBackend()
+
+    engine = PurchaseEngine(
+        backend = backend,
+        rules = PurchaseRules()
+    )
+
+    async def run() -> None:
+        star_gift = make_star_gift(1)
+
+        assert engine.on_new_gift(star_gift) is not None
+        assert engine.on_new_gift(star_gift) is None
+
+        engine.forget([1])
+
+        assert engine.on_new_gift(star_gift) is not None
+
+        await engine.drain()
+
+    asyncio.run(run())
+
+    assert backend.purchased_star_gift_ids == [1, 1]
+
+class CatalogFinished(Exception):
+    pass
+
+class CatalogClient:
+    """GetStarGifts по кадрам: каждый кадр - список id подарков в каталоге"""
+
+    is_connected = True
+
+    def __init__(self, frames: list[list[int]]) -> None:
+        self.frames = frames
+
+    async def invoke(self, query: typing.Any, **kwargs: typing.Any) -> StarGifts:
+        if not self.frames:
+            raise CatalogFinished()
+
+        star_gift_ids = self.frames.pop(0)
+
+        return StarGifts(
+            hash = len(self.frames),
+            gifts = [
+                StarGift(
+                    id = star_gift_id,
+                    sticker = Document(
+                        id = star_gift_id,
+                        access_hash = 1,
+                        file_reference = b"",
+                        date = 1_700_000_000,
+                        mime_type = "application/x-tgsticker",
+                        size = 1,
+                        dc_id = 2,
+                        attributes = []
+                    ),
+                    stars = 50,
+                    convert_stars = 40,
+                    limited = True,
+                    availability_remains = 100,
+                    availability_total = 100
+                )
+                for star_gift_id in star_gift_ids
+            ]
+        )
+
+def test_first_poll_without_saved_data_buys_nothing(detector: typing.Any, monkeypatch: pytest.MonkeyPatch, tmp_path: typing.Any) -> None:
+    monkeypatch.setattr(config, "CHECK_INTERVAL", 0.0)
+
+    # Первый запуск: сохранённого каталога нет, весь каталог выглядит новым
+    monkeypatch.setattr(detector, "STAR_GIFTS_DATA", StarGiftsData(DATA_FILEPATH=tmp_path / "star_gifts.json"))
+
+    backend = FakePurchaseBackend()
+
+    engine = PurchaseEngine(
+        backend = backend,
+        rules = PurchaseRules()
+    )
+
+    async def run() -> None:
+        with pytest.raises(CatalogFinished):
+            await detector.detector(
+                app = typing.cast(typing.Any, CatalogClient([[1, 2], [1, 2], [1, 2, 3]])),
+                update_gifts_queue = asyncio.Queue(),
+                purchase_engine = engine
+            )
+
+        await engine.drain()
+
+    asyncio.run(run())
+
+    # Покупается только подарок, появившийся после первого опроса
+    assert backend.purchased_star_gift_ids == [3]
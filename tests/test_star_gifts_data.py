@@ -0,0 +1,60 @@
+"""
+Сохранение каталога: сериализация (dump) отделена от записи файлов (write)
+"""
+
+from pathlib import Path
+
+from star_gifts_data import StarGiftData, StarGiftsData
+from star_gifts_snapshot import StarGiftsSnapshot
+
+def make_star_gift(star_gift_id: int, available_amount: int = 100) -> StarGiftData:
+    return StarGiftData(
+        id = star_gift_id,
+        number = star_gift_id,
+        sticker_file_id = f"file_{star_gift_id}",
+        sticker_file_name = f"{star_gift_id}.tgs",
+        price = 50,
+        convert_price = 40,
+        available_amount = available_amount,
+        total_amount = 100,
+        is_limited = True
+    )
+
+def test_write_saves_state_at_dump_time(tmp_path: Path) -> None:
+    star_gift = make_star_gift(1)
+
+    star_gifts_data = StarGiftsData(
+        DATA_FILEPATH = tmp_path / "star_gifts.json",
+        SNAPSHOT_FILEPATH = tmp_path / "star_gifts.snapshot",
+        star_gifts = [star_gift]
+    )
+
+    dump = star_gifts_data.dump()
+
+    # Пока файл пишется в другом потоке, event loop продолжает менять подарок
+    star_gift.messages[42] = 7
+    star_gift.available_amount = 90
+
+    star_gifts_data.write(dump)
+
+    loaded = StarGiftsData.load(tmp_path / "star_gifts.json")
+
+    assert loaded.star_gifts[0].available_amount == 100
+    assert loaded.star_gifts[0].messages == {}
+
+    with StarGiftsSnapshot(tmp_path / "star_gifts.snapshot") as snapshot:
+        assert snapshot[0].available_amount == 100
+        assert snapshot[0].messages == {}
+
+def test_save_round_trip(tmp_path: Path) -> None:
+    star_gift = make_star_gift(1)
+    star_gift.messages = {42: 7, 43: 8}
+
+    StarGiftsData(
+        DATA_FILEPATH = tmp_path / "star_gifts.json",
+        star_gifts = [star_gift, make_star_gift(2, available_amount=0)]
+    ).save()
+
+    loaded = StarGiftsData.load(tmp_path / "star_gifts.json")
+
+    assert loaded.star_gifts == [star_gift, make_star_gift(2, available_amount=0)]
@@ -0,0 +1,83 @@
+"""
+Бинарный снапшот: запись и чтение через mmap возвращают тот же каталог
+"""
+
+from pathlib import Path
+
+import pytest
+
+from star_gifts_data import StarGiftData, StarGiftsData
+from star_gifts_snapshot import (
+    SnapshotError, StarGiftsSnapshot, decode_messages, encode_messages, write_snapshot
+)
+
+def make_star_gifts() -> list[StarGiftData]:
+    return [
+        StarGiftData(
+            id = 5_170_145_012_310_081_615,
+            number = 2,
+            sticker_file_id = "CAACAgIAAxUAAWfile",
+            sticker_file_name = "подарок.tgs",
+            price = 25_000,
+            convert_price = 20_000,
+            available_amount = 0,
+            total_amount = 1_000,
+            is_limited = True,
+            first_appearance_timestamp = 1_730_000_000,
+            messages = {42: 7, -1_001_234_567_890: 8},
+            last_sale_timestamp = 1_730_000_600,
+            is_upgradable = True
+        ),
+        StarGiftData(
+            id = 1,
+            number = 1,
+            sticker_file_id = "",
+            sticker_file_name = "",
+            price = 15,
+            convert_price = 13,
+            available_amount = 0,
+            total_amount = 0,
+            is_limited = False
+        )
+    ]
+
+def test_messages_round_trip() -> None:
+    messages = {42: 7, -1_001_234_567_890: 8}
+
+    assert decode_messages(encode_messages(messages)) == messages
+    assert decode_messages(encode_messages({})) == {}
+
+def test_snapshot_round_trip(tmp_path: Path) -> None:
+    star_gifts = make_star_gifts()
+
+    write_snapshot(tmp_path / "star_gifts.snapshot", star_gifts)
+
+    with StarGiftsSnapshot(tmp_path / "star_gifts.snapshot") as snapshot:
+        # Записи отсортированы по id
+        assert list(snapshot) == sorted(star_gifts, key=lambda star_gift: star_gift.id)
+        assert snapshot[-1].messages == {42: 7, -1_001_234_567_890: 8}
+
+        assert snapshot.find(1) == star_gifts[1]
+        assert snapshot.find(2) is None
+
+def test_load_prefers_fresh_snapshot(tmp_path: Path) -> None:
+    star_gifts = make_star_gifts()
+
+    StarGiftsData(
+        DATA_FILEPATH = tmp_path / "star_gifts.json",
+        SNAPSHOT_FILEPATH = tmp_path / "star_gifts.snapshot",
+        star_gifts = star_gifts
+    ).save()
+
+    loaded = StarGiftsData.load(tmp_path / "star_gifts.json", tmp_path / "star_gifts.snapshot")
+
+    assert isinstance(loaded.star_gifts, StarGiftsSnapshot)
+    assert sorted(loaded.star_gifts, key=lambda star_gift: star_gift.id) == sorted(star_gifts, key=lambda star_gift: star_gift.id)
+
+    loaded.star_gifts.close()
+
+def test_corrupted_snapshot_is_rejected(tmp_path: Path) -> None:
+    (tmp_path / "star_gifts.snapshot").write_bytes(b"SGSN")
+
+    with pytest.raises(SnapshotError):
+        StarGiftsSnapshot(tmp_path / "star_gifts.snapshot")
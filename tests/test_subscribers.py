@@ -0,0 +1,91 @@
+"""
+Индекс подписчиков: совпадения по корзинам равны линейной проверке фильтров
+"""
+
+import itertools
+import random
+
+from star_gifts_data import StarGiftData
+from subscribers import PRICE_BUCKETS, Subscriber, SubscriberFilter, SubscriberIndex
+
+def make_star_gift(price: int, is_limited: bool, is_upgradable: bool) -> StarGiftData:
+    return StarGiftData(
+        id = 1,
+        number = 1,
+        sticker_file_id = "file_1",
+        sticker_file_name = "1.tgs",
+        price = price,
+        convert_price = 0,
+        available_amount = 100,
+        total_amount = 100,
+        is_limited = is_limited,
+        is_upgradable = is_upgradable
+    )
+
+def make_subscribers(count: int, rng: random.Random) -> list[Subscriber]:
+    # Границы корзин и соседние цены - самые частые места ошибок
+    prices = [None, 0, 1] + [
+        price + offset
+        for price in PRICE_BUCKETS[1:]
+        for offset in (-1, 0, 1)
+    ]
+
+    subscribers: list[Subscriber] = []
+
+    for chat_id in range(count):
+        min_price, max_price = rng.choice(prices), rng.choice(prices)
+
+        if min_price is not None and max_price is not None and min_price > max_price:
+            min_price, max_price = max_price, min_price
+
+        subscribers.append(Subscriber(
+            chat_id = chat_id,
+            filters = SubscriberFilter(
+                min_price = min_price,
+                max_price = max_price,
+                is_limited = rng.choice((None, False, True)),
+                is_upgradable = rng.choice((None, False, True))
+            ),
+            is_enabled = rng.random() > 0.1
+        ))
+
+    return subscribers
+
+def test_match_equals_linear_filtering() -> None:
+    rng = random.Random(0)
+
+    subscribers = make_subscribers(300, rng)
+    index = SubscriberIndex(subscribers)
+
+    prices = sorted({0, 1, 200_000} | {
+        price + offset
+        for price in PRICE_BUCKETS[1:]
+        for offset in (-1, 0, 1)
+    })
+
+    for price, is_limited, is_upgradable in itertools.product(prices, (False, True), (False, True)):
+        star_gift = make_star_gift(price, is_limited, is_upgradable)
+
+        expected = sorted(
+            subscriber.chat_id
+            for subscriber in subscribers
+            if subscriber.is_enabled and subscriber.filters.matches(star_gift)
+        )
+
+        assert sorted(subscriber.chat_id for subscriber in index.match(star_gift)) == expected
+
+        if is_upgradable:
+            assert sorted(subscriber.chat_id for subscriber in index.match_upgradable(star_gift)) == sorted(
+                subscriber.chat_id
+                for subscriber in subscribers
+                if subscriber.is_enabled and subscriber.filters.is_upgradable and subscriber.filters.matches(star_gift)
+            )
+
+def test_disabled_subscriber_is_not_indexed() -> None:
+    index = SubscriberIndex([
+        Subscriber(chat_id=1, is_enabled=False),
+        Subscriber(chat_id=2)
+    ])
+
+    assert 1 not in index and 2 in index
+    assert [subscriber.chat_id for subscriber in index.match(make_star_gift(50, True, False))] == [2]
@@ -1,9 +1,13 @@
 from pathlib import Path
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from datetime import datetime, tzinfo
+from queue import SimpleQueue
 
+import atexit
 import logging
 import numpy as np
+import simplejson as json
+import threading
 import time
 import typing
 
@@ -13,30 +17,168 @@ class StrippingFormatter(logging.Formatter):
 
         return super().format(record)
 
-def get_logger(name: str, log_filepath: Path, console_log_level: int=logging.INFO, file_log_level: int=logging.INFO) -> logging.Logger:
+LOG_RECORD_BUILTIN_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data: dict[str, typing.Any] = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "file": record.filename,
+            "line": record.lineno,
+            "message": record.getMessage().strip()
+        }
+
+        # Поля из extra={...}
+        for key, value in vars(record).items():
+            if key not in LOG_RECORD_BUILTIN_ATTRS and not key.startswith("_"):
+                data[key] = value
+
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+# Значения, которые нельзя изменить после вызова логгера: их можно форматировать в другом потоке
+IMMUTABLE_LOG_ARG_TYPES = (int, float, str, bytes, type(None))
+
+class LazyQueueHandler(QueueHandler):
+    """Кладёт запись в очередь без форматирования: msg % args выполняется в потоке слушателя
+
+    Запись с изменяемыми аргументами (словари, модели) форматируется сразу:
+    слушатель увидел бы их состояние на момент записи, а не вызова
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if not isinstance(record.msg, str) or not (
+            record.args is None
+            or isinstance(record.args, tuple) and all(isinstance(arg, IMMUTABLE_LOG_ARG_TYPES) for arg in record.args)
+        ):
+            record.msg = record.getMessage()
+            record.args = None
+
+        return record
+
+class DebugSamplingFilter(logging.Filter):
+    """Пропускает не больше burst DEBUG-записей с одной строки кода за interval секунд"""
+
+    def __init__(self, interval: float, burst: int) -> None:
+        super().__init__()
+
+        self.interval = interval
+        self.burst = burst
+
+        self.suppressed = 0
+
+        self._windows: dict[tuple[str, int], list[float | int]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+
+        key = (record.pathname, record.lineno)
+        now = record.created
+
+        with self._lock:
+            window = self._windows.get(key)
+
+            if window is None or now - window[0] >= self.interval:
+                self._windows[key] = [now, 1]
+
+                return True
+
+            if window[1] < self.burst:
+                window[1] += 1
+
+                return True
+
+            self.suppressed += 1
+
+        return False
+
+_queue_listeners: list[QueueListener] = []
+
+def stop_log_listeners() -> None:
+    """Дописывает очередь и останавливает потоки записи логов"""
+    while _queue_listeners:
+        _queue_listeners.pop().stop()
+
+atexit.register(stop_log_listeners)
+
+def prune_rotated_logs(log_filepath: Path, backup_count: int) -> int:
+    """Удаляет ротированные файлы сверх backup_count (остаются после его уменьшения)"""
+    removed = 0
+
+    for filepath in log_filepath.parent.glob(f"{log_filepath.name}.*"):
+        suffix = filepath.name[len(log_filepath.name) + 1:]
+
+        if suffix.isdigit() and int(suffix) > backup_count:
+            filepath.unlink(missing_ok=True)
+
+            removed += 1
+
+    return removed
+
+def get_queue_handler(*handlers: logging.Handler) -> QueueHandler:
+    """Обработчики выполняются в отдельном потоке, event loop только кладёт запись в очередь"""
+    log_queue: SimpleQueue[logging.LogRecord] = SimpleQueue()
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+
+    _queue_listeners.append(listener)
+
+    return LazyQueueHandler(log_queue)
+
+def get_logger(
+    name: str,
+    log_filepath: Path,
+    console_log_level: int=logging.INFO,
+    file_log_level: int=logging.INFO,
+    json_format: bool=False,
+    max_bytes: int=1028 * 1024,  # 1 MB
+    backup_count: int=1_000,
+    debug_sample_interval: float | None=None,
+    debug_sample_burst: int=10
+) -> logging.Logger:
     logger = logging.getLogger(name)
 
     logger.setLevel(min(console_log_level, file_log_level))
 
-    formatter = StrippingFormatter("%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s")
+    formatter = (
+        JsonFormatter()
+        if json_format else
+        StrippingFormatter("%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s")
+    )
 
     console_handler = logging.StreamHandler()
     console_handler.setLevel(console_log_level)
     console_handler.setFormatter(formatter)
 
+    prune_rotated_logs(log_filepath, backup_count)
+
     file_handler = RotatingFileHandler(
         filename = log_filepath.resolve().as_posix(),
         mode = "a",
-        maxBytes = 1028 * 1024,  # 1 MB
-        backupCount = 1_000,
+        maxBytes = max_bytes,
+        backupCount = backup_count,
         encoding = "utf-8"
     )
 
     file_handler.setLevel(file_log_level)
     file_handler.setFormatter(formatter)
 
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    queue_handler = get_queue_handler(console_handler, file_handler)
+
+    if debug_sample_interval:
+        queue_handler.addFilter(DebugSamplingFilter(
+            interval = debug_sample_interval,
+            burst = debug_sample_burst
+        ))
+
+    logger.addHandler(queue_handler)
 
     return logger
 